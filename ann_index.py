@@ -0,0 +1,330 @@
+#ann_index.py
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Dict, Any, Callable, Optional
+
+import numpy as np
+
+from embedding_backends import get_embedding_backend, EMBEDDING_MODEL
+from embedding_store import embedding_store, text_key
+from pair_search import normalize
+
+# Probed inverted lists per query; with ~sqrt(N) lists a query scores about nprobe * sqrt(N) vectors
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+# Lists probed around each list when looking for near-duplicates
+ANN_DUPLICATE_NPROBE = int(os.environ.get("ANN_DUPLICATE_NPROBE", "2"))
+ANN_DUPLICATE_THRESHOLD = float(os.environ.get("ANN_DUPLICATE_THRESHOLD", "0.9"))
+ANN_KMEANS_ITERATIONS = 10
+ANN_TRAIN_POINTS_PER_LIST = 64
+# Centroids are retrained once the index holds this many times the vectors they were trained on
+ANN_RETRAIN_FACTOR = 4
+# Rows scored per matmul while assigning vectors to centroids
+ANN_ASSIGN_CHUNK = 16384
+ANN_SEED = 0
+
+
+def ann_index_path(input_file: str) -> str:
+    """The index is kept next to the data it indexes, e.g. data/.comments.txt.ann.npz."""
+    directory, name = os.path.split(input_file)
+    return os.path.join(directory, f".{name}.ann.npz")
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ANN_ASSIGN_CHUNK):
+        assign[start:start + ANN_ASSIGN_CHUNK] = np.argmax(vectors[start:start + ANN_ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return assign
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = ANN_KMEANS_ITERATIONS,
+                     seed: int = ANN_SEED) -> np.ndarray:
+    """Unit-length centroids of L2-normalized vectors, trained on a sample of at most nlist * 64 of them."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * ANN_TRAIN_POINTS_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = ~sums.any(axis=1)
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]  # Re-seed empty lists
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file ANN index over cosine similarity, in NumPy.
+
+    Vectors are L2-normalized float32 rows, each filed under its nearest of ~sqrt(N) k-means
+    centroids. A query scores only the vectors of its ANN_NPROBE nearest lists. Rows carry the
+    sha256 key and text they were embedded from; inserts are incremental and removed rows are
+    masked out until more than half the index is dead.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.assign = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        self.keys: list[str] = []
+        self.texts: list[str] = []
+        self.trained_on = 0
+        self.source_stat: tuple[int, int] = (0, 0)  # (mtime_ns, size) of the indexed file
+        self._rows: Dict[str, int] = {}
+        self._lists: Optional[tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    def _inverted_lists(self) -> tuple[np.ndarray, np.ndarray]:
+        # CSR layout: rows of list l are order[offsets[l]:offsets[l + 1]]
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable").astype(np.int64)
+            order = order[self.alive[order]]
+            counts = np.bincount(self.assign[order], minlength=len(self.centroids))
+            self._lists = (order, np.concatenate([[0], np.cumsum(counts)]))
+        return self._lists
+
+    def _members(self, lists) -> np.ndarray:
+        order, offsets = self._inverted_lists()
+        return np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists])
+
+    def train(self):
+        live = np.flatnonzero(self.alive)
+        self.vectors, self.alive = self.vectors[live], self.alive[live]
+        self.keys = [self.keys[i] for i in live]
+        self.texts = [self.texts[i] for i in live]
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+        nlist = max(1, int(np.sqrt(len(self.vectors))))
+        self.centroids = spherical_kmeans(self.vectors, nlist) if len(self.vectors) else None
+        self.assign = _assign(self.vectors, self.centroids) if len(self.vectors) else np.empty(0, dtype=np.int32)
+        self.trained_on = len(self.vectors)
+        self._lists = None
+
+    def add(self, keys: list[str], texts: list[str], vectors: np.ndarray):
+        """Insert rows (keys already present are skipped); retrains once the index has grown ANN_RETRAIN_FACTOR times."""
+        new = [i for i, key in enumerate(keys) if key not in self._rows]
+        if not new:
+            return
+        vectors = normalize(vectors[new])
+        start = len(self.keys)
+        self.vectors = np.concatenate([self.vectors.reshape(-1, vectors.shape[1]), vectors])
+        self.alive = np.concatenate([self.alive, np.ones(len(new), dtype=bool)])
+        for row, i in enumerate(new, start):
+            self._rows[keys[i]] = row
+            self.keys.append(keys[i])
+            self.texts.append(texts[i])
+        if self.centroids is None or len(self) > ANN_RETRAIN_FACTOR * max(self.trained_on, 1):
+            self.train()
+        else:
+            self.assign = np.concatenate([self.assign, _assign(vectors, self.centroids)])
+            self._lists = None
+
+    def remove(self, keys: list[str]):
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self.alive[row] = False
+        self._lists = None
+        if len(self.alive) and self.alive.sum() * 2 < len(self.alive):
+            self.train()  # Mostly dead: compact and retrain
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = ANN_NPROBE) -> list[tuple[int, float]]:
+        """Return up to k (row, similarity) pairs nearest to one query vector, best first."""
+        if self.centroids is None or not len(self):
+            return []
+        query = normalize(query.reshape(1, -1))[0]
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = self._members(lists)
+        scores = self.vectors[candidates] @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def duplicate_pairs(self, threshold: float = ANN_DUPLICATE_THRESHOLD,
+                        nprobe: int = ANN_DUPLICATE_NPROBE) -> list[tuple[int, int, float]]:
+        """Row pairs (i < j) with similarity >= threshold; each list is compared with its nprobe nearest lists."""
+        if self.centroids is None or not len(self):
+            return []
+        order, offsets = self._inverted_lists()
+        nprobe = min(nprobe, len(self.centroids))
+        neighbors = np.argsort(-(self.centroids @ self.centroids.T), axis=1, kind="stable")[:, :nprobe]
+        pairs = {}
+        for l in range(len(self.centroids)):
+            rows = order[offsets[l]:offsets[l + 1]]
+            if not len(rows):
+                continue
+            candidates = self._members(np.union1d(neighbors[l], [l]))
+            scores = self.vectors[rows] @ self.vectors[candidates].T
+            for a, b in zip(*np.nonzero(scores >= threshold)):
+                i, j = int(rows[a]), int(candidates[b])
+                if i < j:
+                    pairs[(i, j)] = float(scores[a, b])
+                elif j < i:
+                    pairs[(j, i)] = float(scores[a, b])
+        return [(i, j, score) for (i, j), score in sorted(pairs.items())]
+
+    def save(self, path: str):
+        # Texts go in as one UTF-8 blob plus offsets: a "<U" array would pad every one to the longest
+        encoded = [text.encode("utf-8") for text in self.texts]
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            np.savez(
+                file, centroids=self.centroids if self.centroids is not None else np.empty((0, 0), dtype=np.float32),
+                vectors=self.vectors, assign=self.assign, alive=self.alive, keys=np.array(self.keys, dtype="U64"),
+                text_blob=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                text_offsets=np.concatenate([[0], np.cumsum([len(text) for text in encoded], dtype=np.int64)]),
+                meta=np.array([self.model]), stats=np.array([self.trained_on, *self.source_stat], dtype=np.int64),
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(str(data["meta"][0]))
+            index.centroids = data["centroids"] if data["centroids"].size else None
+            index.vectors, index.assign, index.alive = data["vectors"], data["assign"], data["alive"]
+            index.keys = data["keys"].tolist()
+            if "text_blob" in data:
+                blob, offsets = data["text_blob"].tobytes(), data["text_offsets"].tolist()
+                index.texts = [blob[start:stop].decode("utf-8") for start, stop in zip(offsets, offsets[1:])]
+            else:  # Written before texts were stored as a blob
+                index.texts = data["texts"].tolist()
+            index.trained_on, *source_stat = data["stats"].tolist()
+            index.source_stat = tuple(source_stat)
+        index._rows = {key: row for row, key in enumerate(index.keys) if index.alive[row]}
+        return index
+
+
+class CommentIndex:
+    """An IVFIndex kept in sync with a one-comment-per-line file, plus the file's line numbers per row."""
+
+    def __init__(self, index: IVFIndex, backend, lines: Dict[str, list[int]], stats: Dict[str, Any]):
+        self.index = index
+        self.backend = backend  # Queries must be embedded with the backend the index was built with
+        self.lines = lines  # key -> 1-based line numbers holding that exact comment
+        self.stats = stats
+
+    def row_info(self, row: int) -> Dict[str, Any]:
+        return {"comment": self.index.texts[row].rstrip("\n"), "lines": self.lines.get(self.index.keys[row], [])}
+
+
+_indexes: Dict[str, CommentIndex] = {}
+# asyncio locks belong to one event loop, so each loop gets its own (created on first use)
+_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = weakref.WeakKeyDictionary()
+_locks_guard = threading.Lock()
+
+
+def _path_lock(path: str) -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    with _locks_guard:
+        return _locks.setdefault(loop, {}).setdefault(path, asyncio.Lock())
+
+
+def _diff_comments(path: str, index: IVFIndex) -> tuple[Dict[str, list[int]], Dict[str, str], int]:
+    # Read and hash the file and drop rows for lines that are gone (which can retrain): blocking
+    with open(path, "r") as file:
+        texts = file.readlines()
+    keys = [text_key(text) for text in texts]
+    lines: Dict[str, list[int]] = {}
+    for number, key in enumerate(keys, 1):
+        lines.setdefault(key, []).append(number)
+
+    removed = [key for key in index._rows if key not in lines]
+    unique = {key: text for key, text in zip(keys, texts) if key not in index._rows}
+    if removed:
+        index.remove(removed)
+    return lines, unique, len(removed)
+
+
+async def _sync_comment_index(path: str, backend) -> CommentIndex:
+    # Caller holds the path's lock
+    model = backend.model
+    stat = os.stat(path)
+    source_stat = (stat.st_mtime_ns, stat.st_size)
+    cached = _indexes.get(path)
+    if cached is not None and cached.index.source_stat == source_stat and cached.index.model == model:
+        cached.stats = {"indexed": len(cached.index), "inserted": 0, "removed": 0,
+                        "embeddings_reused": 0, "embeddings_fetched": 0, "embedding_backend": backend.name}
+        return cached
+
+    index_path = ann_index_path(path)
+    index = None
+    if os.path.exists(index_path):
+        try:
+            index = await asyncio.to_thread(IVFIndex.load, index_path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Rebuilding unreadable ANN index {index_path}: {e}")
+    if index is None or index.model != model:
+        index = IVFIndex(model)
+
+    lines, unique, removed = await asyncio.to_thread(_diff_comments, path, index)
+    embedding_stats = {"embeddings_reused": 0, "embeddings_fetched": 0, "embedding_backend": backend.name}
+    if unique:
+        vectors, embedding_stats = await embedding_store.embed(list(unique.values()), backend)
+        await asyncio.to_thread(index.add, list(unique), list(unique.values()), vectors)
+    index.source_stat = source_stat
+    await asyncio.to_thread(index.save, index_path)
+
+    comment_index = CommentIndex(index, backend, lines, {"indexed": len(index), "inserted": len(unique),
+                                                         "removed": removed, **embedding_stats})
+    _indexes[path] = comment_index
+    return comment_index
+
+
+async def use_comment_index(input_file: str, operation: Callable[..., Any], *args,
+                            backend=None) -> tuple[Any, Dict[str, Any]]:
+    """Bring the index beside input_file up to date, then run operation(comment_index, *args) in a thread.
+
+    The index is loaded (or built) on first use and served from memory while the file is
+    unchanged. Otherwise new lines are embedded through the embedding store (only texts never
+    embedded before reach the API), removed lines are dropped, and the index is saved back next
+    to the file; switching backends rebuilds it. The sync and the operation both run under the
+    file's lock, so a concurrent request cannot modify the index while it is being read.
+    Returns the operation's result and the sync stats.
+    """
+    backend = backend or get_embedding_backend()
+    path = os.path.abspath(input_file)
+    async with _path_lock(path):
+        comment_index = await _sync_comment_index(path, backend)
+        result = await asyncio.to_thread(operation, comment_index, *args)
+        return result, dict(comment_index.stats)
+
+
+def nearest_comments(comment_index: CommentIndex, query: np.ndarray, k: int) -> list[Dict[str, Any]]:
+    """The k comments nearest to an embedded query, best first."""
+    return [{**comment_index.row_info(row), "similarity": round(score, 6)}
+            for row, score in comment_index.index.search(query, k)]
+
+
+def duplicate_clusters(comment_index: CommentIndex, threshold: float = ANN_DUPLICATE_THRESHOLD) -> list[Dict[str, Any]]:
+    """Group near-duplicate comments (and exact repeats) into clusters, largest first."""
+    index = comment_index.index
+    parent = list(range(len(index.keys)))
+
+    def find(row: int) -> int:
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for i, j, _ in index.duplicate_pairs(threshold):
+        parent[find(j)] = find(i)
+
+    groups: Dict[int, list[int]] = {}
+    for row in np.flatnonzero(index.alive).tolist():
+        groups.setdefault(find(row), []).append(row)
+    clusters = []
+    for rows in groups.values():
+        members = [comment_index.row_info(row) for row in rows]
+        if len(rows) > 1 or len(members[0]["lines"]) > 1:
+            members.sort(key=lambda member: member["lines"][:1])
+            clusters.append({"size": sum(len(member["lines"]) for member in members), "comments": members})
+    clusters.sort(key=lambda cluster: (-cluster["size"], cluster["comments"][0]["lines"][:1]))
+    return clusters
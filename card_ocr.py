@@ -0,0 +1,121 @@
+#card_ocr.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# datagen.a8_credit_card_image draws the number here with ImageFont.load_default()
+# (its .size = 60 assignment does not change the rendered size)
+CARD_NUMBER_ORIGIN = (50, 250)
+# The origin is also tried shifted by up to this many pixels in each direction
+CARD_ORIGIN_SEARCH = 2
+CARD_FOREGROUND = (255, 255, 255)
+# Mean absolute difference (0..1 ink coverage) above which a cell does not match any glyph
+CARD_MAX_GLYPH_ERROR = float(os.environ.get("CARD_MAX_GLYPH_ERROR", "0.08"))
+CARD_NUMBER_LENGTHS = range(12, 20)
+CARD_OCR_WORKERS = 8
+
+GLYPHS = "0123456789 "
+
+
+def luhn_valid(number: str) -> bool:
+    total = 0
+    for i, char in enumerate(reversed(number)):
+        digit = int(char)
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+class GlyphTemplates:
+    """Ink-coverage bitmaps of the digits and space, rendered with the font the card was drawn with."""
+
+    def __init__(self, font: Optional[ImageFont.ImageFont] = None):
+        self.font = font or ImageFont.load_default()
+        ascent, descent = self.font.getmetrics()
+        self.height = ascent + descent
+        self.widths = {}
+        groups = {}
+        for glyph in GLYPHS:
+            width = round(self.font.getlength(glyph))
+            canvas = Image.new("L", (width, self.height), 0)
+            ImageDraw.Draw(canvas).text((0, 0), glyph, fill=255, font=self.font)
+            self.widths[glyph] = width
+            groups.setdefault(width, []).append((glyph, np.asarray(canvas, dtype=np.float32) / 255.0))
+        # Glyphs of equal advance are stacked so each cell is compared with all of them at once
+        self.groups = [(width, [glyph for glyph, _ in group], np.stack([bitmap for _, bitmap in group]))
+                       for width, group in groups.items()]
+
+    def decode(self, ink: np.ndarray, x: int) -> Optional[str]:
+        """Read glyphs left to right from pen position x of an ink band; None if a cell matches nothing."""
+        text, blanks = "", 0
+        while x < ink.shape[1] and blanks < 2:  # Two spaces in a row: past the end of the number
+            best_error, best_glyph = None, None
+            for width, glyphs, stack in self.groups:
+                cell = ink[:, x:x + width]
+                if cell.shape[1] != width:
+                    continue
+                errors = np.abs(stack - cell).mean(axis=(1, 2))
+                best = int(np.argmin(errors))
+                if best_error is None or errors[best] < best_error:
+                    best_error, best_glyph = float(errors[best]), glyphs[best]
+            if best_glyph is None or best_error > CARD_MAX_GLYPH_ERROR:
+                return None
+            text += best_glyph
+            blanks = blanks + 1 if best_glyph == " " else 0
+            x += self.widths[best_glyph]
+        return text.strip()
+
+
+_templates: Optional[GlyphTemplates] = None
+
+
+def _ink(image: Image.Image, x: int, y: int, width: int, height: int) -> np.ndarray:
+    # Ink coverage per pixel, from the background (the band's median color) to CARD_FOREGROUND
+    band = np.asarray(image.crop((x, y, x + width, y + height)).convert("RGB"), dtype=np.float32)
+    background = np.median(band.reshape(-1, 3), axis=0)
+    channel = int(np.argmax(np.abs(np.array(CARD_FOREGROUND) - background)))
+    contrast = CARD_FOREGROUND[channel] - background[channel]
+    if contrast == 0:
+        return np.zeros(band.shape[:2], dtype=np.float32)
+    return np.clip((band[:, :, channel] - background[channel]) / contrast, 0.0, 1.0)
+
+
+def read_card_number(path: str) -> Optional[str]:
+    """Read the card number locally; None unless it has a plausible length and passes the Luhn check."""
+    global _templates
+    if _templates is None:
+        _templates = GlyphTemplates()
+    with Image.open(path) as image:
+        image.load()
+    origin_x, origin_y = CARD_NUMBER_ORIGIN
+    offsets = sorted(
+        ((dx, dy) for dx in range(-CARD_ORIGIN_SEARCH, CARD_ORIGIN_SEARCH + 1)
+         for dy in range(-CARD_ORIGIN_SEARCH, CARD_ORIGIN_SEARCH + 1)),
+        key=lambda offset: abs(offset[0]) + abs(offset[1]),
+    )
+    for dx, dy in offsets:
+        x, y = origin_x + dx, origin_y + dy
+        if x < 0 or y < 0 or y + _templates.height > image.height:
+            continue
+        text = _templates.decode(_ink(image, x, y, image.width - x, _templates.height), 0)
+        if text is None:
+            continue
+        number = text.replace(" ", "")
+        if number.isdigit() and len(number) in CARD_NUMBER_LENGTHS and luhn_valid(number):
+            return number
+    return None
+
+
+def read_card_numbers(paths: list[str], workers: int = CARD_OCR_WORKERS) -> list[Optional[str]]:
+    """read_card_number for a batch of images (PNG decoding releases the GIL)."""
+    if len(paths) <= 1:
+        return [read_card_number(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(read_card_number, paths))
@@ -0,0 +1,242 @@
+#contacts_sort.py
+
+import heapq
+import json
+import locale
+import operator
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+# Memory (estimated as RECORD_OVERHEAD x the JSON text) that a sort may use: inputs that fit are
+# sorted in memory, larger ones in runs that fit and are then merged from disk
+SORT_MEMORY_BUDGET = int(os.environ.get("SORT_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+# Parsed records take several times their JSON size in memory
+RECORD_OVERHEAD = 4
+# Maximum runs merged at once (each holds an open file)
+MERGE_FAN_IN = int(os.environ.get("SORT_MERGE_FAN_IN", "64"))
+SORT_TMP_DIR = os.environ.get("SORT_TMP_DIR")  # None: the system temp directory
+READ_BLOCK = 1024 * 1024
+# LC_COLLATE used by "locale" collation; the process default when unset
+SORT_LOCALE = os.environ.get("SORT_LOCALE")
+if SORT_LOCALE:
+    locale.setlocale(locale.LC_COLLATE, SORT_LOCALE)
+
+SORT_ORDERS = ("asc", "desc")
+COLLATIONS = {
+    "binary": None,
+    "casefold": str.casefold,
+    "locale": locale.strxfrm,
+}
+NULLS = ("first", "last")
+
+_WHITESPACE = " \t\n\r"
+_SEPARATORS = _WHITESPACE + ",]"
+
+
+def iter_json_array(file, block_size: int = READ_BLOCK) -> Iterator[tuple[Any, int]]:
+    """Yield (item, size of its JSON text) from a file holding one JSON array, without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        block = file.read(block_size)
+        if not block:
+            eof = True
+            return False
+        buffer = buffer[pos:] + block
+        pos = 0
+        return True
+
+    def skip_whitespace() -> Optional[str]:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return None
+
+    if skip_whitespace() != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if skip_whitespace() == "]":
+        return
+
+    while True:
+        if skip_whitespace() is None:
+            raise ValueError("Unterminated JSON array")
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value not followed by a separator may be cut short at the block end (e.g. "2." of "2.5")
+                if eof or (end < len(buffer) and buffer[end] in _SEPARATORS):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            if not fill():
+                item, end = decoder.raw_decode(buffer, pos)
+                break
+        yield item, end - pos
+        pos = end
+
+        separator = skip_whitespace()
+        if separator == "]":
+            return
+        if separator is None:
+            raise ValueError("Unterminated JSON array")
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {separator!r}")
+        pos += 1
+
+
+class _Descending:
+    """Inverts the ordering of a wrapped key component, for descending keys mixed with ascending ones."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def normalize_key_spec(spec: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Expand "last_name" or {"key": "last_name", ...} to a full key spec, validating its options."""
+    if isinstance(spec, str):
+        spec = {"key": spec}
+    spec = {"order": "asc", "collation": "binary", "nulls": "last", **spec}
+    if not isinstance(spec.get("key"), str):
+        raise ValueError(f"Sort key spec needs a 'key' name: {spec}")
+    if spec["order"] not in SORT_ORDERS:
+        raise ValueError(f"Sort order must be one of {SORT_ORDERS}, got {spec['order']!r}")
+    if spec["collation"] not in COLLATIONS:
+        raise ValueError(f"Collation must be one of {tuple(COLLATIONS)}, got {spec['collation']!r}")
+    if spec["nulls"] not in NULLS:
+        raise ValueError(f"Nulls must be one of {NULLS}, got {spec['nulls']!r}")
+    return spec
+
+
+def compile_sort_key(keys: list, null_safe: bool = False) -> tuple[Callable[[Any], Any], bool]:
+    """Compile key specs into (key function, reverse) for list.sort / heapq.merge.
+
+    When every key uses binary collation and the same direction, and null_safe is False, the
+    key is a single operator.itemgetter call (which raises KeyError on missing keys and
+    TypeError on nulls; retry with null_safe=True). Otherwise each component is a
+    (null rank, collated value) pair, so missing and None values sort first or last as asked,
+    with mixed directions handled by inverting the descending components.
+    """
+    specs = [normalize_key_spec(spec) for spec in keys]
+    names = [spec["key"] for spec in specs]
+    orders = {spec["order"] for spec in specs}
+    reverse = orders == {"desc"}
+
+    if not null_safe and len(orders) == 1 and all(spec["collation"] == "binary" for spec in specs):
+        return operator.itemgetter(*names), reverse
+
+    components = []
+    for spec in specs:
+        descending = spec["order"] == "desc"
+        # Null rank is chosen so nulls land where asked once the component's direction is applied
+        null_rank = int(descending == (spec["nulls"] == "first"))
+        invert = descending and not reverse
+        components.append((spec["key"], COLLATIONS[spec["collation"]], null_rank, 1 - null_rank, invert))
+
+    def key(record):
+        parts = []
+        for name, collate, null_rank, value_rank, invert in components:
+            value = record.get(name)
+            if value is None:
+                part = (null_rank, None)
+            else:
+                part = (value_rank, collate(value) if collate is not None and isinstance(value, str) else value)
+            parts.append(_Descending(part) if invert else part)
+        return tuple(parts)
+
+    return key, reverse
+
+
+def write_json_array(items: Iterable[Any], file):
+    """Stream items to file exactly as json.dump(list(items), file, indent=2) would write them."""
+    first = True
+    file.write("[")
+    for item in items:
+        file.write("\n  " if first else ",\n  ")
+        file.write(json.dumps(item, indent=2).replace("\n", "\n  "))
+        first = False
+    file.write("]" if first else "\n]")
+
+
+def _write_run(items: Iterable[Any], directory: str) -> str:
+    handle, path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+    with os.fdopen(handle, "w") as run:
+        for item in items:
+            run.write(json.dumps(item))
+            run.write("\n")
+    return path
+
+
+def _read_run(path: str) -> Iterator[Any]:
+    with open(path, "r") as run:
+        for line in run:
+            yield json.loads(line)
+
+
+def sort_json_array(input_file: str, output_file: str, key: Callable[[Any], Any], reverse: bool = False,
+                    memory_budget: int = SORT_MEMORY_BUDGET) -> Dict[str, Any]:
+    """Stable-sort the JSON array in input_file by key and write it to output_file with indent=2.
+
+    Inputs whose parsed records would not fit memory_budget (RECORD_OVERHEAD x their size) are
+    parsed incrementally into sorted runs on disk, which are then k-way merged with heapq.merge,
+    so memory stays bounded by the budget. Returns
+    {"records": n, "runs": number of on-disk runs (0 when sorted in memory)}.
+    """
+    # The same estimate decides both paths: parsed records take RECORD_OVERHEAD x their JSON size
+    if os.path.getsize(input_file) * RECORD_OVERHEAD <= memory_budget:
+        with open(input_file, "r") as f:
+            items = json.load(f)
+        items.sort(key=key, reverse=reverse)
+        with open(output_file, "w") as f:
+            json.dump(items, f, indent=2)
+        return {"records": len(items), "runs": 0}
+
+    run_budget = max(memory_budget // RECORD_OVERHEAD, 1)
+    with tempfile.TemporaryDirectory(dir=SORT_TMP_DIR) as directory:
+        runs, batch, batch_size, records = [], [], 0, 0
+        with open(input_file, "r") as f:
+            for item, size in iter_json_array(f):
+                batch.append(item)
+                batch_size += size
+                records += 1
+                if batch_size >= run_budget:
+                    batch.sort(key=key, reverse=reverse)
+                    runs.append(_write_run(batch, directory))
+                    batch, batch_size = [], 0
+        if batch:
+            batch.sort(key=key, reverse=reverse)
+            runs.append(_write_run(batch, directory))
+        run_count = len(runs)
+
+        # Merge in passes so no more than MERGE_FAN_IN runs are open at once.
+        # heapq.merge keeps equal keys in run order, so the whole sort stays stable.
+        while len(runs) > MERGE_FAN_IN:
+            merged = []
+            for start in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[start:start + MERGE_FAN_IN]
+                merged.append(_write_run(heapq.merge(*map(_read_run, group), key=key, reverse=reverse), directory))
+                for path in group:
+                    os.remove(path)
+            runs = merged
+
+        with open(output_file, "w") as f:
+            write_json_array(heapq.merge(*map(_read_run, runs), key=key, reverse=reverse), f)
+    return {"records": records, "runs": run_count}
@@ -0,0 +1,247 @@
+#date_parser.py
+
+import mmap
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Files at least this large are split on newline boundaries and counted in a process pool
+PARALLEL_THRESHOLD = int(os.environ.get("DATES_PARALLEL_THRESHOLD", str(32 * 1024 * 1024)))
+CHUNK_SIZE = int(os.environ.get("DATES_CHUNK_SIZE", str(16 * 1024 * 1024)))
+# Bytes parsed per vectorized pass; the index matrices take about 13x this, whatever the input size
+BLOCK_SIZE = int(os.environ.get("DATES_BLOCK_SIZE", str(1024 * 1024)))
+DATE_WORKERS = int(os.environ.get("DATES_WORKERS", str(os.cpu_count() or 1)))
+
+# Formats produced by datagen.a3_dates; lines in any other shape go through FALLBACK_FORMATS
+FALLBACK_FORMATS = ["%Y/%m/%d %H:%M:%S", "%b %d, %Y", "%Y-%m-%d", "%d-%b-%Y"]
+
+MONTHS = [b"jan", b"feb", b"mar", b"apr", b"may", b"jun", b"jul", b"aug", b"sep", b"oct", b"nov", b"dec"]
+MONTH_KEYS = np.array([(m[0] << 16) | (m[1] << 8) | m[2] for m in MONTHS], dtype=np.int64)
+MONTH_ORDER = np.argsort(MONTH_KEYS)
+
+# Line length, fixed separator bytes by column, and the columns holding each field.
+# Digit fields are (start, end) slices; "month" is a 3-letter abbreviation.
+SHAPES = [
+    {   # %Y-%m-%d
+        "length": 10, "separators": {4: b"-", 7: b"-"},
+        "fields": {"year": (0, 4), "month": (5, 7), "day": (8, 10)},
+    },
+    {   # %d-%b-%Y
+        "length": 11, "separators": {2: b"-", 6: b"-"},
+        "fields": {"day": (0, 2), "month_name": (3, 6), "year": (7, 11)},
+    },
+    {   # %b %d, %Y
+        "length": 12, "separators": {3: b" ", 6: b",", 7: b" "},
+        "fields": {"month_name": (0, 3), "day": (4, 6), "year": (8, 12)},
+    },
+    {   # %Y/%m/%d %H:%M:%S
+        "length": 19, "separators": {4: b"/", 7: b"/", 10: b" ", 13: b":", 16: b":"},
+        "fields": {"year": (0, 4), "month": (5, 7), "day": (8, 10), "hour": (11, 13), "minute": (14, 16), "second": (17, 19)},
+        "limits": {"hour": 23, "minute": 59, "second": 59},
+    },
+]
+
+
+def normalize_weekday(weekday: str) -> str:
+    """Map 'wednesday', 'Wednesdays', 'WED' etc. to 'Wednesday'; 'all' stays 'all'."""
+    name = weekday.strip().lower()
+    if name in ("all", "every", "each"):
+        return "all"
+    for day in WEEKDAYS:
+        if name in (day.lower(), day.lower() + "s") or (len(name) >= 3 and day.lower().startswith(name)):
+            return day
+    raise ValueError(f"Unknown weekday: {weekday}")
+
+
+def _digits(rows: np.ndarray, start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+    columns = rows[:, start:end].astype(np.int64) - 48
+    valid = ((columns >= 0) & (columns <= 9)).all(axis=1)
+    value = np.zeros(len(rows), dtype=np.int64)
+    for i in range(end - start):
+        value = value * 10 + columns[:, i]
+    return value, valid
+
+
+def _month_names(rows: np.ndarray, start: int) -> tuple[np.ndarray, np.ndarray]:
+    # strptime's %b is case-insensitive: fold ASCII letters to lower case before the lookup
+    letters = rows[:, start:start + 3].astype(np.int64) | 0x20
+    keys = (letters[:, 0] << 16) | (letters[:, 1] << 8) | letters[:, 2]
+    position = np.searchsorted(MONTH_KEYS[MONTH_ORDER], keys)
+    position = np.minimum(position, len(MONTHS) - 1)
+    valid = MONTH_KEYS[MONTH_ORDER][position] == keys
+    return MONTH_ORDER[position] + 1, valid
+
+
+def _parse_shape(rows: np.ndarray, shape: Dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+    """Parse rows (one line per row, as uint8) of one shape. Returns (days since epoch, valid mask)."""
+    valid = np.ones(len(rows), dtype=bool)
+    for column, byte in shape["separators"].items():
+        valid &= rows[:, column] == byte[0]
+
+    values = {}
+    for field, (start, end) in shape["fields"].items():
+        if field == "month_name":
+            values["month"], ok = _month_names(rows, start)
+        else:
+            values[field], ok = _digits(rows, start, end)
+        valid &= ok
+    for field, limit in shape.get("limits", {}).items():
+        valid &= values[field] <= limit
+
+    year, month, day = values["year"], values["month"], values["day"]
+    valid &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    # Clamp invalid rows to a safe date so the datetime64 arithmetic below cannot overflow
+    year, month, day = np.where(valid, year, 1970), np.where(valid, month, 1), np.where(valid, day, 1)
+
+    month_start = (year - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1).astype("timedelta64[M]")
+    days_in_month = ((month_start + np.timedelta64(1, "M")).astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(np.int64)
+    valid &= day <= days_in_month
+    days = month_start.astype("datetime64[D]").astype(np.int64) + day - 1
+    return days, valid
+
+
+def _fallback_weekday(line: bytes):
+    date_str = line.decode("utf-8", errors="replace").strip()
+    for fmt in FALLBACK_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).weekday()
+        except ValueError:
+            continue
+    return None
+
+
+def weekday_histogram(buffer, block_size: int = BLOCK_SIZE) -> Dict[str, Any]:
+    """Count dates per weekday in a buffer of newline-separated dates.
+
+    The buffer is parsed in newline-aligned blocks of about block_size bytes, so memory stays
+    bounded. In each block every line is classified once by length and separator positions;
+    each shape is then parsed for all of its lines at once with NumPy. Lines that fit no shape
+    (or fail validation) are retried with datetime.strptime. Blank lines are ignored.
+    Returns {"histogram": int64[7] (Monday first), "parsed": int, "rejected": int}.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    histogram = np.zeros(7, dtype=np.int64)
+    parsed = rejected = 0
+    for start, end in chunk_bounds(data, block_size):
+        block = _block_histogram(data[start:end])
+        histogram += block["histogram"]
+        parsed += block["parsed"]
+        rejected += block["rejected"]
+    return {"histogram": histogram, "parsed": parsed, "rejected": rejected}
+
+
+def _block_histogram(data: np.ndarray) -> Dict[str, Any]:
+    newlines = np.flatnonzero(data == 10)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+    ends = ends - ((ends > starts) & (data[np.maximum(ends - 1, 0)] == 13))  # CRLF
+    lengths = ends - starts
+
+    histogram = np.zeros(7, dtype=np.int64)
+    handled = np.zeros(len(starts), dtype=bool)
+    for shape in SHAPES:
+        selected = np.flatnonzero(lengths == shape["length"])
+        if not len(selected):
+            continue
+        rows = data[starts[selected][:, None] + np.arange(shape["length"])]
+        days, valid = _parse_shape(rows, shape)
+        histogram += np.bincount((days[valid] + 3) % 7, minlength=7)  # 1970-01-01 was a Thursday
+        handled[selected[valid]] = True
+
+    parsed = int(handled.sum())
+    rejected = 0
+    for i in np.flatnonzero(~handled & (lengths > 0)):
+        line = bytes(data[starts[i]:ends[i]])
+        if not line.strip():
+            continue
+        weekday = _fallback_weekday(line)
+        if weekday is None:
+            rejected += 1
+        else:
+            histogram[weekday] += 1
+            parsed += 1
+    return {"histogram": histogram, "parsed": parsed, "rejected": rejected}
+
+
+def _find_newline(buffer, position: int) -> int:
+    if isinstance(buffer, np.ndarray):
+        for start in range(position, len(buffer), 64 * 1024):
+            found = np.flatnonzero(buffer[start:start + 64 * 1024] == 10)
+            if len(found):
+                return start + int(found[0])
+        return -1
+    return buffer.find(b"\n", position)
+
+
+def chunk_bounds(buffer, chunk_size: int = CHUNK_SIZE) -> list[tuple[int, int]]:
+    """Split a buffer (mmap, bytes or uint8 array) into (start, end) ranges of about chunk_size bytes, ending on newlines."""
+    bounds, start, size = [], 0, len(buffer)
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = _find_newline(buffer, end)
+            end = size if newline == -1 else newline + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _count_chunk(file_path: str, start: int, end: int) -> Dict[str, Any]:
+    # Runs in a worker process: map the file again and count only this chunk
+    with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)[start:end]
+        try:
+            return weekday_histogram(view)
+        finally:
+            view.release()
+
+
+def count_weekdays_in_file(file_path: str, parallel: Optional[bool] = None, workers: int = DATE_WORKERS,
+                           chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Count dates per weekday in a file.
+
+    The file is memory-mapped. Files of PARALLEL_THRESHOLD bytes or more (or any file when
+    parallel=True) are split into newline-aligned chunks of about chunk_size bytes whose
+    histograms are computed in a process pool and merged.
+    """
+    started = time.perf_counter()
+    histogram = np.zeros(7, dtype=np.int64)
+    parsed = rejected = chunks = 0
+
+    size = os.path.getsize(file_path)
+    if size:
+        if parallel is None:
+            parallel = size >= PARALLEL_THRESHOLD and workers > 1
+        with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            bounds = chunk_bounds(mapped, chunk_size) if parallel else [(0, size)]
+            if len(bounds) > 1:
+                # spawn, not fork: the app process runs threads (uvicorn, dispatch pool, BLAS)
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=min(workers, len(bounds)), mp_context=context) as pool:
+                    results = list(pool.map(_count_chunk, [file_path] * len(bounds), *zip(*bounds)))
+            else:
+                view = memoryview(mapped)
+                try:
+                    results = [weekday_histogram(view)]
+                finally:
+                    view.release()
+        for result in results:
+            histogram += result["histogram"]
+            parsed += result["parsed"]
+            rejected += result["rejected"]
+        chunks = len(results)
+
+    return {
+        "counts": {day: int(n) for day, n in zip(WEEKDAYS, histogram)},
+        "parsed": parsed,
+        "rejected": rejected,
+        "chunks": chunks,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
@@ -0,0 +1,259 @@
+#dispatch.py
+
+import asyncio
+import functools
+import glob
+import inspect
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+from fastapi import HTTPException
+
+from tools import tools
+from router import is_path_param
+import functions
+
+# Sync handlers (file, subprocess and SQLite work) run here instead of on the event loop
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", "8"))
+
+JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+def never_delete(file: str = None):
+    raise HTTPException(status_code=400, detail="Deletion of data is not permitted anywhere on the file system")
+
+
+# Tool name (as in tools.py) -> handler, plus any schema argument names the handler calls differently
+HANDLERS: Dict[str, tuple[Callable, Dict[str, str]]] = {
+    "run_uv_script": (functions.run_uv_script, {}),                      #Task A1
+    "format_file": (functions.format_file, {}),                          #Task A2
+    "count_weekdays": (functions.count_weekdays, {}),                    #Task A3
+    "sort_contacts": (functions.sort_contacts, {}),                      #Task A4
+    "write_recent_logs": (functions.write_recent_logs, {}),              #Task A5
+    "extract_lines": (functions.extract_lines, {}),                      #Task A5
+    "extract_markdown_headers": (functions.extract_markdown_headers, {}),  #Task A6
+    "search_headings": (functions.search_headings, {}),                  #Task A6
+    "write_email_eddress": (functions.write_email_eddress, {}),          #Task A7
+    "extract_email_batch": (functions.extract_email_batch, {}),          #Task A7
+    "write_credit_card_no": (functions.write_credit_card_no, {}),        #Task A8
+    "similar_comments": (functions.similar_comments, {}),                #Task A9
+    "similar_to_comment": (functions.similar_to_comment, {}),            #Task A9
+    "comment_duplicates": (functions.comment_duplicates, {}),            #Task A9
+    "calculate_gold_sales": (functions.calculate_gold_sales, {"input_file": "db_path", "output_file": "output_path"}),  #Task A10
+    "never_delete": (never_delete, {}),                                  #Task B2
+}
+
+
+def _check_type(value: Any, schema: Dict[str, Any], name: str) -> Any:
+    if "anyOf" in schema:
+        errors = []
+        for option in schema["anyOf"]:
+            try:
+                return _check_type(value, option, name)
+            except ValueError as e:
+                errors.append(str(e))
+        raise ValueError(" ".join(errors))
+
+    expected = schema.get("type")
+    if expected == "integer" and isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        value = int(value)  # The LLM occasionally quotes numbers
+    if expected in JSON_TYPES:
+        if not isinstance(value, JSON_TYPES[expected]) or (expected in ("integer", "number") and isinstance(value, bool)):
+            raise ValueError(f"Parameter '{name}' must be of type {expected}.")
+    if "enum" in schema and value not in schema["enum"]:
+        raise ValueError(f"Parameter '{name}' must be one of {schema['enum']}.")
+    if expected == "array" and "items" in schema:
+        value = [_check_type(item, schema["items"], name) for item in value]
+    if expected == "object" and "properties" in schema:
+        missing = [key for key in schema.get("required", []) if key not in value]
+        if missing:
+            raise ValueError(f"Parameter '{name}' is missing {', '.join(missing)}.")
+        value = dict(value)
+        for key, item_schema in schema["properties"].items():
+            if key in value:
+                value[key] = _check_type(value[key], item_schema, f"{name}.{key}")
+    return value
+
+
+class Tool:
+    """A tools.py entry bound to its handler, with an argument validator built from its schema."""
+
+    def __init__(self, schema: Dict[str, Any], handler: Callable, renames: Dict[str, str]):
+        self.name = schema["name"]
+        self.handler = handler
+        self.is_async = inspect.iscoroutinefunction(handler)
+        self.properties = schema["parameters"]["properties"]
+        self.required = schema["parameters"].get("required", [])
+        self.path_params = {name for name in self.properties if is_path_param(name)}
+        self.output_params = {name for name in self.path_params if name.startswith("output")}
+        self.renames = renames
+
+    def validate(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Check arguments against the schema and return handler keyword arguments.
+
+        Raises ValueError for missing or mistyped parameters and HTTPException for paths
+        outside /data.
+        """
+        missing = [name for name in self.required if arguments.get(name) in (None, "", [])]
+        if missing:
+            raise ValueError(f"Missing required parameters: {', '.join(missing)}.")
+
+        kwargs = {}
+        for name, value in arguments.items():
+            if name not in self.properties:
+                logging.warning(f"Ignoring unexpected argument '{name}' for {self.name}")
+                continue
+            if value is None:
+                continue
+            value = _check_type(value, self.properties[name], name)
+            if name in self.path_params:
+                value = functions.normalize_path(value)
+            kwargs[self.renames.get(name, name)] = value
+        return kwargs
+
+    def access(self, arguments: Dict[str, Any]) -> tuple[set, set]:
+        """Return the (read, written) paths of a call, used to order calls that touch the same files.
+
+        Tools without an output path write to their inputs in place (e.g. format_file), and tools
+        without any path argument (e.g. run_uv_script) are assumed to write anywhere under /data.
+        """
+        if not self.path_params:
+            return set(), {"data"}
+        reads, writes = set(), set()
+        for name in self.path_params:
+            if arguments.get(name):
+                path = os.path.normpath(functions.normalize_path(arguments[name])).lstrip("/")
+                while glob.has_magic(path):  # A glob pattern touches everything under its fixed prefix
+                    path = os.path.dirname(path)
+                (writes if name in self.output_params else reads).add(path)
+        if not self.output_params:
+            writes |= reads
+        return reads, writes
+
+
+def _overlaps(paths: set, others: set) -> bool:
+    # Equal paths, or one is a directory containing the other
+    return any(a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep) for a in paths for b in others)
+
+
+class Dispatcher:
+    def __init__(self, tools: list[Dict[str, Any]], handlers: Dict[str, tuple[Callable, Dict[str, str]]],
+                 max_workers: int = DISPATCH_WORKERS):
+        self.tools = {}
+        for tool in tools:
+            name = tool["function"]["name"]
+            if name not in handlers:
+                logging.warning(f"No handler registered for tool '{name}'")
+                continue
+            handler, renames = handlers[name]
+            self.tools[name] = Tool(tool["function"], handler, renames)
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dispatch")
+        return self._executor
+
+    def prepare(self, name: str, arguments: Dict[str, Any]) -> tuple[Tool, Dict[str, Any]]:
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ValueError("Could not determine the appropriate function")
+        return tool, tool.validate(arguments)
+
+    async def run(self, tool: Tool, kwargs: Dict[str, Any]) -> Any:
+        if tool.is_async:
+            return await tool.handler(**kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(tool.handler, **kwargs))
+
+    async def dispatch(self, name: str, arguments: Dict[str, Any]) -> Any:
+        if name not in self.tools:
+            return {"error": "Could not determine the appropriate function"}
+        try:
+            tool, kwargs = self.prepare(name, arguments)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        return await self.run(tool, kwargs)
+
+    async def dispatch_many(self, calls: list[tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Run several tool calls from one completion, concurrently where their files don't overlap.
+
+        A call waits for every earlier call that writes something it reads or writes, or that
+        reads something it writes; all other calls start immediately.
+        """
+        started = time.perf_counter()
+        entries = []
+        for name, arguments in calls:
+            entry = {"tool": name, "arguments": arguments, "depends_on": []}
+            try:
+                entry["tool_obj"], entry["kwargs"] = self.prepare(name, arguments)
+                entry["reads"], entry["writes"] = entry["tool_obj"].access(arguments)
+            except (ValueError, HTTPException) as e:
+                entry["result"] = {"success": False, "message": getattr(e, "detail", str(e))}
+            entries.append(entry)
+
+        runnable = [i for i, entry in enumerate(entries) if "result" not in entry]
+        for position, j in enumerate(runnable):
+            later = entries[j]
+            for i in runnable[:position]:
+                earlier = entries[i]
+                if (_overlaps(earlier["writes"], later["reads"] | later["writes"])
+                        or _overlaps(earlier["reads"], later["writes"])):
+                    later["depends_on"].append(i)
+
+        tasks: Dict[int, asyncio.Task] = {}
+
+        async def run_entry(entry: Dict[str, Any]):
+            if entry["depends_on"]:
+                await asyncio.gather(*(tasks[i] for i in entry["depends_on"]), return_exceptions=True)
+            call_started = time.perf_counter()
+            entry["started_ms"] = round((call_started - started) * 1000, 3)
+            try:
+                entry["result"] = await self.run(entry["tool_obj"], entry["kwargs"])
+            except HTTPException as e:
+                entry["result"] = {"success": False, "status_code": e.status_code, "message": e.detail}
+            except Exception as e:
+                logging.error(f"Tool call {entry['tool']} failed: {e}")
+                entry["result"] = {"success": False, "message": str(e)}
+            entry["elapsed_ms"] = round((time.perf_counter() - call_started) * 1000, 3)
+
+        for i in runnable:  # Dependencies always come earlier, so their tasks already exist
+            tasks[i] = asyncio.create_task(run_entry(entries[i]))
+        await asyncio.gather(*tasks.values())
+
+        results = []
+        for entry in entries:
+            result = entry["result"]
+            results.append({
+                "tool": entry["tool"],
+                "arguments": entry["arguments"],
+                "depends_on": entry["depends_on"],
+                "started_ms": entry.get("started_ms"),
+                "elapsed_ms": entry.get("elapsed_ms"),
+                "result": result,
+            })
+        return {
+            "success": all(isinstance(r["result"], dict) and r["result"].get("success", False) for r in results),
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+dispatcher = Dispatcher(tools, HANDLERS)
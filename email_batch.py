@@ -0,0 +1,237 @@
+#email_batch.py
+
+import asyncio
+import csv
+import json
+import logging
+import mailbox
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email.errors import HeaderParseError
+from typing import Dict, Any, Iterator, Optional
+
+from email_extract import parse_headers, header_values
+from query_gpt import get_client, call_timeout, AI_PROXY_URL, GPT_MODEL, CHAT_TIMEOUT
+
+# Archives with at least this many messages are parsed in a process pool
+EMAIL_PARALLEL_THRESHOLD = int(os.environ.get("EMAIL_PARALLEL_THRESHOLD", "2000"))
+EMAIL_WORKERS = int(os.environ.get("EMAIL_WORKERS", str(os.cpu_count() or 1)))
+EMAIL_CHUNK_SIZE = 500  # Messages per worker task
+# Messages whose headers could not be parsed are sent to the LLM this many per request,
+# with at most EMAIL_LLM_CONCURRENCY requests in flight
+EMAIL_LLM_BATCH = int(os.environ.get("EMAIL_LLM_BATCH", "20"))
+EMAIL_LLM_CONCURRENCY = int(os.environ.get("EMAIL_LLM_CONCURRENCY", "4"))
+# Header bytes sent to the LLM per message
+EMAIL_LLM_HEADER_BYTES = 4096
+
+EMAIL_FIELDS = ["from", "to", "cc", "date", "subject"]
+ADDRESS_FIELDS = ("from", "to", "cc")
+ROW_COLUMNS = ["key"] + EMAIL_FIELDS + ["method"]
+OUTPUT_FORMATS = ("csv", "jsonl")
+
+HEADER_END_RE = re.compile(rb"\r?\n\r?\n")
+
+
+def header_block(data: bytes) -> bytes:
+    match = HEADER_END_RE.search(data)
+    return data[:match.end()] if match else data
+
+
+def open_archive(path: str) -> mailbox.Mailbox:
+    """Open a maildir directory (with cur/ and new/) or an mbox file, without creating anything.
+
+    Raises FileNotFoundError if there is no archive at path.
+    """
+    if os.path.isdir(path):
+        if not (os.path.isdir(os.path.join(path, "cur")) and os.path.isdir(os.path.join(path, "new"))):
+            raise ValueError(f"{path} is not a maildir (no cur/ and new/ subdirectories)")
+        return mailbox.Maildir(path, factory=None, create=False)
+    try:
+        return mailbox.mbox(path, factory=None, create=False)
+    except mailbox.NoSuchMailboxError:
+        raise FileNotFoundError(f"Mail archive not found at {path}") from None
+
+
+def iter_headers(archive: mailbox.Mailbox) -> Iterator[tuple[str, bytes]]:
+    """Yield (key, header block) per message; only the headers travel on to the parser."""
+    for key in archive.iterkeys():
+        try:
+            yield str(key), header_block(archive.get_bytes(key))
+        except (KeyError, OSError) as e:  # A maildir message removed while streaming
+            logging.warning(f"Skipping message {key}: {e}")
+
+
+def parse_row(key: str, headers: bytes) -> Dict[str, Any]:
+    """Extract EMAIL_FIELDS from a header block. method is None when the sender could not be found."""
+    row = {"key": key, "method": "local"}
+    try:
+        message = parse_headers(headers)
+        for field in EMAIL_FIELDS:
+            values = header_values(message, field.capitalize())
+            # Address fields stay lists; date and subject are single values
+            row[field] = values if values is None or field in ADDRESS_FIELDS else values[0]
+    except (HeaderParseError, ValueError, LookupError):
+        row.update({field: None for field in EMAIL_FIELDS})
+    if not row["from"]:
+        row["method"] = None
+    return row
+
+
+def _parse_chunk(chunk: list[tuple[str, bytes]]) -> list[Dict[str, Any]]:
+    return [parse_row(key, headers) for key, headers in chunk]
+
+
+def _chunks(items: Iterator, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class RowWriter:
+    """Writes rows as CSV (lists joined with '; ') or JSON Lines."""
+
+    def __init__(self, file, output_format: str):
+        self.format = output_format
+        self.file = file
+        if output_format == "csv":
+            self.csv = csv.DictWriter(file, fieldnames=ROW_COLUMNS)
+            self.csv.writeheader()
+
+    def write(self, row: Dict[str, Any]):
+        if self.format == "csv":
+            self.csv.writerow({
+                column: "; ".join(value) if isinstance(value, list) else value for column, value in row.items()
+            })
+        else:
+            self.file.write(json.dumps(row) + "\n")
+
+
+def _parse_archive(archive: mailbox.Mailbox, writer: RowWriter, parallel: Optional[bool],
+                   workers: int) -> tuple[Dict[str, int], list]:
+    # Blocking phase: stream the archive, parse headers locally, write rows as they come
+    counts = {"messages": 0, "local": 0}
+    pending = []
+    if parallel is None:
+        parallel = workers > 1 and len(archive) >= EMAIL_PARALLEL_THRESHOLD
+    chunks = _chunks(iter_headers(archive), EMAIL_CHUNK_SIZE)
+    if parallel:
+        # spawn, not fork: the app process runs threads (uvicorn, dispatch pool)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            headers_by_key = {}
+            # Keep only a bounded window of chunks in flight so huge archives stream
+            futures = []
+            for chunk in chunks:
+                headers_by_key.update(chunk)
+                futures.append(pool.submit(_parse_chunk, chunk))
+                if len(futures) >= workers * 2:
+                    pending += _write_rows(futures.pop(0).result(), writer, counts, headers_by_key)
+            for future in futures:
+                pending += _write_rows(future.result(), writer, counts, headers_by_key)
+    else:
+        for chunk in chunks:
+            pending += _write_rows(_parse_chunk(chunk), writer, counts, dict(chunk))
+    return counts, pending
+
+
+def _write_rows(rows: list[Dict[str, Any]], writer: RowWriter, counts: Dict[str, int],
+                headers_by_key: Dict[str, bytes]) -> list[tuple[Dict[str, Any], bytes]]:
+    pending = []
+    for row in rows:
+        counts["messages"] += 1
+        headers = headers_by_key.pop(row["key"], b"")
+        if row["method"] is None:
+            pending.append((row, headers))
+        else:
+            counts["local"] += 1
+            writer.write(row)
+    return pending
+
+
+async def _ask_llm(batch: list[tuple[Dict[str, Any], bytes]], semaphore: asyncio.Semaphore) -> list[Dict[str, Any]]:
+    messages = "\n\n".join(
+        f"### Message {i}\n{headers[:EMAIL_LLM_HEADER_BYTES].decode('utf-8', errors='replace')}"
+        for i, (_, headers) in enumerate(batch)
+    )
+    prompt = (
+        "For each email header block below, extract the sender's email address and the recipient (To) "
+        "and Cc email addresses. Answer with a JSON object "
+        '{"messages": [{"index": <n>, "from": "<address or empty>", "to": [...], "cc": [...]}, ...]} '
+        "with one entry per message.\n\n" + messages
+    )
+    async with semaphore:
+        try:
+            response = await get_client().post(
+                AI_PROXY_URL,
+                json={
+                    "model": GPT_MODEL,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "response_format": {"type": "json_object"},
+                },
+                timeout=call_timeout(CHAT_TIMEOUT),
+            )
+            response.raise_for_status()
+            answers = json.loads(response.json()["choices"][0]["message"]["content"])["messages"]
+        except Exception as e:
+            logging.error(f"LLM fallback failed for {len(batch)} messages: {e}")
+            answers = []
+
+    by_index = {answer.get("index"): answer for answer in answers if isinstance(answer, dict)}
+    rows = []
+    for i, (row, _) in enumerate(batch):
+        answer = by_index.get(i)
+        if answer and answer.get("from"):
+            row = {**row, "method": "llm", "from": [answer["from"]],
+                   "to": row["to"] or answer.get("to") or None, "cc": row["cc"] or answer.get("cc") or None}
+        else:
+            row = {**row, "method": "failed"}
+        rows.append(row)
+    return rows
+
+
+async def extract_archive(path: str, output_file: str, output_format: Optional[str] = None,
+                          parallel: Optional[bool] = None, workers: int = EMAIL_WORKERS) -> Dict[str, Any]:
+    """Write sender, recipients, date and subject of every message in an mbox or maildir to CSV or JSONL.
+
+    Headers are parsed locally (in a process pool for large archives) and rows are written as they
+    are parsed. Messages whose sender cannot be parsed are sent to the LLM in batches of
+    EMAIL_LLM_BATCH, EMAIL_LLM_CONCURRENCY requests at a time, and appended at the end.
+    """
+    started = time.perf_counter()
+    output_format = output_format or ("jsonl" if output_file.endswith((".jsonl", ".json")) else "csv")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+
+    # Opened first, so a missing archive leaves no output file behind
+    archive = await asyncio.to_thread(open_archive, path)
+    try:
+        with open(output_file, "w", newline="" if output_format == "csv" else None, encoding="utf-8") as file:
+            writer = RowWriter(file, output_format)
+            counts, pending = await asyncio.to_thread(_parse_archive, archive, writer, parallel, workers)
+
+            counts["llm"] = counts["failed"] = 0
+            if pending:
+                semaphore = asyncio.Semaphore(EMAIL_LLM_CONCURRENCY)
+                batches = [pending[i:i + EMAIL_LLM_BATCH] for i in range(0, len(pending), EMAIL_LLM_BATCH)]
+                for rows in await asyncio.gather(*(_ask_llm(batch, semaphore) for batch in batches)):
+                    for row in rows:
+                        counts[row["method"]] += 1
+                        writer.write(row)
+    finally:
+        archive.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **counts,
+        "llm_requests": -(-len(pending) // EMAIL_LLM_BATCH),
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "messages_per_second": round(counts["messages"] / elapsed) if elapsed else None,
+    }
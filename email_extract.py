@@ -0,0 +1,87 @@
+#email_extract.py
+
+import email.utils
+import re
+from email.errors import HeaderParseError
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesHeaderParser
+from typing import Optional
+
+# Field names accepted by write_email_eddress -> RFC 5322 header
+HEADER_FIELDS = {
+    "from": "From", "sender": "From",
+    "to": "To", "recipient": "To", "recipients": "To",
+    "cc": "Cc",
+    "date": "Date",
+    "subject": "Subject",
+}
+ADDRESS_HEADERS = {"From", "To", "Cc"}
+ADDRESS_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+# One entry of a plain address list: 'a@b.c', 'Name <a@b.c>' or '"Name, Jr." <a@b.c>'.
+# Lists with comments, escapes or group syntax go through email.utils.getaddresses instead.
+SIMPLE_ADDRESS_RE = re.compile(r'\s*(?:(?:[^<>",()\\:;@]*|"[^"\\]*")\s*<([^<>\s@]+@[^<>\s@]+)>|([^<>\s@",()\\:;]+@[^<>\s@",()\\:;]+))\s*')
+
+# Parses the header block only; the body is never decoded
+_parser = BytesHeaderParser()
+
+
+def header_for(field: str) -> Optional[str]:
+    """Map a requested field ('from', 'Sender', 'cc:' ...) to its header, or None if parsing cannot answer it."""
+    return HEADER_FIELDS.get(field.strip().lower().rstrip(":"))
+
+
+def parse_headers(data: bytes) -> Message:
+    return _parser.parsebytes(data)
+
+
+def _simple_addresses(value: str) -> Optional[list[str]]:
+    # getaddresses is a pure-Python tokenizer; this regex walk is several times faster on plain lists
+    addresses, position = [], 0
+    while True:
+        match = SIMPLE_ADDRESS_RE.match(value, position)
+        if match is None:
+            return None
+        addresses.append(match.group(1) or match.group(2))
+        position = match.end()
+        if position == len(value):
+            return addresses
+        if value[position] != ",":
+            return None
+        position += 1
+
+
+def parse_addresses(values: list[str]) -> list[str]:
+    addresses = []
+    for value in values:
+        simple = _simple_addresses(value)
+        addresses += simple if simple is not None else [address for _, address in email.utils.getaddresses([value])]
+    return addresses
+
+
+def header_values(message: Message, header: str) -> Optional[list[str]]:
+    """Return the addresses (From: just the first) or the decoded text of a header, or None if absent or invalid."""
+    values = message.get_all(header)
+    if not values:
+        return None
+    if header in ADDRESS_HEADERS:
+        addresses = [address for address in parse_addresses(values) if ADDRESS_RE.match(address)]
+        if header == "From":
+            addresses = addresses[:1]
+        return addresses or None
+    value = values[0]
+    if "=?" in value or "\n" in value:  # RFC 2047 encoded words or folding
+        value = str(make_header(decode_header(value)))
+    value = value.strip()
+    return [value] if value else None
+
+
+def extract_field(data: bytes, field: str = "from") -> Optional[list[str]]:
+    """Extract a field from a raw RFC 5322 message with the stdlib parser; None means escalate to the LLM."""
+    header = header_for(field)
+    if header is None:
+        return None
+    try:
+        return header_values(parse_headers(data), header)
+    except (HeaderParseError, ValueError, LookupError):  # Malformed headers or unknown charsets
+        return None
@@ -0,0 +1,105 @@
+#embedding_backends.py
+
+import asyncio
+import os
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+from query_gpt import query_embeddings
+
+# "remote" (the AI Proxy embeddings endpoint) or "local" (hashed character n-grams, no network)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "remote")
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Hashed feature space of the local backend; 2048 float32 per text is on the order of the remote model's 1536
+EMBEDDING_LOCAL_DIM = int(os.environ.get("EMBEDDING_LOCAL_DIM", "2048"))
+EMBEDDING_LOCAL_NGRAMS = (3, 5)
+# Inputs larger than this (in characters) are vectorized off the event loop
+EMBEDDING_LOCAL_INLINE_CHARS = 100_000
+
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SEPARATOR = 0  # Code point joining texts; no n-gram may span it
+
+
+class RemoteEmbeddingBackend:
+    """The AI Proxy embeddings endpoint. Vectors are worth caching: every miss costs an API request."""
+
+    name = "remote"
+    cacheable = True
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(await query_embeddings(texts, self.model), dtype=np.float32).reshape(len(texts), -1)
+
+
+class HashedNgramBackend:
+    """Offline embeddings: signed, hashed character n-gram counts with sublinear TF, L2-normalized.
+
+    Texts are lower-cased and padded with a space so n-grams at word edges are kept. All n-grams
+    of a batch are hashed at once with a vectorized polynomial hash of the code points (stable
+    across processes, unlike hash()), summed into a SciPy CSR matrix and densified to float32.
+    Each vector depends only on its own text, so vectors stay comparable across calls.
+    """
+
+    name = "local"
+    cacheable = False  # Recomputing is cheaper than a store lookup
+
+    def __init__(self, dim: int = EMBEDDING_LOCAL_DIM, ngrams: tuple[int, int] = EMBEDDING_LOCAL_NGRAMS):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.model = f"char-ngram-{ngrams[0]}-{ngrams[1]}-{dim}"
+
+    def vectorize(self, texts: list[str]) -> sparse.csr_matrix:
+        padded = [f" {' '.join(text.lower().split())} " for text in texts]
+        codes = np.frombuffer("\0".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        lengths = np.fromiter((len(text) + 1 for text in padded), dtype=np.int64, count=len(padded))
+        documents = np.repeat(np.arange(len(padded)), lengths)[:len(codes)]
+        separators = np.concatenate([[0], np.cumsum(codes == _SEPARATOR)])
+
+        rows, columns, values = [], [], []
+        for n in range(self.ngrams[0], self.ngrams[1] + 1):
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):  # uint64 arithmetic wraps, which is the modulus
+                hashes = hashes * _HASH_MULTIPLIER + codes[offset:offset + count]
+            hashes = (hashes ^ (hashes >> np.uint64(29))) * _HASH_MIX
+            valid = separators[n:] == separators[:count]
+            rows.append(documents[:count][valid])
+            columns.append((hashes[valid] % np.uint64(self.dim)).astype(np.int64))
+            # The top bit picks a sign, so colliding n-grams cancel out instead of piling up
+            values.append(np.where(hashes[valid] >> np.uint64(63), -1.0, 1.0).astype(np.float32))
+
+        counts = sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(len(texts), self.dim), dtype=np.float32,
+        ) if rows else sparse.csr_matrix((len(texts), self.dim), dtype=np.float32)
+        counts.sum_duplicates()
+        counts.data = np.sign(counts.data) * np.log1p(np.abs(counts.data))  # Sublinear TF
+        norms = np.sqrt(counts.multiply(counts).sum(axis=1)).A1
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms).dot(counts).tocsr().astype(np.float32)
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if sum(map(len, texts)) > EMBEDDING_LOCAL_INLINE_CHARS:
+            return (await asyncio.to_thread(self.vectorize, texts)).toarray()
+        return self.vectorize(texts).toarray()
+
+
+BACKENDS = {"remote": RemoteEmbeddingBackend, "local": HashedNgramBackend}
+_backends = {}
+
+
+def get_embedding_backend(name: Optional[str] = None):
+    """Return the (shared) backend called name, by default the one configured by EMBEDDING_BACKEND."""
+    name = (name or EMBEDDING_BACKEND).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND must be one of {tuple(BACKENDS)}, got {name!r}")
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
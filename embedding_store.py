@@ -0,0 +1,108 @@
+#embedding_store.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from embedding_backends import get_embedding_backend
+
+EMBEDDING_STORE_PATH = os.environ.get("EMBEDDING_STORE_PATH", ".cache/embeddings.sqlite")
+# SQLite's default limit on host parameters is 999 in older builds
+EMBEDDING_LOOKUP_CHUNK = 500
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite store of float32 embedding vectors keyed on (sha256(text), model).
+
+    Vectors are stored as raw little-endian float32 BLOBs, so a lookup is a primary-key
+    read plus np.frombuffer, and a changed file only costs its new lines.
+    """
+
+    def __init__(self, path: str = EMBEDDING_STORE_PATH):
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT NOT NULL, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (key, model)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, keys: list[str], model: str) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            db = self._db()
+            for i in range(0, len(keys), EMBEDDING_LOOKUP_CHUNK):
+                chunk = keys[i:i + EMBEDDING_LOOKUP_CHUNK]
+                rows = db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({', '.join('?' * len(chunk))})",
+                    [model, *chunk],
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype="<f4")
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray], model: str):
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                    [(key, model, len(vector), np.asarray(vector, dtype="<f4").tobytes()) for key, vector in vectors.items()],
+                )
+
+    async def embed(self, texts: list[str], backend=None) -> tuple[np.ndarray, Dict[str, Any]]:
+        """Embed texts as an (n, dim) float32 matrix with backend (default: the EMBEDDING_BACKEND one).
+
+        For a cacheable backend only texts not already stored under its model are sent to it, once
+        each. Returns the matrix and {"embeddings_reused", "embeddings_fetched", "embedding_backend"}.
+        """
+        backend = backend or get_embedding_backend()
+        if not backend.cacheable:
+            return await backend.embed(texts), {"embeddings_reused": 0, "embeddings_fetched": 0,
+                                                "embedding_backend": backend.name}
+
+        keys = [text_key(text) for text in texts]
+        # SQLite reads and writes run in a thread so the event loop never blocks on them
+        vectors = await asyncio.to_thread(self.get_many, list(dict.fromkeys(keys)), backend.model)
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            fetched = await backend.embed(list(missing.values()))
+            new_vectors = dict(zip(missing, fetched))
+            await asyncio.to_thread(self.put_many, new_vectors, backend.model)
+            vectors.update(new_vectors)
+            logging.info(f"Embedding store: {len(missing)} texts embedded with {backend.model}")
+
+        reused = sum(1 for key in keys if key not in missing)
+        self.stats["hits"] += reused
+        self.stats["misses"] += len(missing)
+        matrix = np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+        return matrix, {"embeddings_reused": reused, "embeddings_fetched": len(missing), "embedding_backend": backend.name}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_store = EmbeddingStore()
@@ -1,17 +1,30 @@
 #functions.py
 
 import os
+import asyncio
 import subprocess
 import json
 from datetime import datetime
 import logging
 import glob
 from fastapi import HTTPException
-import numpy as np
 import requests 
-from sklearn.metrics.pairwise import cosine_similarity
 
 from query_gpt import *
+from prettier_worker import format_with_manifest
+from date_parser import normalize_weekday, count_weekdays_in_file
+from contacts_sort import sort_json_array, compile_sort_key
+from log_index import get_log_index
+from line_extract import extract_lines as extract_file_lines
+from md_index import build_h1_index
+from heading_index import heading_index
+from email_extract import extract_field as extract_email_field, header_for
+from email_batch import extract_archive
+from card_ocr import read_card_numbers
+from embedding_store import embedding_store
+from pair_search import top_pairs
+from ann_index import use_comment_index, nearest_comments, duplicate_clusters, ANN_DUPLICATE_THRESHOLD
+from embedding_backends import get_embedding_backend
 
 def normalize_path(path):
     path = path.lstrip('/') if not os.path.exists(path) else path
@@ -38,61 +51,96 @@ def run_uv_script(email: str):
         return {"success": False, "message": str(e)}
 
 #Task A2
+# Extensions picked up when format_file is given a directory
+PRETTIER_EXTENSIONS = (".md", ".markdown", ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".json", ".css",
+                       ".scss", ".less", ".html", ".vue", ".yaml", ".yml", ".graphql")
+
+def expand_format_targets(filepath, extensions=PRETTIER_EXTENSIONS):
+    if os.path.isdir(filepath):
+        return sorted(
+            os.path.join(subdir, file)
+            for subdir, dirs, files in os.walk(filepath)
+            for file in files if file.lower().endswith(extensions)
+        )
+    if glob.has_magic(filepath):
+        return sorted(path for path in glob.glob(filepath, recursive=True) if os.path.isfile(path))
+    return [filepath] if os.path.exists(filepath) else []
+
 def format_file(filepath):
+        # A single file, a directory (formatted recursively) or a glob pattern under /data
+        files = expand_format_targets(filepath)
+        if not files:
+            return {"success": False, "message": f"File {filepath} does not exist."}
+
         try:
-            result = subprocess.run(
-                ["npx", "prettier@3.4.2", "--write", filepath],
-                check=False,  # Don't raise exception automatically
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode != 0:
-                return {"success": False, "message": f"Prettier write failed: {result.stderr}"}
-            
-            return {"success": True, "message": result.stdout}
-        
+            # Formatted by the long-lived Prettier worker (falls back to npx when Node is unavailable);
+            # files already in formatted form are skipped
+            results = format_with_manifest(files)
+            failed = [r for r in results if not r["ok"]]
+            skipped = [r["file"] for r in results if r.get("skipped")]
+
+            if len(files) == 1:
+                result = results[0]
+                if failed:
+                    return {"success": False, "message": f"Prettier write failed: {result['error']}"}
+                if skipped:
+                    return {"success": True, "message": f"{filepath} is already formatted."}
+                return {"success": True, "message": result.get("output") or f"Formatted {filepath} with Prettier."}
+
+            return {
+                "success": not failed,
+                "message": f"Formatted {len(files) - len(skipped) - len(failed)} file(s), skipped {len(skipped)} already formatted, {len(failed)} failed.",
+                "skipped": skipped,
+                "failed": {r["file"]: r["error"] for r in failed},
+            }
+
         except Exception as e:
             return {"success": False, "message": str(e)}
     
 #Task A3
-from datetime import datetime
 def count_weekdays(file_path: str, weekday: str, output_path: str):
-    date_formats = ["%Y/%m/%d %H:%M:%S", "%b %d, %Y", "%Y-%m-%d", "%d-%b-%Y"]
-    weekdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    weekday_index = weekdays.index(weekday)
-    count=0
-
-    # Read and process the dates
-    with open(file_path, "r") as file:
-        for line in file:
-            date_str = line.strip()
-            for fmt in date_formats:
-                try:
-                    date_obj = datetime.strptime(date_str, fmt)
-                    if date_obj.weekday() == weekday_index:
-                        count += 1
-                except ValueError:
-                    # Skip invalid date formats
-                    continue
+    try:
+        weekday = normalize_weekday(weekday)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
 
-    with open(output_path, 'w') as output_file:
-        output_file.write(str(count))
+    # Each line's format is sniffed once and every format group is parsed in bulk;
+    # large files are split into chunks counted on all cores
+    try:
+        result = count_weekdays_in_file(file_path)
+    except FileNotFoundError:
+        return {"success": False, "message": f"File not found: {file_path}"}
+    counts = result["counts"]
 
-    return {"success": True, "message": f"Counted {count} occurrences of '{weekday.capitalize()}' in {file_path}."}
+    with open(output_path, 'w') as output_file:
+        if weekday == "all":
+            json.dump(counts, output_file, indent=2)
+        else:
+            output_file.write(str(counts[weekday]))
+
+    if weekday == "all":
+        message = f"Counted occurrences of every weekday in {file_path}."
+    else:
+        message = f"Counted {counts[weekday]} occurrences of '{weekday}' in {file_path}."
+    return {"success": True, "message": message, "counts": counts,
+            "lines_parsed": result["parsed"], "lines_rejected": result["rejected"],
+            "chunks": result["chunks"], "elapsed_ms": result["elapsed_ms"]}
 
 #Task A4
 def sort_contacts(input_file: str, output_file: str, keys: list):
     try:
-        with open(input_file, 'r') as f:
-            contacts = json.load(f)
-
-        sorted_data = sorted(contacts, key=lambda x: tuple(x[key] for key in keys))
-
-        with open(output_file, 'w') as f:
-            json.dump(sorted_data, f, indent=2)
+        # Plain keys compile to one itemgetter call per record; options (direction, collation,
+        # null placement) and missing keys use the null-aware key
+        key, reverse = compile_sort_key(keys)
+        try:
+            # Small inputs are sorted in memory; larger ones with an external merge sort
+            stats = sort_json_array(input_file, output_file, key, reverse)
+        except (KeyError, TypeError):
+            key, reverse = compile_sort_key(keys, null_safe=True)
+            stats = sort_json_array(input_file, output_file, key, reverse)
 
-        return {"success": True, "message": f"Sorted contacts from {input_file} and saved to {output_file}"}
+        return {"success": True, "message": f"Sorted contacts from {input_file} and saved to {output_file}",
+                "records": stats["records"], "runs": stats["runs"]}
 
     except FileNotFoundError:
         return {"success": False, "message": f"File {input_file} not found."}
@@ -100,118 +148,120 @@ def sort_contacts(input_file: str, output_file: str, keys: list):
         return {"success": False, "message": str(e)}
 
 #Task A5
-def write_recent_logs(log_dir, output_file, num_files):
+def write_recent_logs(log_dir, output_file, num_files, recursive: bool = False):
     try:
-        # 1. Find all .log files in the directory
-        log_files = glob.glob(os.path.join(log_dir, "*.log"))
+        # 1. Take the 'num_files' most recent .log files (most recent first) and their first lines
+        #    from the directory's index, which is built on first use and kept current afterwards
+        recent = get_log_index(log_dir, recursive).recent(num_files)
 
-        # 2. Sort files by modification time (most recent first)
-        log_files.sort(key=os.path.getmtime, reverse=True)
-
-        # 3. Take the top 'num_files' most recent files
-        recent_log_files = log_files[:num_files]
-
-        # 4. Write the first line of each file to the output file
+        # 2. Write the first line of each file to the output file
         with open(output_file, 'w') as outfile:
-            for log_file in recent_log_files:
-                try:
-                    with open(log_file, 'r') as infile:
-                        first_line = infile.readline().strip()  # Read and strip leading/trailing whitespace
-                        outfile.write(f"{first_line}\n") #Include file name
-                except Exception as e:
-                    logging.error(f"Error reading file {log_file}: {e}")
-                    outfile.write(f"Error reading file {log_file}\n")  # Write an error message
+            for _, first_line in recent:
+                outfile.write(f"{first_line}\n")
 
         return {"success": True, "message": f"Wrote first lines of {num_files} recent log files to {output_file}"}
 
     except Exception as e:
         return {"success": False, "message": str(e)}
 
+def extract_lines(input_file: str, output_file: str, mode: str, count: int = None, pattern: str = None,
+                  ignore_case: bool = False):
+    try:
+        # Raw bytes in and out: only the selected lines are read, nothing is decoded
+        lines = extract_file_lines(input_file, mode, count, pattern, ignore_case)
+        with open(output_file, 'wb') as outfile:
+            for line in lines:
+                outfile.write(line + b"\n")
+
+        return {"success": True, "message": f"Wrote {len(lines)} lines ({mode}) of {input_file} to {output_file}", "lines": len(lines)}
+
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
 #Task A6
-import re
 def extract_markdown_headers(input_dir: str, output_file: str):
-    headers_dict = {}
-
     try:
-        # Recursively find all Markdown files in subdirectories
-        md_files = []
-        for subdir, dirs, files in os.walk(input_dir):
-            for file in files:
-                if file.endswith(".md"):
-                    md_files.append(os.path.join(subdir, file))
-
-        if not md_files:
+        # Only new or changed Markdown files are parsed; the rest comes from the indexer's manifest
+        stats = build_h1_index(input_dir, output_file, indent=4)
+
+        if not stats["files"]:
             raise HTTPException(status_code=404, detail="No Markdown files found in /data/docs/")
+        return {"success": True, "message": f"Extracted H1 headers & from Markdown files. Saved to {output_file}", **stats}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Extract the first H1 header from each Markdown file
-        for md_file in md_files:
-            with open(md_file, "r", encoding="utf-8") as file:
-                for line in file:
-                    match = re.match(r"^# (.+)", line.strip())  # Find the first H1 header
-                    if match:
-                        # Remove /data/docs/ prefix and add to the dictionary
-                        relative_file_path = os.path.relpath(md_file, input_dir)
-                        headers_dict[relative_file_path] = match.group(1)
-                        break  # Stop after the first H1
-
-        # Save extracted headers to index.json
+def search_headings(input_dir: str, output_file: str, query: str = None, match: str = "fts", levels: list = None,
+                    limit: int = 100):
+    try:
+        # Indexed lookup in the SQLite/FTS5 heading index instead of walking the tree
+        results = heading_index.search(input_dir, query, match, levels, limit=limit)
         with open(output_file, "w", encoding="utf-8") as file:
-            json.dump(headers_dict, file, indent=4)
-        return {"success": True, "message": "Extracted H1 headers & from Markdown files. Saved to {output_file}"}
+            json.dump(results, file, indent=2)
+        return {"success": True, "message": f"Wrote {len(results)} matching headings to {output_file}", "results": len(results)}
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return {"success": False, "message": str(e)}
     
 #Task A7
-def write_email_eddress(input_file: str, output_file: str):
+async def write_email_eddress(input_file: str, output_file: str, field: str = "from"):
     try:
-        with open(input_file, "r") as email_file:
+        with open(input_file, "rb") as email_file:
             email_content = email_file.read()
 
-        gpt_response = query_llm(
-            f"""
-            Extract the sender's email address from the following email message:
-
-            ```
-            {email_content}
-            ```
-
-            Write *only* the sender's email address to the output file.  Do not include any other text or explanations.
-            """
-        )
+        # Headers are parsed locally; the LLM is only asked when parsing fails or can't answer the field
+        values = extract_email_field(email_content, field)
+        method = "local"
+        if values is None:
+            method = "llm"
+            gpt_response = await query_llm(
+                f"""
+                Extract the {"sender's email address" if header_for(field) == "From" else field} from the following email message:
+
+                ```
+                {email_content.decode("utf-8", errors="replace")}
+                ```
+
+                Write *only* the requested value.  Do not include any other text or explanations.
+                """
+            )
 
-        if "error" in gpt_response:
-            return {"success": False, "message": gpt_response["error"]} #Return error from query_gpt
+            if "error" in gpt_response:
+                return {"success": False, "message": gpt_response["error"], "method": method} #Return error from query_gpt
 
-        extracted_content = gpt_response.get("content").strip() #Handle cases where 'content' is missing
+            values = [gpt_response.get("content").strip()] #Handle cases where 'content' is missing
 
         with open(output_file, "w") as outfile:
-            outfile.write(extracted_content)
+            outfile.write("\n".join(values))
 
-        return {"success": True, "message": f"Sender's email address is successfully extracted & written to {output_file}."}
+        return {"success": True, "message": f"Email {field} is successfully extracted & written to {output_file}.", "method": method}
     
     except FileNotFoundError:
         return {"success": False, "message": f"Email file not found at {input_file}"}
     except Exception as e:
         return {"success": False, "message": f"An error occurred: {e}"}
     
-def query_llm(prompt: str) -> Dict[str, Any]:  # New function for task A7 [extracting & writing email address]
+async def extract_email_batch(input_path: str, output_file: str, format: str = None):
+    try:
+        # Local header parsing for every message; only unparseable ones reach the LLM, in batches
+        stats = await extract_archive(input_path, output_file, format)
+        return {"success": True, "message": f"Indexed {stats['messages']} messages from {input_path} into {output_file}", **stats}
+
+    except FileNotFoundError:
+        return {"success": False, "message": f"Mail archive not found at {input_path}"}
+    except Exception as e:
+        return {"success": False, "message": f"An error occurred: {e}"}
+
+async def query_llm(prompt: str) -> Dict[str, Any]:  # New function for task A7 [extracting & writing email address]
     try:
         request_data = {
             "model": "gpt-4o-mini",  # Or your preferred model
             "messages": [{"role": "user", "content": prompt}],
         }
 
-        print("Request Data:", json.dumps(request_data, indent=2))  # Print the request
+        logging.debug(f"Request Data: {json.dumps(request_data, indent=2)}")
 
-        response = httpx.post(
-            AI_PROXY_URL,
-            headers={
-                "Authorization": f"Bearer {AI_PROXY_TOKEN}",
-                "Content-Type": "application/json",
-            },
-            json=request_data,timeout=10.0
-        )
+        response = await get_client().post(AI_PROXY_URL, json=request_data, timeout=call_timeout(CHAT_TIMEOUT))
         response.raise_for_status() #Raise HTTPError for bad responses (4xx or 5xx)
         response_data = response.json()
         logging.info(f"GPT API Response: {json.dumps(response_data, indent=2)}")
@@ -227,97 +277,101 @@ def query_llm(prompt: str) -> Dict[str, Any]:  # New function for task A7 [extra
     
 #Task A8
 import base64
-def write_credit_card_no(input_file: str, output_file: str):
+CARD_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp")
+
+async def read_card_number_with_llm(input_file: str) -> str:
+    with open(input_file, "rb") as img_file:
+        base64_string = base64.b64encode(img_file.read()).decode('utf-8')
+        base64_url = f"data:image/png;base64,{base64_string}"
+
+    request_data = {
+        "model": "gpt-4o-mini",  
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Extract and print only the long series of numbers (16 digits), without any spaces from the image",
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": base64_url},
+                    },
+                ],
+            }
+        ],
+    }
+
+    response = await get_client().post(AI_PROXY_URL, json=request_data, timeout=call_timeout(VISION_TIMEOUT))
+    response.raise_for_status() #Raise HTTPError for bad responses (4xx or 5xx)
+    response_data = response.json()
+    logging.info(f"GPT API Response: {json.dumps(response_data, indent=2)}")
+
+    if "choices" not in response_data or not response_data["choices"]:
+        raise ValueError("Invalid response from API")
+
+    # Correct extraction from response_data:
+    return response_data["choices"][0]["message"].get("content", "Credit card number not found").strip()
+
+async def write_credit_card_no(input_file: str, output_file: str):
     try:
-        with open(input_file, "rb") as img_file:
-            base64_string = base64.b64encode(img_file.read()).decode('utf-8')
-            base64_url = f"data:image/png;base64,{base64_string}"
-
-        request_data = {
-            "model": "gpt-4o-mini",  
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Extract and print only the long series of numbers (16 digits), without any spaces from the image",
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": base64_url},
-                        },
-                    ],
-                }
-            ],
-        }
-
-        response = httpx.post(
-            AI_PROXY_URL,
-            headers={
-                "Authorization": f"Bearer {AI_PROXY_TOKEN}",
-                "Content-Type": "application/json",
-            },
-            json=request_data,
-            timeout=60.0  # Set timeout
-        )
-        response.raise_for_status() #Raise HTTPError for bad responses (4xx or 5xx)
-        response_data = response.json()
-        logging.info(f"GPT API Response: {json.dumps(response_data, indent=2)}")
-
-        if "choices" not in response_data or not response_data["choices"]:
-            return {"error": "Invalid response from API"}
-
-        # Correct extraction from response_data:
-        extracted_no = response_data["choices"][0]["message"].get("content", "Credit card number not found").strip()
+        # A single image, or a directory / glob of images (written as a JSON map of image -> number)
+        images = expand_format_targets(input_file, CARD_IMAGE_EXTENSIONS)
+        if not images:
+            return {"success": False, "message": f"File {input_file} does not exist."}
+
+        # Read locally by template matching on the card's font (checked with Luhn);
+        # only images that fail the check are sent to the vision model
+        numbers = await asyncio.to_thread(read_card_numbers, images)
+        fallbacks = [i for i, number in enumerate(numbers) if number is None]
+        if fallbacks:
+            answers = await asyncio.gather(*(read_card_number_with_llm(images[i]) for i in fallbacks))
+            for i, answer in zip(fallbacks, answers):
+                numbers[i] = answer
+        methods = ["llm" if i in fallbacks else "local" for i in range(len(images))]
+
+        if len(images) == 1 and not glob.has_magic(input_file) and not os.path.isdir(input_file):
+            extracted_no = numbers[0]
+            with open(output_file, "w") as outfile:
+                outfile.write(extracted_no)
+            return {"success": True, "message": f"Credit card number {extracted_no} is successfully extracted & written to {output_file}.", "method": methods[0]}
 
         with open(output_file, "w") as outfile:
-            outfile.write(extracted_no)
-        
-        return {"success": True, "message": f"Credit card number {extracted_no} is successfully extracted & written to {output_file}."} 
+            json.dump(dict(zip(images, numbers)), outfile, indent=2)
+        return {"success": True, "message": f"Credit card numbers of {len(images)} images are successfully extracted & written to {output_file}.",
+                "local": methods.count("local"), "llm": methods.count("llm")}
     
     except Exception as e:
         logging.error(f"Error querying GPT: {str(e)}")
         return {"error": f"An unexpected error occurred: {e}"}
 
 #Task A9
-async def similar_comments(input_file: str, output_file: str):
+async def similar_comments(input_file: str, output_file: str, top_k: int = 1):
     try:
         with open(input_file, "r") as file:
             data = file.readlines()
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                "https://aiproxy.sanand.workers.dev/openai/v1/embeddings",
-                headers={"Authorization": f"Bearer {AI_PROXY_TOKEN}"},  # Replace with your token
-                json={"model": "text-embedding-3-small", "input": data},  # Send list of comments
-            )
-            response.raise_for_status() # Check for HTTP errors
-            embeddings = np.array([emb["embedding"] for emb in response.json()["data"]])
-            
-            # Compute pairwise cosine similarity
-            similarity_matrix = cosine_similarity(embeddings)
-            
-            # Find the most similar pair (excluding self-similarity)
-            np.fill_diagonal(similarity_matrix, -1)  # Ignore self-similarity
-            most_similar_indices = np.unravel_index(np.argmax(similarity_matrix), similarity_matrix.shape)
-            
-            # Get the most similar pair of comments
-            comment1 = data[most_similar_indices[0]]
-            comment2 = data[most_similar_indices[1]]
-            
-            if comment1 and comment2:
-                # Write the pair to the output file
-                with open(output_file, "w") as file:
-                    file.write(f"{comment1}\n{comment2}")
-                return {  # Return a dictionary with more information
-                    "success": True,
-                    "message": f"Most similar comments written to {output_file}",
-                    "most_similar_indices": [int(i) for i in most_similar_indices] # Convert to list for JSON serialization
-                }
-
-            else:
-                return {"success": True, "message": "No similar comments found"}  # Should not happen, but good to have
+        # Only comments not already in the embedding store are sent to the API
+        embeddings, embedding_stats = await embedding_store.embed(data)
+
+        # Blocked upper-triangle search: never materializes the N x N similarity matrix
+        pairs = await asyncio.to_thread(top_pairs, embeddings, top_k)
+
+        if pairs:
+            # Write each pair to the output file, most similar first
+            with open(output_file, "w") as file:
+                file.write("\n".join(f"{data[i]}\n{data[j]}" for i, j, _ in pairs))
+            return {  # Return a dictionary with more information
+                "success": True,
+                "message": f"Most similar comments written to {output_file}",
+                "most_similar_indices": list(pairs[0][:2]),
+                "pairs": [{"indices": [i, j], "similarity": round(score, 6)} for i, j, score in pairs],
+                **embedding_stats,
+            }
+
+        else:
+            return {"success": True, "message": "No similar comments found"}  # Fewer than two comments
 
     except FileNotFoundError:
         return {"success": False, "message": f"File not found: {input_file}"}
@@ -325,6 +379,38 @@ async def similar_comments(input_file: str, output_file: str):
         logging.error(f"An error occurred: {e}")
         return {"success": False, "message": f"An error occurred: {e}"} 
 
+async def similar_to_comment(input_file: str, output_file: str, query: str, k: int = 10):
+    try:
+        # IVF index kept beside the comments file; only new lines are embedded and inserted.
+        # The query is embedded with the same backend the index is built with
+        backend = get_embedding_backend()
+        query_vectors, _ = await embedding_store.embed([query], backend)
+        matches, index_stats = await use_comment_index(input_file, nearest_comments, query_vectors[0], k, backend=backend)
+        with open(output_file, "w") as file:
+            json.dump(matches, file, indent=2)
+        return {"success": True, "message": f"{len(matches)} comments most similar to the query written to {output_file}",
+                **index_stats}
+
+    except FileNotFoundError:
+        return {"success": False, "message": f"File not found: {input_file}"}
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        return {"success": False, "message": f"An error occurred: {e}"}
+
+async def comment_duplicates(input_file: str, output_file: str, threshold: float = ANN_DUPLICATE_THRESHOLD):
+    try:
+        clusters, index_stats = await use_comment_index(input_file, duplicate_clusters, threshold)
+        with open(output_file, "w") as file:
+            json.dump(clusters, file, indent=2)
+        return {"success": True, "message": f"{len(clusters)} clusters of near-duplicate comments written to {output_file}",
+                **index_stats}
+
+    except FileNotFoundError:
+        return {"success": False, "message": f"File not found: {input_file}"}
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        return {"success": False, "message": f"An error occurred: {e}"}
+
 #Task A10
 import sqlite3
 
@@ -0,0 +1,183 @@
+#gpt_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+GPT_CACHE_PATH = os.environ.get("GPT_CACHE_PATH", ".cache/gpt_cache.sqlite")
+GPT_CACHE_TTL = float(os.environ.get("GPT_CACHE_TTL", str(7 * 24 * 60 * 60)))  # seconds
+GPT_CACHE_MEMORY_ENTRIES = int(os.environ.get("GPT_CACHE_MEMORY_ENTRIES", "256"))
+GPT_CACHE_DISK_ENTRIES = int(os.environ.get("GPT_CACHE_DISK_ENTRIES", "10000"))
+
+
+def normalize_task(task: str) -> str:
+    # Only whitespace and unicode form are normalized: case matters for paths and emails
+    return " ".join(unicodedata.normalize("NFC", task).split())
+
+
+def tools_fingerprint(tools: list[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(tools, sort_keys=True).encode()).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (in-memory LRU + SQLite) cache of tool-selection responses.
+
+    Entries are keyed on sha256(normalized task, tools schema, model). When the tools
+    schema changes, every stored entry is dropped the first time the new schema is seen.
+    """
+
+    def __init__(self, path: str = GPT_CACHE_PATH, ttl: float = GPT_CACHE_TTL,
+                 memory_entries: int = GPT_CACHE_MEMORY_ENTRIES, disk_entries: int = GPT_CACHE_DISK_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # _lock guards the in-memory tier and stats, _db_lock the SQLite connection; the event loop
+        # only ever takes _lock, so it never waits behind disk I/O
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_count = 0
+        self._tools_hash: Optional[str] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return self._conn
+
+    def _check_tools(self, tools_hash: str):
+        # Invalidate everything when tools.py (i.e. the schema sent to the model) changes
+        if tools_hash == self._tools_hash:
+            return
+        db = self._db()
+        row = db.execute("SELECT value FROM meta WHERE name = 'tools_hash'").fetchone()
+        if row is None or row[0] != tools_hash:
+            if row is not None:
+                logging.info("Tools schema changed, clearing GPT response cache")
+            db.execute("DELETE FROM responses")
+            db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('tools_hash', ?)", (tools_hash,))
+            db.commit()
+            with self._lock:
+                self._memory.clear()
+            self._disk_count = 0
+        self._tools_hash = tools_hash
+
+    def make_key(self, task: str, tools: list[Dict[str, Any]], model: str) -> str:
+        """Blocking on the first call per tools schema (checked against SQLite); run off the event loop."""
+        tools_hash = tools_fingerprint(tools)
+        with self._db_lock:
+            self._check_tools(tools_hash)
+        payload = json.dumps([normalize_task(task), tools_hash, model])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        """The in-memory tier only; never touches SQLite, so it is safe on the event loop."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return json.loads(json.dumps(entry[1]))  # Hand out a copy
+        return None
+
+    def get_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        """The SQLite tier (blocking); a hit is promoted to the in-memory tier."""
+        now = time.time()
+        with self._db_lock:
+            db = self._db()
+            row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                db.commit()
+                with self._lock:
+                    self._remember(key, row[1], json.loads(row[0]))
+                    self.stats["disk_hits"] += 1
+                return json.loads(row[0])
+
+            if row is not None:  # Expired
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                self._disk_count -= 1
+            with self._lock:
+                if row is not None:
+                    self.stats["evictions"] += 1
+                self._memory.pop(key, None)
+                self.stats["misses"] += 1
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.get_memory(key)
+        return value if value is not None else self.get_disk(key)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Blocking (writes to SQLite); run off the event loop."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        with self._db_lock:
+            db = self._db()
+            exists = db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            if not exists:
+                self._disk_count += 1
+            if self._disk_count > self.disk_entries:
+                # Drop expired entries first, then the least recently used ones
+                expired = db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+                excess = self._disk_count - expired - self.disk_entries
+                if excess > 0:
+                    db.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                        (excess,),
+                    )
+                evicted = expired + max(excess, 0)
+                self._disk_count -= evicted
+                with self._lock:
+                    self.stats["evictions"] += evicted
+            db.commit()
+
+    def _remember(self, key: str, created: float, value: Dict[str, Any]):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            db = self._db()
+            db.execute("DELETE FROM responses")
+            db.commit()
+            self._disk_count = 0
+
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._tools_hash = None
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,235 @@
+#heading_index.py
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from md_index import scan_markdown_files, MD_INDEX_WORKERS
+
+HEADING_INDEX_PATH = os.environ.get("HEADING_INDEX_PATH", ".cache/headings.sqlite")
+# A docs tree is re-checked for changed files when its last refresh is older than this (seconds)
+HEADING_INDEX_MAX_AGE = float(os.environ.get("HEADING_INDEX_MAX_AGE", "30"))
+HEADING_SEARCH_LIMIT = 100
+
+MATCH_MODES = ("fts", "prefix", "exact")
+
+ATX_RE = re.compile(rb"^ {0,3}(#{1,6})(?=[ \t\r\n]|$)[ \t]*(.*?)(?:[ \t]+#+)?[ \t]*\r?\n?$")
+SETEXT_RE = re.compile(rb"^ {0,3}(=+|-+)[ \t]*\r?\n?$")
+FENCE_RE = re.compile(rb"^ {0,3}(`{3,}|~{3,})")
+# ---, *** or ___ (spaces allowed between): with no paragraph to underline, a thematic break
+THEMATIC_BREAK_RE = re.compile(rb"^ {0,3}([-*_])[ \t]*(?:\1[ \t]*){2,}\r?\n?$")
+# YAML front matter: a block fenced by --- on the first line and --- or ... after it
+FRONT_MATTER_OPEN_RE = re.compile(rb"^---[ \t]*\r?\n?$")
+FRONT_MATTER_CLOSE_RE = re.compile(rb"^(---|\.\.\.)[ \t]*\r?\n?$")
+# Lines that start a list item, quote or table row cannot be the text of a setext heading
+NOT_PARAGRAPH_RE = re.compile(rb"^ {0,3}([-*+>|]|\d+[.)])( |\t|\r?\n?$)")
+FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, root TEXT NOT NULL, path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, UNIQUE (root, path)
+);
+CREATE TABLE IF NOT EXISTS headings (
+    id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, level INTEGER NOT NULL,
+    text TEXT NOT NULL COLLATE NOCASE, line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS headings_file ON headings (file_id);
+CREATE INDEX IF NOT EXISTS headings_text ON headings (text);
+CREATE VIRTUAL TABLE IF NOT EXISTS headings_fts USING fts5 (text, content='headings', content_rowid='id', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS headings_insert AFTER INSERT ON headings BEGIN
+    INSERT INTO headings_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS headings_delete AFTER DELETE ON headings BEGIN
+    INSERT INTO headings_fts (headings_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _heading_text(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="replace").strip()
+
+
+def parse_headings(path: str, front_matter: bool = True) -> list[tuple[int, str, int]]:
+    """Return (level, text, line number) for every ATX and setext heading of a Markdown file.
+
+    One streaming pass over the raw bytes; headings inside fenced code blocks and a YAML front
+    matter block at the top are ignored. A --- that opens front matter but is never closed is
+    read as a thematic break (in a second pass).
+    """
+    headings, paragraph, fence, in_front_matter = [], [], None, False
+    with open(path, "rb") as file:
+        for number, line in enumerate(file, 1):
+            if number == 1 and front_matter and FRONT_MATTER_OPEN_RE.match(line):
+                in_front_matter = True
+                continue
+            if in_front_matter:
+                in_front_matter = not FRONT_MATTER_CLOSE_RE.match(line)
+                continue
+            if fence is not None:
+                match = FENCE_RE.match(line)
+                if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) \
+                        and not line[match.end():].strip():
+                    fence = None
+                continue
+            match = FENCE_RE.match(line)
+            if match:
+                fence, paragraph = match.group(1), []
+                continue
+            match = ATX_RE.match(line)
+            if match:
+                text = _heading_text(match.group(2))
+                if text:
+                    headings.append((len(match.group(1)), text, number))
+                paragraph = []
+                continue
+            match = SETEXT_RE.match(line)
+            if match and paragraph:
+                headings.append((1 if match.group(1)[0] == ord("=") else 2, " ".join(paragraph), number - len(paragraph)))
+                paragraph = []
+                continue
+            if not line.strip() or THEMATIC_BREAK_RE.match(line) or NOT_PARAGRAPH_RE.match(line):
+                paragraph = []
+            else:
+                paragraph.append(_heading_text(line))
+    if in_front_matter:
+        return parse_headings(path, front_matter=False)
+    return headings
+
+
+def fts_query(text: str) -> str:
+    """Quote every word so user input cannot inject FTS5 syntax."""
+    tokens = FTS_TOKEN_RE.findall(text)
+    if not tokens:
+        raise ValueError(f"Nothing to search for in {text!r}")
+    return " ".join(f'"{token}"' for token in tokens)
+
+
+class HeadingIndex:
+    """SQLite index of every heading under one or more Markdown trees.
+
+    Headings are stored with their level, file and line, with an FTS5 table over their text.
+    A tree is synced (new and changed files re-parsed, deleted ones dropped) on first use and
+    whenever its last sync is older than HEADING_INDEX_MAX_AGE; lookups are indexed queries.
+    """
+
+    def __init__(self, path: str = HEADING_INDEX_PATH, max_age: float = HEADING_INDEX_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._synced: Dict[str, float] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def refresh(self, root: str) -> Dict[str, Any]:
+        """Sync the index with the Markdown files under root. Returns {"files", "parsed", "removed", "elapsed_ms"}."""
+        started = time.perf_counter()
+        root = os.path.abspath(root)
+        with self._lock:
+            db = self._db()
+            known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size in db.execute(
+                "SELECT id, path, mtime_ns, size FROM files WHERE root = ?", (root,))}
+
+            seen, changed = set(), []
+            for entry in scan_markdown_files(root):
+                relative_path = os.path.relpath(entry.path, root)
+                stat = entry.stat()
+                seen.add(relative_path)
+                cached = known.get(relative_path)
+                if cached is None or cached[1:] != (stat.st_mtime_ns, stat.st_size):
+                    changed.append((relative_path, stat.st_mtime_ns, stat.st_size))
+            removed = [known[path][0] for path in set(known) - seen]
+
+            with ThreadPoolExecutor(max_workers=max(1, min(MD_INDEX_WORKERS, len(changed)))) as pool:
+                parsed = list(pool.map(lambda item: parse_headings(os.path.join(root, item[0])), changed))
+
+            with db:
+                for file_id in removed + [known[path][0] for path, _, _ in changed if path in known]:
+                    db.execute("DELETE FROM headings WHERE file_id = ?", (file_id,))
+                db.executemany("DELETE FROM files WHERE id = ?", [(file_id,) for file_id in removed])
+                for (relative_path, mtime_ns, size), headings in zip(changed, parsed):
+                    # Plain UPDATE / INSERT + lastrowid: RETURNING needs SQLite 3.35 (the Docker image has 3.27)
+                    if relative_path in known:
+                        file_id = known[relative_path][0]
+                        db.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?", (mtime_ns, size, file_id))
+                    else:
+                        file_id = db.execute("INSERT INTO files (root, path, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                                             (root, relative_path, mtime_ns, size)).lastrowid
+                    db.executemany("INSERT INTO headings (file_id, level, text, line) VALUES (?, ?, ?, ?)",
+                                   [(file_id, level, text, line) for level, text, line in headings])
+            self._synced[root] = time.monotonic()
+        if changed or removed:
+            logging.info(f"Heading index for {root}: {len(changed)} files parsed, {len(removed)} removed")
+        return {
+            "files": len(seen),
+            "parsed": len(changed),
+            "removed": len(removed),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def search(self, root: str, query: Optional[str] = None, match: str = "fts", levels: Optional[list[int]] = None,
+               file: Optional[str] = None, limit: int = HEADING_SEARCH_LIMIT, refresh: bool = False) -> list[Dict[str, Any]]:
+        """Find headings under root.
+
+        match is "fts" (all words of query, full-text), "prefix" (headings starting with query,
+        case-insensitive) or "exact" (the whole heading, case-insensitive). Without a query every
+        heading is listed. levels and file (a path relative to root) narrow the results.
+        """
+        if match not in MATCH_MODES:
+            raise ValueError(f"Match must be one of {MATCH_MODES}, got {match!r}")
+        root = os.path.abspath(root)
+        with self._lock:
+            synced = self._synced.get(root)
+        if refresh or synced is None or time.monotonic() - synced > self.max_age:
+            self.refresh(root)
+
+        conditions, params = ["files.root = ?"], [root]
+        source = "headings JOIN files ON files.id = headings.file_id"
+        order = "files.path, headings.line"
+        if query:
+            if match == "fts":
+                source += " JOIN headings_fts ON headings_fts.rowid = headings.id"
+                conditions.append("headings_fts MATCH ?")
+                params.append(fts_query(query))
+                order = "headings_fts.rank, " + order
+            elif match == "prefix":
+                conditions.append("headings.text LIKE ? ESCAPE '\\'")
+                params.append(re.sub(r"([\\%_])", r"\\\1", query) + "%")
+            else:
+                conditions.append("headings.text = ?")
+                params.append(query)
+        if levels:
+            conditions.append(f"headings.level IN ({', '.join('?' * len(levels))})")
+            params.extend(levels)
+        if file:
+            conditions.append("files.path = ?")
+            params.append(os.path.normpath(file))
+        params.append(limit)
+
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT files.path, headings.level, headings.text, headings.line FROM {source} "
+                f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?", params).fetchall()
+        return [{"file": path, "level": level, "heading": text, "line": line} for path, level, text, line in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._synced.clear()
+
+
+heading_index = HeadingIndex()
@@ -0,0 +1,128 @@
+#line_extract.py
+
+import os
+import re
+from typing import Optional, Union
+
+# Bytes read per step. Tail reads this much at a time backward from EOF, so the last few
+# lines of a file cost a block or two of I/O however large the file is.
+LINE_BLOCK_SIZE = int(os.environ.get("LINE_BLOCK_SIZE", "8192"))
+# grep scans larger blocks and only splits the ones that contain a match into lines
+GREP_BLOCK_SIZE = int(os.environ.get("GREP_BLOCK_SIZE", str(1024 * 1024)))
+# Longer lines are truncated to this many bytes, keeping reads and memory bounded
+MAX_LINE_BYTES = int(os.environ.get("MAX_LINE_BYTES", str(1024 * 1024)))
+
+LINE_MODES = ("head", "tail", "grep")
+DEFAULT_LINE_COUNT = 10  # head and tail
+
+
+def _strip_eol(line: bytes) -> bytes:
+    if line.endswith(b"\n"):
+        line = line[:-1]
+    return line[:-1] if line.endswith(b"\r") else line
+
+
+def head(path: str, count: int = 10, max_line: int = MAX_LINE_BYTES) -> list[bytes]:
+    """Return the first count lines of path as bytes, without line terminators."""
+    lines = []
+    with open(path, "rb") as file:
+        while len(lines) < count:
+            line = file.readline(max_line)
+            if not line:
+                break
+            rest = line
+            while rest and not rest.endswith(b"\n"):  # Skip the rest of an overlong line
+                rest = file.readline(LINE_BLOCK_SIZE)
+            lines.append(_strip_eol(line))
+    return lines
+
+
+def tail(path: str, count: int = 10, block_size: int = LINE_BLOCK_SIZE, max_line: int = MAX_LINE_BYTES) -> list[bytes]:
+    """Return the last count lines of path, reading blocks backward from the end of the file.
+
+    Reading stops after count * max_line bytes; an overlong line is then returned as its last bytes.
+    """
+    if count <= 0:
+        return []
+    with open(path, "rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        blocks, newlines, size = [], 0, 0
+        while position > 0 and newlines < count and size < count * (max_line + 1):
+            step = min(block_size, position)
+            position -= step
+            file.seek(position)
+            block = file.read(step)
+            newlines += block.count(b"\n") - (not blocks and block.endswith(b"\n"))  # Ignore the final terminator
+            blocks.append(block)
+            size += step
+
+    data = b"".join(reversed(blocks))
+    if not data:
+        return []
+    lines = data[:-1].split(b"\n") if data.endswith(b"\n") else data.split(b"\n")
+    if position > 0 and newlines >= count:
+        lines = lines[1:]  # The first piece starts mid-line and is not needed
+    return [_strip_eol(line)[:max_line] for line in lines[-count:]]
+
+
+def grep(path: str, pattern: Union[str, bytes], count: Optional[int] = None, ignore_case: bool = False,
+         block_size: int = GREP_BLOCK_SIZE, max_line: int = MAX_LINE_BYTES) -> list[bytes]:
+    """Return lines of path matching the regex pattern (at most count of them), in file order.
+
+    ^ and $ anchor at line boundaries. Blocks without any match are skipped without being
+    split into lines. Like head and tail, every line is cut to its first max_line bytes (wherever
+    it falls in the blocks), and the pattern is matched against that prefix.
+    """
+    if isinstance(pattern, str):
+        pattern = pattern.encode()
+    regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    matches = []
+
+    def scan(chunk: bytes) -> bool:
+        # Returns True once count matches were found
+        if not chunk or regex.search(chunk) is None:
+            return False
+        for line in (chunk[:-1] if chunk.endswith(b"\n") else chunk).split(b"\n"):
+            line = line[:max_line]
+            if regex.search(line):
+                matches.append(_strip_eol(line))
+                if count is not None and len(matches) >= count:
+                    return True
+        return False
+
+    with open(path, "rb") as file:
+        carry, overflow = b"", False
+        while True:
+            block = file.read(block_size)
+            if not block:
+                scan(carry)
+                break
+            if overflow:
+                # Drop the rest of an overlong line, then finish it with its kept prefix
+                newline = block.find(b"\n")
+                if newline == -1:
+                    continue
+                block, overflow = carry + b"\n" + block[newline + 1:], False
+                carry = b""
+            data = carry + block
+            cut = data.rfind(b"\n") + 1
+            chunk, carry = data[:cut], data[cut:]
+            if len(carry) > max_line:
+                carry, overflow = carry[:max_line], True
+            if scan(chunk):
+                break
+    return matches[:count] if count is not None else matches
+
+
+def extract_lines(path: str, mode: str = "head", count: Optional[int] = None, pattern: Optional[str] = None,
+                  ignore_case: bool = False) -> list[bytes]:
+    """Dispatch to head, tail or grep. count defaults to DEFAULT_LINE_COUNT for head and tail, and to all matches for grep."""
+    if mode == "head":
+        return head(path, DEFAULT_LINE_COUNT if count is None else count)
+    if mode == "tail":
+        return tail(path, DEFAULT_LINE_COUNT if count is None else count)
+    if mode == "grep":
+        if not pattern:
+            raise ValueError("grep needs a pattern")
+        return grep(path, pattern, count, ignore_case)
+    raise ValueError(f"Mode must be one of {LINE_MODES}, got {mode!r}")
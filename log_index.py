@@ -0,0 +1,346 @@
+#log_index.py
+
+import bisect
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from line_extract import head
+
+LOG_INDEX_SNAPSHOT_DIR = os.environ.get("LOG_INDEX_SNAPSHOT_DIR", ".cache/log_index")
+LOG_INDEX_POLL_INTERVAL = float(os.environ.get("LOG_INDEX_POLL_INTERVAL", "1.0"))  # seconds, polling fallback only
+LOG_INDEX_SNAPSHOT_INTERVAL = float(os.environ.get("LOG_INDEX_SNAPSHOT_INTERVAL", "30"))
+# A directory mtime this recent may not move again for a change in the same timestamp tick
+LOG_INDEX_MTIME_SLACK_NS = 2_000_000_000
+# Threads used to read the first lines of files that are not cached yet
+LOG_READ_WORKERS = 8
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def scan_log_files(log_dir: str, recursive: bool = False):
+    """Yield os.DirEntry objects for every .log file, from one scandir pass."""
+    pending = [log_dir]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif entry.name.endswith(".log") and entry.is_file():
+                    yield entry
+
+
+def read_first_line(log_file: str) -> str:
+    try:
+        # Bounded bytes read; only the line itself is decoded
+        lines = head(log_file, 1)
+        return lines[0].decode("utf-8", errors="replace").strip() if lines else ""
+    except Exception as e:
+        logging.error(f"Error reading file {log_file}: {e}")
+        return f"Error reading file {log_file}"  # Write an error message
+
+
+class _Inotify:
+    """Minimal ctypes binding for inotify(7). Raises OSError where inotify is unavailable."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not supported on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self.watches[wd] = path
+
+    def read_events(self):
+        """Yield (mask, path) for pending events without blocking."""
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                directory = self.watches.get(wd)
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                yield mask, os.path.join(directory, name) if directory and name else directory
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LogIndex:
+    """In-memory index of the .log files under one directory, ordered by mtime.
+
+    Kept current with inotify (pending events are also drained before every query) or, where
+    inotify is unavailable, by rescanning every LOG_INDEX_POLL_INTERVAL seconds, and before a
+    query whose directory mtime has changed since the last scan (a file was added, removed or
+    renamed), once that interval has passed, or when asked to. The first line
+    of each file is cached and dropped whenever the file's mtime or size changes. The index is
+    snapshotted to disk so a restart only re-reads files that changed while it was down.
+    """
+
+    def __init__(self, log_dir: str, recursive: bool = False, snapshot_path: Optional[str] = None):
+        self.log_dir = log_dir
+        self.recursive = recursive
+        if snapshot_path is None:
+            name = hashlib.sha256(f"{os.path.abspath(log_dir)}:{recursive}".encode()).hexdigest()[:16]
+            snapshot_path = os.path.join(LOG_INDEX_SNAPSHOT_DIR, f"{name}.json")
+        self.snapshot_path = snapshot_path
+        self.files: Dict[str, list] = {}  # path -> [mtime_ns, size, first line or None]
+        self.order: list[tuple[int, str]] = []  # (mtime_ns, path), ascending
+        self.mode: Optional[str] = None  # "inotify" or "polling" once started
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._scanned_at = float("-inf")
+        self._scanned_dir_mtime_ns: Optional[int] = None
+
+    def _set(self, path: str, mtime_ns: int, size: int):
+        current = self.files.get(path)
+        if current is not None:
+            if current[0] == mtime_ns and current[1] == size:
+                return
+            self.order.pop(bisect.bisect_left(self.order, (current[0], path)))
+        self.files[path] = [mtime_ns, size, None]
+        bisect.insort(self.order, (mtime_ns, path))
+        self._dirty = True
+
+    def _remove(self, path: str):
+        current = self.files.pop(path, None)
+        if current is not None:
+            self.order.pop(bisect.bisect_left(self.order, (current[0], path)))
+            self._dirty = True
+
+    def _refresh(self, path: str):
+        if not path.endswith(".log"):
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._remove(path)
+            return
+        self._set(path, stat.st_mtime_ns, stat.st_size)
+
+    def _dir_mtime_ns(self) -> Optional[int]:
+        try:
+            return os.stat(self.log_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def rescan(self):
+        with self._lock:
+            dir_mtime_ns = self._dir_mtime_ns()
+            # Rebuilt in one pass and sorted once: an insort per file is quadratic on a first build
+            files = {}
+            for entry in scan_log_files(self.log_dir, self.recursive):
+                stat = entry.stat()
+                current = self.files.get(entry.path)
+                if current is not None and current[0] == stat.st_mtime_ns and current[1] == stat.st_size:
+                    files[entry.path] = current
+                else:
+                    files[entry.path] = [stat.st_mtime_ns, stat.st_size, None]
+                    self._dirty = True
+            if len(files) != len(self.files) or not files.keys() >= self.files.keys():
+                self._dirty = True
+            self.files = files
+            self.order = sorted((entry[0], path) for path, entry in files.items())
+            self._scanned_at = time.monotonic()
+            recent = dir_mtime_ns is not None and time.time_ns() - dir_mtime_ns < LOG_INDEX_MTIME_SLACK_NS
+            self._scanned_dir_mtime_ns = None if recent else dir_mtime_ns
+
+    def _apply_events(self):
+        for mask, path in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                logging.warning(f"inotify queue overflowed for {self.log_dir}, rescanning")
+                self.rescan()
+            elif mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                    self.rescan()
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.rescan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self.rescan()
+            elif path is not None:
+                self._refresh(path)
+
+    def _watch_tree(self, directory: str):
+        self._inotify.add_watch(directory)
+        if self.recursive:
+            for subdir, dirs, _ in os.walk(directory):
+                for name in dirs:
+                    self._inotify.add_watch(os.path.join(subdir, name))
+
+    def start(self):
+        with self._lock:
+            if self.mode is not None:
+                return
+            # Checked first so a missing directory is reported as such, not as inotify being unavailable
+            if not os.path.isdir(self.log_dir):
+                raise FileNotFoundError(f"Log directory {self.log_dir} not found.")
+            self._load_snapshot()
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree(self.log_dir)  # Watch before scanning so no change is missed
+                self.mode = "inotify"
+            except OSError as e:
+                logging.info(f"inotify unavailable ({e}), polling {self.log_dir} instead")
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+                self.mode = "polling"
+            self.rescan()
+        self._thread = threading.Thread(target=self._run, name=f"log-index:{self.log_dir}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.mode == "inotify":
+                ready, _, _ = select.select([self._inotify.fd], [], [], 1.0)
+                if ready:
+                    with self._lock:
+                        try:
+                            self._apply_events()
+                        except FileNotFoundError as e:  # The directory went away under a rescan
+                            logging.warning(f"Lost {self.log_dir} ({e}), polling it instead")
+                            self._inotify.close()
+                            self._inotify = None
+                            self.mode = "polling"
+            else:
+                self._stop.wait(LOG_INDEX_POLL_INTERVAL)
+                try:
+                    self.rescan()
+                except FileNotFoundError:
+                    pass
+            if self._dirty and time.monotonic() - self._saved_at >= LOG_INDEX_SNAPSHOT_INTERVAL:
+                self.save_snapshot()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            self.mode = None
+        self.save_snapshot()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as file:
+                snapshot = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if snapshot.get("log_dir") != os.path.abspath(self.log_dir) or snapshot.get("recursive") != self.recursive:
+            return
+        self.files = {path: list(entry) for path, entry in snapshot["files"].items()}
+        self.order = sorted((entry[0], path) for path, entry in self.files.items())
+
+    def save_snapshot(self):
+        with self._lock:
+            snapshot = {"log_dir": os.path.abspath(self.log_dir), "recursive": self.recursive, "files": self.files}
+            if os.path.dirname(self.snapshot_path):
+                os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            temp_path = f"{self.snapshot_path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(snapshot, file)
+            os.replace(temp_path, self.snapshot_path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def recent(self, num_files: int, refresh: bool = False) -> list[tuple[str, str]]:
+        """Return [(path, first line)] for the num_files most recently modified files, newest first.
+
+        In polling mode the directory is rescanned first if refresh is set, its mtime changed
+        since the last scan, or that scan is older than LOG_INDEX_POLL_INTERVAL.
+        """
+        with self._lock:
+            if self.mode == "inotify":
+                self._apply_events()  # Read-your-writes: include changes not yet seen by the thread
+            elif (refresh or self._scanned_dir_mtime_ns is None or self._dir_mtime_ns() != self._scanned_dir_mtime_ns
+                  or time.monotonic() - self._scanned_at >= LOG_INDEX_POLL_INTERVAL):
+                self.rescan()
+            selected = [path for _, path in reversed(self.order[-num_files:])] if num_files > 0 else []
+            missing = [path for path in selected if self.files[path][2] is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(LOG_READ_WORKERS, len(missing))) as pool:
+                lines = dict(zip(missing, pool.map(read_first_line, missing)))
+            with self._lock:
+                for path, line in lines.items():
+                    if path in self.files and self.files[path][2] is None:
+                        self.files[path][2] = line
+                        self._dirty = True
+        else:
+            lines = {}
+        with self._lock:
+            return [(path, lines.get(path) or self.files.get(path, [None, None, None])[2]) for path in selected]
+
+
+_indexes: Dict[tuple[str, bool], LogIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_log_index(log_dir: str, recursive: bool = False) -> LogIndex:
+    """Return the started index for log_dir, building it on first use."""
+    key = (os.path.realpath(log_dir), recursive)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = LogIndex(log_dir, recursive)
+            index.start()
+            _indexes[key] = index
+        return index
+
+
+def close_log_indexes():
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.stop()
+        _indexes.clear()
@@ -1,20 +1,42 @@
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
 import logging
+import mimetypes
 import os
 import json
 import uvicorn
 
 from tools import tools  # Import tools list
 from functions import *  # Import all the functions
-from query_gpt import query_gpt # Import query_gpt function
+from query_gpt import query_gpt, open_client, close_client # Import query_gpt function and the shared client lifecycle
+from gpt_cache import response_cache
+from router import router # Local intent router that skips the LLM for recognizable tasks
+from dispatch import dispatcher # Tool name -> handler registry with schema-validated arguments
+from prettier_worker import prettier # Long-lived Prettier process used by format_file
+from log_index import close_log_indexes # mtime-ordered log indexes used by write_recent_logs
+from heading_index import heading_index, HEADING_SEARCH_LIMIT # SQLite/FTS5 index of Markdown headings
+from embedding_store import embedding_store # sha256(text)/model -> float32 embedding cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled, keep-alive AI Proxy client per process
+    await open_client()
+    yield
+    await close_client()
+    response_cache.close()
+    dispatcher.shutdown()
+    prettier.close()
+    close_log_indexes()
+    heading_index.close()
+    embedding_store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,131 +46,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bytes sniffed to tell text from binary when the extension gives no content type
+SNIFF_BYTES = 4096
+
+def guess_media_type(path: str) -> str:
+    media_type, _ = mimetypes.guess_type(path)
+    if media_type:
+        return media_type
+    with open(path, "rb") as file:
+        head = file.read(SNIFF_BYTES)
+    return "application/octet-stream" if b"\0" in head else "text/plain"
+
+def is_not_modified(request: Request, response: FileResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or response.headers["etag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(response.headers["last-modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
 @app.get("/read")
-async def read_file(path: str):
+async def read_file(path: str, request: Request):
+    # Streamed in chunks (or handed to the server via pathsend), with Range, ETag and Last-Modified support
     path = normalize_path(path)
-    if os.path.exists(path):
+    if os.path.isfile(path):
         try:
-            with open(path, 'r') as file:
-                content = file.read()
-            return PlainTextResponse(content)
+            stat_result = os.stat(path)
+            response = FileResponse(path, media_type=guess_media_type(path), stat_result=stat_result)
+            if is_not_modified(request, response):
+                return Response(status_code=304, headers={
+                    "etag": response.headers["etag"],
+                    "last-modified": response.headers["last-modified"],
+                })
+            return response
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     else:
         raise HTTPException(status_code=404, detail="File not found.")
 
+@app.get("/docs/search")
+def search_docs(
+    q: str = Query(None, description="Heading text to look for; omit to list headings"),
+    match: str = Query("fts", description="fts, prefix or exact"),
+    level: list[int] = Query(None, description="Heading levels to include (repeatable)"),
+    file: str = Query(None, description="Only headings of this file, relative to root"),
+    root: str = Query("/data/docs", description="Docs directory"),
+    limit: int = Query(HEADING_SEARCH_LIMIT, ge=1, le=10000),
+    refresh: bool = Query(False, description="Sync the index with the files first"),
+):
+    # Sync def: FastAPI runs it in its threadpool, so the SQLite queries don't block the event loop
+    try:
+        results = heading_index.search(normalize_path(root), q, match, level, file, limit, refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Docs directory not found.")
+    return {"results": results, "count": len(results)}
+
 @app.post("/run", response_model=dict)
 async def run_task(task: str = Query(..., description="User query to be processed by OpenAI")):
-    gpt_response = query_gpt(task, tools)
-    if "tool_calls" in gpt_response:
-        tool_call = gpt_response["tool_calls"][0]
+    # Recognizable tasks are routed locally; everything else goes to the LLM (or its response cache)
+    gpt_response = router.route(task)
+    route = "local"
+    if gpt_response is None:
+        gpt_response = await query_gpt(task, tools)
+        route = "cache" if gpt_response.pop("cached", False) else "llm"
+    logging.info(f"Task routed via {route}")
+
+    tool_calls = gpt_response.get("tool_calls") or []
+    if len(tool_calls) == 1:
+        tool_call = tool_calls[0]
         function_name = tool_call["function"]["name"]
         arguments = json.loads(tool_call["function"]["arguments"])
 
-        #Task: A1
-        if function_name == "run_uv_script":
-            email = arguments.get("email")
-            return run_uv_script(email)
-        
-        #Task: A2
-        elif function_name == "format_file":
-            filepath = normalize_path(arguments.get("filepath"))
-
-            if filepath and os.path.exists(filepath):
-                return format_file(filepath)
-            else:
-                return {"success": False, "message": f"File {filepath} does not exist."}
-
-        #Task: A3
-        elif function_name == "count_weekdays":
-            file_path = normalize_path(arguments.get("file_path"))
-            weekday = arguments.get("weekday")
-            output_path = normalize_path(arguments.get("output_path"))
-
-            if file_path and weekday or output_path:
-                return count_weekdays(file_path, weekday, output_path)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-        
-        #Task: A4
-        elif function_name == "sort_contacts":
-            input_file = normalize_path(arguments.get("input_file"))
-            output_file = normalize_path(arguments.get("output_file"))
-            keys = arguments.get("keys")
-
-            if input_file and output_file and keys:
-                return sort_contacts(input_file, output_file, keys)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-            
-        #Task: A5
-        elif function_name == "write_recent_logs":
-            log_dir = normalize_path(arguments.get("log_dir"))
-            num_files = arguments.get("num_files")
-            output_file = normalize_path(arguments.get("output_file"))
-
-            if log_dir and output_file and num_files:
-                return write_recent_logs(log_dir, output_file, num_files)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-        
-        #Task: A6
-        elif function_name == "extract_markdown_headers":
-            input_dir = normalize_path(arguments.get("input_dir"))
-            output_file = normalize_path(arguments.get("output_file"))
-
-            if input_dir and output_file:
-                return extract_markdown_headers(input_dir, output_file)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-            
-        #Task: A7
-        elif function_name == "write_email_eddress":
-            input_file = normalize_path(arguments.get("input_file"))
-            output_file = normalize_path(arguments.get("output_file"))
-
-            if input_file and output_file:
-                return write_email_eddress(input_file, output_file)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-            
-        #Task: A8
-        elif function_name == "write_credit_card_no":
-            input_file = normalize_path(arguments.get("input_file"))
-            output_file = normalize_path(arguments.get("output_file"))
-
-            if input_file and output_file:
-                return write_credit_card_no(input_file, output_file)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-            
-        #Task: A9
-        elif function_name == "similar_comments":
-            input_file = normalize_path(arguments.get("input_file"))
-            output_file = normalize_path(arguments.get("output_file"))
-
-            if input_file and output_file:
-                result = await similar_comments(input_file, output_file) # Await here!
-                return result # Return the awaited result
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-        
-        #Task: A10
-        elif function_name == "calculate_gold_sales":
-            input_file = normalize_path(arguments.get("input_file"))
-            output_file = normalize_path(arguments.get("output_file"))
-
-            if input_file and output_file:
-                return calculate_gold_sales(input_file, output_file)
-            else:
-                return {"success": False, "message": "Missing required parameters."}
-            
-        #Task: B2    
-        elif function_name == "never_delete":
-            #file = normalize_path(arguments.get("file"))
-            raise HTTPException(status_code=400, detail="Deletion of data is not permitted anywhere on the file system")
-
-    return {"error": "Could not determine the appropriate function"}
+        result = await dispatcher.dispatch(function_name, arguments)
+        if isinstance(result, dict):
+            result["route"] = route
+        return result
+
+    elif tool_calls:
+        # Compound tasks: run every returned call, in parallel where their files don't overlap
+        calls = [(call["function"]["name"], json.loads(call["function"]["arguments"])) for call in tool_calls]
+        result = await dispatcher.dispatch_many(calls)
+        result["route"] = route
+        return result
+
+    return {"error": "Could not determine the appropriate function", "route": route}
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+#md_index.py
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Optional
+
+MD_INDEX_WORKERS = int(os.environ.get("MD_INDEX_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+MD_MANIFEST_DIR = os.environ.get("MD_MANIFEST_DIR", ".cache/md_index")
+
+# First "# Title" line, allowing leading whitespace as line.strip() did; trailing whitespace is not captured
+H1_RE = re.compile(rb"^[ \t\v\f\r\x1c-\x1f]*# (.*\S)", re.MULTILINE)
+
+_manifest_lock = threading.Lock()
+
+
+def scan_markdown_files(input_dir: str) -> Iterator[os.DirEntry]:
+    """Yield .md files top-down in os.walk order (each directory's files before its subdirectories)."""
+    with os.scandir(input_dir) as entries:
+        entries = list(entries)
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir():
+            if not entry.is_symlink():  # os.walk does not follow directory links either
+                subdirs.append(entry.path)
+        elif entry.name.endswith(".md") and entry.is_file():
+            yield entry
+    for subdir in subdirs:
+        yield from scan_markdown_files(subdir)
+
+
+def first_h1(path: str) -> Optional[str]:
+    """Return the first H1 title of a Markdown file, or None. The search stops at the first match."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            match = H1_RE.search(mapped)
+            return match.group(1).decode("utf-8", errors="replace") if match else None
+
+
+def _manifest_path(input_dir: str) -> str:
+    name = hashlib.sha256(os.path.abspath(input_dir).encode()).hexdigest()[:16]
+    return os.path.join(MD_MANIFEST_DIR, f"{name}.json")
+
+
+def _write_json_atomic(path: str, data: Any, indent: Optional[int] = None):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=indent)
+    os.replace(temp_path, path)
+
+
+def build_h1_index(input_dir: str, output_file: str, indent: int = 4) -> Dict[str, Any]:
+    """Write {relative path: first H1} for the Markdown files under input_dir to output_file.
+
+    Each file's mtime, size and title are kept in a manifest, so only new or changed files are
+    parsed (in a thread pool); the rest is a metadata walk. Both the index and the manifest are
+    written atomically. Returns {"files", "parsed", "reused", "elapsed_ms"}.
+    """
+    started = time.perf_counter()
+    manifest_path = _manifest_path(input_dir)
+    with _manifest_lock:
+        try:
+            with open(manifest_path, "r") as file:
+                manifest = json.load(file)
+            known = manifest["files"] if manifest.get("input_dir") == os.path.abspath(input_dir) else {}
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            known = {}
+
+        files, changed = {}, []
+        for entry in scan_markdown_files(input_dir):
+            stat = entry.stat()
+            relative_path = os.path.relpath(entry.path, input_dir)
+            cached = known.get(relative_path)
+            if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                files[relative_path] = cached
+            else:
+                files[relative_path] = [stat.st_mtime_ns, stat.st_size, None]
+                changed.append(relative_path)
+
+        if changed:
+            paths = [os.path.join(input_dir, relative_path) for relative_path in changed]
+            if len(paths) > 1:
+                with ThreadPoolExecutor(max_workers=min(MD_INDEX_WORKERS, len(paths))) as pool:
+                    titles = list(pool.map(first_h1, paths))
+            else:
+                titles = [first_h1(paths[0])]
+            for relative_path, title in zip(changed, titles):
+                files[relative_path][2] = title
+
+        _write_json_atomic(output_file, {path: entry[2] for path, entry in files.items() if entry[2] is not None}, indent)
+        if changed or len(files) != len(known):
+            _write_json_atomic(manifest_path, {"input_dir": os.path.abspath(input_dir), "files": files})
+
+    return {
+        "files": len(files),
+        "parsed": len(changed),
+        "reused": len(files) - len(changed),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
@@ -0,0 +1,72 @@
+#pair_search.py
+
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Rows per block: a block of scores is PAIR_BLOCK_SIZE² float32 (16 MiB at 2048)
+PAIR_BLOCK_SIZE = int(os.environ.get("PAIR_BLOCK_SIZE", "2048"))
+PAIR_SEARCH_WORKERS = int(os.environ.get("PAIR_SEARCH_WORKERS", str(os.cpu_count() or 1)))
+
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalize rows into a C-contiguous float32 matrix; all-zero rows stay zero."""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _block_top(unit: np.ndarray, start: int, stop: int, block_size: int, k: int) -> list[tuple[float, int, int]]:
+    # All pairs (i, j), i < j, with i in [start, stop): one row strip, matmul'd block by block
+    rows = unit[start:stop]
+    best: list[tuple[float, int, int]] = []
+    for column in range(start, len(unit), block_size):
+        scores = rows @ unit[column:column + block_size].T
+        if column == start:  # Diagonal block: keep the strictly upper triangle only
+            scores[np.tril_indices(scores.shape[0], 0, scores.shape[1])] = -np.inf
+        flat = scores.ravel()
+        take = min(k, flat.size)
+        if take < flat.size:
+            # argpartition picks arbitrarily among scores tied with the k-th one: take every
+            # candidate at or above it, best first and then by index (row-major, so lowest (i, j))
+            candidates = np.flatnonzero(flat >= flat[np.argpartition(flat, -take)[-take]])
+            candidates = candidates[np.lexsort((candidates, -flat[candidates]))][:take]
+        else:
+            candidates = np.arange(flat.size)
+        for index in candidates:
+            score = float(flat[index])
+            if score == -np.inf:
+                continue
+            i, j = divmod(int(index), scores.shape[1])
+            item = (score, -(start + i), -(column + j))  # Ties go to the lowest (i, j), like argmax
+            if len(best) < k:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+    return best
+
+
+def top_pairs(vectors, k: int = 1, block_size: int = PAIR_BLOCK_SIZE,
+              workers: int = PAIR_SEARCH_WORKERS) -> list[tuple[int, int, float]]:
+    """Return the k most cosine-similar pairs (i, j, similarity), i < j, best first.
+
+    Equal similarities are ordered by (i, j), lowest first, also at the k-th place.
+
+    Only the upper triangle is computed, as float32 BLAS matmuls of row strips against
+    column blocks, keeping a top-k heap per strip: memory is O(N·d + block_size²) per worker
+    rather than the N×N similarity matrix. Strips are scanned in a thread pool (BLAS releases the GIL).
+    """
+    unit = normalize(vectors)
+    if len(unit) < 2 or k < 1:
+        return []
+    starts = range(0, len(unit), block_size)
+    if workers > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as pool:
+            strips = list(pool.map(lambda start: _block_top(unit, start, min(start + block_size, len(unit)), block_size, k), starts))
+    else:
+        strips = [_block_top(unit, start, min(start + block_size, len(unit)), block_size, k) for start in starts]
+    best = heapq.nlargest(k, (item for strip in strips for item in strip))
+    return [(-i, -j, score) for score, i, j in best]
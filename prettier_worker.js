@@ -0,0 +1,77 @@
+// prettier_worker.js - long-lived Prettier process managed by prettier_worker.py
+//
+// Started as `npx -y -p prettier@<version> node prettier_worker.js`.
+// Protocol: one JSON request per line on stdin, one JSON response per line on stdout.
+//   -> {"id": 1, "files": ["data/format.md"]}
+//   <- {"id": 1, "results": [{"file": "data/format.md", "ok": true, "changed": true}]}
+// The first line written is {"ready": true, "version": "<prettier version>"}.
+
+const fs = require("fs/promises");
+const path = require("path");
+const readline = require("readline");
+
+function loadPrettier() {
+  // npx puts the installed package's node_modules/.bin on PATH; resolve prettier next to it
+  for (const dir of (process.env.PATH || "").split(path.delimiter)) {
+    if (dir.endsWith(path.join("node_modules", ".bin"))) {
+      try {
+        return require(path.join(dir, "..", "prettier"));
+      } catch (e) {
+        // Not this one, keep looking
+      }
+    }
+  }
+  return require("prettier");
+}
+
+const prettier = loadPrettier();
+
+async function formatFile(file) {
+  const source = await fs.readFile(file, "utf8");
+  const options = (await prettier.resolveConfig(file, { editorconfig: true })) || {};
+  const formatted = await prettier.format(source, { ...options, filepath: file });
+  const changed = formatted !== source;
+  if (changed) {
+    await fs.writeFile(file, formatted);
+  }
+  return { file, ok: true, changed };
+}
+
+function reply(message) {
+  process.stdout.write(JSON.stringify(message) + "\n");
+}
+
+const input = readline.createInterface({ input: process.stdin });
+// Requests still being formatted; stdin closing must not cut them off
+const pending = new Set();
+
+async function handle(line) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    reply({ id: null, error: `Invalid request: ${e.message}` });
+    return;
+  }
+  // Files in one batch are formatted concurrently
+  const results = await Promise.all(
+    (request.files || []).map((file) =>
+      formatFile(file).catch((e) => ({ file, ok: false, error: String((e && e.message) || e) }))
+    )
+  );
+  reply({ id: request.id, results });
+}
+
+input.on("line", (line) => {
+  const task = handle(line);
+  pending.add(task);
+  task.finally(() => pending.delete(task));
+});
+
+input.on("close", async () => {
+  // Finish (and answer) every request already read, then exit once stdout is flushed
+  await Promise.allSettled([...pending]);
+  process.stdout.write("", () => process.exit(0));
+});
+
+reply({ ready: true, version: prettier.version });
@@ -0,0 +1,231 @@
+#prettier_worker.py
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from typing import Dict, Any, Optional
+
+PRETTIER_PACKAGE = os.environ.get("PRETTIER_PACKAGE", "prettier@3.4.2")
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prettier_worker.js")
+
+# The first start may have to download the package through npx
+PRETTIER_STARTUP_TIMEOUT = float(os.environ.get("PRETTIER_STARTUP_TIMEOUT", "120"))
+PRETTIER_CALL_TIMEOUT = float(os.environ.get("PRETTIER_CALL_TIMEOUT", "60"))
+
+# Files per worker request when formatting a directory or glob
+PRETTIER_BATCH_SIZE = int(os.environ.get("PRETTIER_BATCH_SIZE", "200"))
+PRETTIER_MANIFEST_PATH = os.environ.get("PRETTIER_MANIFEST_PATH", ".cache/prettier-manifest.json")
+
+
+class PrettierUnavailable(Exception):
+    pass
+
+
+class PrettierWorker:
+    """A lazily started, long-lived Node process that formats files with Prettier.
+
+    Requests are newline-delimited JSON over the worker's stdin/stdout (see prettier_worker.js).
+    A worker that dies or stops answering is restarted once per call; if Node is missing or the
+    worker cannot be started, formatting falls back to one `npx prettier --write` per call.
+    """
+
+    def __init__(self, package: str = PRETTIER_PACKAGE):
+        self.package = package
+        self._proc: Optional[subprocess.Popen] = None
+        self._responses: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.version: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return shutil.which("node") is not None and shutil.which("npx") is not None
+
+    def _read_responses(self, proc: subprocess.Popen, responses: "queue.Queue"):
+        for line in proc.stdout:
+            try:
+                responses.put(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"Prettier worker wrote non-JSON output: {line.strip()}")
+        responses.put(None)  # EOF: the worker exited
+
+    def _start(self):
+        self._responses = queue.Queue()
+        self._proc = subprocess.Popen(
+            ["npx", "-y", "-p", self.package, "node", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        threading.Thread(target=self._read_responses, args=(self._proc, self._responses), daemon=True).start()
+        ready = self._receive(PRETTIER_STARTUP_TIMEOUT)
+        if not ready.get("ready"):
+            raise PrettierUnavailable(f"Unexpected worker greeting: {ready}")
+        self.version = ready.get("version")
+        logging.info(f"Started Prettier {self.version} worker (pid {self._proc.pid})")
+
+    def _receive(self, timeout: float) -> Dict[str, Any]:
+        try:
+            message = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise PrettierUnavailable("Prettier worker did not answer in time")
+        if message is None:
+            raise PrettierUnavailable("Prettier worker exited")
+        return message
+
+    def _stop(self):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def _request(self, files: list[str]) -> list[Dict[str, Any]]:
+        if self._proc is None or self._proc.poll() is not None:
+            self._stop()
+            self._start()
+        self._next_id += 1
+        request_id = self._next_id
+        try:
+            self._proc.stdin.write(json.dumps({"id": request_id, "files": files}) + "\n")
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise PrettierUnavailable(f"Prettier worker is not accepting input: {e}")
+        while True:
+            message = self._receive(PRETTIER_CALL_TIMEOUT)
+            if message.get("id") == request_id:
+                return message["results"]
+
+    def format_files(self, files: list[str]) -> list[Dict[str, Any]]:
+        """Format files in place. Returns one {"file", "ok", "changed"/"error"} dict per file."""
+        if not files:
+            return []
+        if self.available:
+            with self._lock:
+                for attempt in range(2):  # Restart a crashed or wedged worker once
+                    try:
+                        return self._request(files)
+                    except PrettierUnavailable as e:
+                        logging.warning(f"Prettier worker failed (attempt {attempt + 1}): {e}")
+                        self._stop()
+        return self._format_with_subprocess(files)
+
+    def _format_with_subprocess(self, files: list[str]) -> list[Dict[str, Any]]:
+        try:
+            result = subprocess.run(
+                ["npx", self.package, "--write", *files],
+                check=False,  # Don't raise exception automatically
+                capture_output=True,
+                text=True
+            )
+        except Exception as e:
+            return [{"file": file, "ok": False, "error": str(e)} for file in files]
+
+        if result.returncode != 0:
+            return [{"file": file, "ok": False, "error": result.stderr} for file in files]
+        return [{"file": file, "ok": True, "changed": None, "output": result.stdout} for file in files]
+
+    def close(self):
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                self._proc.stdin.close()  # The worker exits when stdin closes
+                try:
+                    self._proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+            self._stop()
+
+
+def content_hash(path: str) -> str:
+    # The extension picks Prettier's parser, so it is part of the identity of the content
+    digest = hashlib.sha256(os.path.splitext(path)[1].lower().encode() + b"\0")
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FormatManifest:
+    """Persisted sha256(input) -> sha256(formatted output) map for one Prettier version.
+
+    A file whose hash is already a known formatted output is skipped: Prettier is not
+    idempotent on every input (see datagen.a2_format_markdown), so formatted files must
+    not be formatted again.
+    """
+
+    def __init__(self, path: str = PRETTIER_MANIFEST_PATH, package: str = PRETTIER_PACKAGE):
+        self.path = path
+        self.package = package
+        self._lock = threading.Lock()
+        self._hashes: Optional[Dict[str, str]] = None
+        self._formatted: set = set()
+
+    def _load(self):
+        if self._hashes is not None:
+            return
+        self._hashes = {}
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            if data.get("package") == self.package:  # Another Prettier version formats differently
+                self._hashes = data.get("hashes", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        self._formatted = set(self._hashes.values())
+
+    def is_formatted(self, digest: str) -> bool:
+        with self._lock:
+            self._load()
+            return digest in self._formatted
+
+    def record(self, pairs: list[tuple[str, str]]):
+        with self._lock:
+            self._load()
+            for source, formatted in pairs:
+                self._hashes[source] = formatted
+                self._formatted.add(formatted)
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump({"package": self.package, "hashes": self._hashes}, file)
+            os.replace(temp_path, self.path)
+
+
+def format_with_manifest(files: list[str], worker: "PrettierWorker" = None,
+                         manifest: "FormatManifest" = None) -> list[Dict[str, Any]]:
+    """Format files in place, skipping those already in formatted form.
+
+    Returns one result dict per file, as PrettierWorker.format_files does, with
+    "skipped": True for files that were not sent to Prettier.
+    """
+    worker = worker or prettier
+    manifest = manifest or format_manifest
+    results, pending = {}, []
+    for file in files:
+        digest = content_hash(file)
+        if manifest.is_formatted(digest):
+            results[file] = {"file": file, "ok": True, "changed": False, "skipped": True}
+        else:
+            pending.append((file, digest))
+
+    recorded = []
+    for start in range(0, len(pending), PRETTIER_BATCH_SIZE):
+        batch = pending[start:start + PRETTIER_BATCH_SIZE]
+        for (file, digest), result in zip(batch, worker.format_files([file for file, _ in batch])):
+            results[file] = result
+            if result["ok"]:
+                recorded.append((digest, content_hash(file)))
+    if recorded:
+        manifest.record(recorded)
+    return [results[file] for file in files]
+
+
+prettier = PrettierWorker()
+format_manifest = FormatManifest()
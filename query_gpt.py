@@ -1,28 +1,117 @@
+import asyncio
 import httpx
 import logging
+import random
+import weakref
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from gpt_cache import response_cache
 
 AI_PROXY_TOKEN = os.environ.get("AIPROXY_TOKEN")
 AI_PROXY_URL = "http://aiproxy.sanand.workers.dev/openai/v1/chat/completions"
+AI_PROXY_EMBEDDINGS_URL = "https://aiproxy.sanand.workers.dev/openai/v1/embeddings"
+GPT_MODEL = "gpt-4o-mini"
+
+# Connection pool settings for the shared client (overridable from the environment)
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+
+# Per-call timeouts (seconds)
+CHAT_TIMEOUT = float(os.environ.get("LLM_CHAT_TIMEOUT", "30"))
+VISION_TIMEOUT = float(os.environ.get("LLM_VISION_TIMEOUT", "60"))
+EMBEDDINGS_TIMEOUT = float(os.environ.get("LLM_EMBEDDINGS_TIMEOUT", "30"))
+
+# Embedding requests: per-request budget (the API allows 2048 inputs and ~300k tokens), parallelism and retries
+EMBEDDINGS_BATCH_TOKENS = int(os.environ.get("EMBEDDINGS_BATCH_TOKENS", "100000"))
+EMBEDDINGS_BATCH_INPUTS = int(os.environ.get("EMBEDDINGS_BATCH_INPUTS", "2048"))
+EMBEDDINGS_CONCURRENCY = int(os.environ.get("EMBEDDINGS_CONCURRENCY", "8"))
+EMBEDDINGS_MAX_RETRIES = int(os.environ.get("EMBEDDINGS_MAX_RETRIES", "5"))
+EMBEDDINGS_RETRY_BASE = 0.5  # seconds
+EMBEDDINGS_RETRY_MAX_DELAY = 30.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+# One limit on in-flight embedding requests across all callers; asyncio semaphores belong to one event loop
+_embeddings_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        headers={"Authorization": f"Bearer {AI_PROXY_TOKEN}"},
+        limits=httpx.Limits(
+            max_connections=LLM_POOL_SIZE,
+            max_keepalive_connections=LLM_POOL_SIZE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=call_timeout(CHAT_TIMEOUT),
+    )
+
+
+def call_timeout(seconds: float) -> httpx.Timeout:
+    # A bare float passed as timeout= replaces the client's whole httpx.Timeout, connect included
+    return httpx.Timeout(seconds, connect=LLM_CONNECT_TIMEOUT)
+
+
+async def open_client() -> httpx.AsyncClient:
+    """Create the process-wide AI Proxy client. Called once at app startup."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def close_client():
+    """Close the process-wide AI Proxy client. Called once at app shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily when used outside the app lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def get_embeddings_semaphore() -> asyncio.Semaphore:
+    """Return the running loop's semaphore of EMBEDDINGS_CONCURRENCY embedding requests, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    semaphore = _embeddings_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _embeddings_semaphores[loop] = asyncio.Semaphore(EMBEDDINGS_CONCURRENCY)
+    return semaphore
+
+
+async def query_gpt(task: str, tools: list[Dict[str, Any]]) -> Dict[str, Any]:
+    # Repeated task phrasings are answered from the response cache without a round-trip
+    # Only the in-memory tier is checked on the event loop; SQLite reads and writes run in a thread
+    cache_key = await asyncio.to_thread(response_cache.make_key, task, tools, GPT_MODEL)
+    cached = response_cache.get_memory(cache_key)
+    if cached is None:
+        cached = await asyncio.to_thread(response_cache.get_disk, cache_key)
+    if cached is not None:
+        logging.info(f"GPT response cache hit: {response_cache.stats}")
+        cached["cached"] = True
+        return cached
 
-def query_gpt(task: str, tools: list[Dict[str, Any]]) -> Dict[str, Any]:
     try:
-        response = httpx.post(
+        response = await get_client().post(
             AI_PROXY_URL,
-            headers={
-                "Authorization": f"Bearer {AI_PROXY_TOKEN}",
-                "Content-Type": "application/json",
-            },
             json={
-                "model": "gpt-4o-mini",
+                "model": GPT_MODEL,
                 "messages": [
                     {"role": "user", "content": task},
                 ],
                 "tools": tools,
                 "tool_choice": "auto",
             },
+            timeout=call_timeout(CHAT_TIMEOUT),
         )
         response_data = response.json()
         logging.info(f"GPT API Response: {json.dumps(response_data, indent=2)}")
@@ -30,8 +119,75 @@ def query_gpt(task: str, tools: list[Dict[str, Any]]) -> Dict[str, Any]:
         if "choices" not in response_data or not response_data["choices"]:
             return {"error": "Invalid response from API"}
 
-        return response_data["choices"][0]["message"]
+        message = response_data["choices"][0]["message"]
+        if message.get("tool_calls"):  # Only successful tool selections are worth caching
+            await asyncio.to_thread(response_cache.put, cache_key, message)
+        return message
 
     except Exception as e:
         logging.error(f"Error querying GPT: {str(e)}")
-        return {"error": f"API request failed: {str(e)}"}
\ No newline at end of file
+        return {"error": f"API request failed: {str(e)}"}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes per token for English BPE; errs high for non-ASCII, which only makes batches smaller
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+def embedding_batches(texts: list[str], max_tokens: int = EMBEDDINGS_BATCH_TOKENS,
+                      max_inputs: int = EMBEDDINGS_BATCH_INPUTS) -> list[tuple[int, int]]:
+    """Split texts into consecutive (start, stop) ranges within a token budget and input count."""
+    batches, start, tokens = [], 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (tokens + cost > max_tokens or i - start >= max_inputs):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+async def _post_embeddings(texts: list[str], model: str, semaphore: asyncio.Semaphore) -> list[list[float]]:
+    # Retries rate limits and server errors with full-jitter exponential backoff (or the server's Retry-After)
+    for attempt in range(EMBEDDINGS_MAX_RETRIES + 1):
+        async with semaphore:
+            try:
+                response = await get_client().post(
+                    AI_PROXY_EMBEDDINGS_URL,
+                    json={"model": model, "input": texts},
+                    timeout=call_timeout(EMBEDDINGS_TIMEOUT),
+                )
+            except httpx.TransportError as e:
+                if attempt == EMBEDDINGS_MAX_RETRIES:
+                    raise
+                logging.warning(f"Embeddings request failed ({e!r}), retrying")
+                response = None
+        if response is not None:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == EMBEDDINGS_MAX_RETRIES:
+                response.raise_for_status()
+                data = sorted(response.json()["data"], key=lambda item: item["index"])
+                return [item["embedding"] for item in data]
+            logging.warning(f"Embeddings request got HTTP {response.status_code}, retrying")
+        delay = random.uniform(0, EMBEDDINGS_RETRY_BASE * 2 ** attempt)
+        try:
+            delay = max(delay, float(response.headers["retry-after"]))
+        except (AttributeError, KeyError, ValueError):  # No response, no header, or an HTTP date
+            pass
+        await asyncio.sleep(min(delay, EMBEDDINGS_RETRY_MAX_DELAY))
+
+
+async def query_embeddings(texts: list[str], model: str = "text-embedding-3-small") -> list[list[float]]:
+    """Embed a list of texts through the shared client, in order. Raises on HTTP errors.
+
+    Texts are split into batches of at most EMBEDDINGS_BATCH_TOKENS (estimated) tokens, sent
+    at most EMBEDDINGS_CONCURRENCY at a time across the process; 429 and 5xx responses are
+    retried with jittered backoff.
+    """
+    if not texts:
+        return []
+    semaphore = get_embeddings_semaphore()
+    batches = embedding_batches(texts)
+    results = await asyncio.gather(*(_post_embeddings(texts[start:stop], model, semaphore) for start, stop in batches))
+    return [embedding for batch in results for embedding in batch]
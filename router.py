@@ -0,0 +1,309 @@
+#router.py
+
+import glob
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Any, Optional
+
+from tools import tools
+
+# Minimum combined score, and lead over the runner-up, before a task is routed locally
+ROUTER_MIN_SCORE = 0.5
+ROUTER_MIN_MARGIN = 0.2
+
+# Share of the score given to keyword rules; the rest comes from TF-IDF similarity
+RULE_WEIGHT = 0.7
+
+# Keyword/regex rules per tool name. The score is the fraction of a tool's rules that match.
+KEYWORD_RULES = {
+    "run_uv_script": [r"\buv\b", r"datagen(\.py)?\b"],
+    "format_file": [r"\bprettier\b", r"\bformat"],
+    "count_weekdays": [r"\b(mon|tues|wednes|thurs|fri|satur|sun|week)days?\b", r"\bcount|\bhow many\b", r"\bdates?\b"],
+    "sort_contacts": [r"\bsort", r"\bcontacts?\b"],
+    "write_recent_logs": [r"\.log\b|\blogs?\b", r"\b(most )?recent\b", r"\bfirst line\b"],
+    "extract_lines": [r"\b(first|last|top|bottom|final)\s+(\d+\s+|\w+\s+)?lines\b|\blines?\s+(matching|containing|that (match|contain))\b|\b(head|tail|grep)\b",
+                      r"\blines?\b"],
+    "extract_markdown_headers": [r"\bmarkdown\b|\.md\b", r"\bh1\b|\bheaders?\b|\bheadings?\b|\btitles?\b", r"\bindex\b"],
+    "search_headings": [r"\bsearch\w*\b|\blook ?up\b|\bwhich (markdown |\.md )?files?\b|\b(title|heading)s? (start|begin)(s|ning)? with\b",
+                        r"\bheadings?\b|\btitles?\b|\bh[1-6]\b", r"\bdocs?\b|\bmarkdown\b|\.md\b"],
+    "write_email_eddress": [r"\bemail\b", r"\bsender\b|\bfrom address\b|\bsubject\b|\brecipients?\b"],
+    "extract_email_batch": [r"\bmbox\b|\bmaildir\b|\bmail ?archives?\b|\bmailbox(es)?\b", r"\bsenders?\b|\brecipients?\b|\be?mails?\b|\bmessages\b"],
+    "write_credit_card_no": [r"\bcredit.?card\b|\bcard number\b", r"\.png\b|\bimage\b"],
+    "similar_comments": [r"\bsimilar", r"\bcomments?\b", r"\bembeddings?\b"],
+    "similar_to_comment": [r"\bsimilar to\b|\bclosest to\b|\bnearest\b|\bneighbou?rs?\b", r"\bcomments?\b"],
+    "comment_duplicates": [r"\b(near.?)?duplicates?\b|\bdedup\w*\b|\bclusters?\b", r"\bcomments?\b"],
+    "calculate_gold_sales": [r"\bgold\b", r"\btickets?\b", r"\bsales\b|\btotal\b"],
+    "never_delete": [r"\b(delete|deletion|remove|erase|unlink|rm)\b"],
+}
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+}
+
+# /data, or a path under it; a bare "data" (as in "database" or "the data") is not a path
+PATH_RE = re.compile(r"(?<![\w.:/-])(?:/data|data(?=/))(?:/[^\s`'\",;()]*)?(?![\w-]|\.\w)")
+# Sentence punctuation that PATH_RE picks up at the end of a path ("... in /data/dates.txt?")
+PATH_TRAILING_PUNCTUATION = ".,;:?!"
+# The role of a path comes from the words around it: "as output" after it, or "to"/"into",
+# "write ... in" before it for an output, and "in"/"from"/"of" before it for an input
+PATH_ROLE_SUFFIX_RE = re.compile(r"^[`'\"”’)]*\s*as\s+(?:the\s+|an?\s+)?(input|output)\b", re.IGNORECASE)
+PATH_ROLE_PREFIX_RES = [
+    ("output", re.compile(r"(?:\b(?:to|into)|\boutput(?:\s+(?:file|path))?(?:\s+(?:is|at))?\s*:?"
+                          r"|\b(?:write|save|store|put)\b(?:(?!\b(?:of|from|in)\b)[^.;?!])*\b(?:in|at|as))$", re.IGNORECASE)),
+    ("input", re.compile(r"(?:\b(?:in|from|of|inside|within)|\binput(?:\s+(?:file|path|dir(?:ectory)?))?(?:\s+(?:is|at))?\s*:?)$",
+                         re.IGNORECASE)),
+]
+CLAUSE_END_RE = re.compile(r"[.;?!,](?=\s)")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+WEEKDAY_RE = re.compile(r"\b(" + "|".join(WEEKDAYS) + r")s?\b", re.IGNORECASE)
+ALL_WEEKDAYS_RE = re.compile(r"\b(all|every|each)\s+(week)?days?\b|\bdays? of the week\b", re.IGNORECASE)
+NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+# Integer parameters are only bound to a number next to their own keywords ("10 most recent",
+# "last 20 lines", "top 5"); elsewhere in a task a number means something else ("one per line")
+INTEGER_PARAM_RES = {
+    param: re.compile("|".join(patterns).replace("{N}", NUMBER), re.IGNORECASE)
+    for param, patterns in {
+        "num_files": [r"\b{N}\s+(?:most\s+)?(?:recent|latest|newest)\b", r"\b(?:recent|latest|newest)\s+{N}\b",
+                      r"\b{N}\s+(?:`?\.?log`?\s+)?files\b"],
+        "count": [r"\b(?:first|last|top|bottom|final|head|tail)\s+{N}\b", r"\b{N}\s+lines\b",
+                  r"\b(?:at most|up to|max(?:imum)?(?:\s+of)?)\s+{N}\s+(?:lines|matches)\b"],
+        "limit": [r"\b(?:at most|up to|max(?:imum)?(?:\s+of)?|limit(?:ed)?(?:\s+to)?|first|top)\s+{N}\b",
+                  r"\b{N}\s+(?:headings|titles|results|matches)\b"],
+        "top_k": [r"\btop\s+{N}\b", r"\b{N}\s+(?:most\s+similar\s+)?pairs\b"],
+        "k": [r"\btop\s+{N}\b", r"\b{N}\s+(?:most\s+similar\s+|closest\s+|nearest\s+|similar\s+)?comments\b"],
+    }.items()
+}
+LINE_MODE_RES = [
+    ("grep", re.compile(r"\b(matching|containing|contains?|match(es)?|grep)\b", re.IGNORECASE)),
+    ("tail", re.compile(r"\b(last|tail|bottom|final)\b", re.IGNORECASE)),
+    ("head", re.compile(r"\b(first|head|top)\b", re.IGNORECASE)),
+]
+LINE_PATTERN_RE = re.compile(r"\b(?:matching|containing|contains?|match(?:es)?)\s+(?:the\s+)?(?:regex|pattern|text|string|word)?\s*[`'\"]([^`'\"]+)[`'\"]", re.IGNORECASE)
+IGNORE_CASE_RE = re.compile(r"\bcase.?insensitive\b|\bignor\w*\s+(the\s+)?case\b", re.IGNORECASE)
+QUOTED_RE = re.compile(r"[`'\"]([^`'\"]*\S[^`'\"]*)[`'\"]")
+HEADING_MATCH_RES = [
+    ("prefix", re.compile(r"\bstart(s|ing)? with\b|\bbegin(s|ning)? with\b|\bprefix\b", re.IGNORECASE)),
+    ("exact", re.compile(r"\bexact(ly)?\b|\btitled\b|\bnamed\b|\bcalled\b", re.IGNORECASE)),
+]
+HEADING_LEVEL_RE = re.compile(r"\bh([1-6])\b", re.IGNORECASE)
+EMAIL_FIELD_RE = re.compile(r"\b(subject|date|cc|recipients?|sender)\b", re.IGNORECASE)
+SORT_KEYS_RE = re.compile(r"\bby\s+(.+?)(?:,?\s+(?:and\s+)?(?:write|save|store|output)\b|\s+to\s+/|$)", re.IGNORECASE | re.DOTALL)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "the", "of", "in", "to", "is", "it", "by", "for", "with", "each", "given", "file",
+             "files", "write", "written", "will", "be", "where", "result", "output", "input", "path", "specified"}
+
+
+def is_path_param(name: str) -> bool:
+    return name == "filepath" or name.endswith(("_file", "_path", "_dir"))
+
+
+def input_exists(path: str) -> bool:
+    """Whether an input path exists as functions.normalize_path would resolve it (globs are not checked)."""
+    return glob.has_magic(path) or os.path.exists(path) or os.path.exists(path.lstrip("/"))
+
+
+def path_roles(task: str) -> Optional[Dict[str, Optional[str]]]:
+    """Map each path in the task, in order of mention, to "input", "output" or None (undecided).
+
+    Returns None if one path is named as both an input and an output.
+    """
+    roles: Dict[str, Optional[str]] = {}
+    previous_end = 0
+    for match in PATH_RE.finditer(task):
+        path = match.group(0).rstrip(PATH_TRAILING_PUNCTUATION)
+        prefix = task[previous_end:match.start()]
+        prefix = prefix[max((m.end() for m in CLAUSE_END_RE.finditer(prefix)), default=0):].rstrip(" \t\n`'\"“‘(")
+        previous_end = match.end()
+        suffix = PATH_ROLE_SUFFIX_RE.match(task[match.start() + len(path):])
+        role = suffix.group(1).lower() if suffix else next(
+            (role for role, regex in PATH_ROLE_PREFIX_RES if regex.search(prefix)), None)
+        key = next((known for known in roles if known.rstrip("/") == path.rstrip("/")), path)
+        if roles.get(key) and role and roles[key] != role:
+            return None
+        roles[key] = roles.get(key) or role
+    return roles
+
+
+def _same_path(a: str, b: str) -> bool:
+    return os.path.normpath(a.lstrip("/")) == os.path.normpath(b.lstrip("/"))
+
+
+def _tokens(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall(text.lower().replace("_", " ")) if t not in STOPWORDS]
+
+
+class IntentRouter:
+    """Match tasks to tools in tools.py without an LLM round-trip.
+
+    Each tool is scored with compiled keyword rules and a TF-IDF cosine over its name,
+    description and parameter descriptions. Arguments are then pulled out of the task
+    text with regexes; a task is only routed locally when it scores clearly above every
+    other tool and all required arguments were found.
+    """
+
+    def __init__(self, tools: list[Dict[str, Any]]):
+        self.schemas = {tool["function"]["name"]: tool["function"] for tool in tools}
+        self.rules = {
+            name: [re.compile(rule, re.IGNORECASE) for rule in KEYWORD_RULES.get(name, [])]
+            for name in self.schemas
+        }
+
+        docs = {}
+        for name, schema in self.schemas.items():
+            text = " ".join([name, schema.get("description", "")] + [
+                prop.get("description", "") for prop in schema["parameters"]["properties"].values()
+            ])
+            docs[name] = Counter(_tokens(text))
+        doc_freq = Counter(token for counts in docs.values() for token in counts)
+        self.idf = {token: math.log((1 + len(docs)) / (1 + df)) + 1 for token, df in doc_freq.items()}
+        self.vectors = {name: self._weigh(counts) for name, counts in docs.items()}
+
+    def _weigh(self, counts: Counter) -> Dict[str, float]:
+        vector = {token: count * self.idf[token] for token, count in counts.items() if token in self.idf}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {token: v / norm for token, v in vector.items()}
+
+    def score(self, task: str) -> list[tuple[float, str]]:
+        query = self._weigh(Counter(_tokens(task)))
+        scores = []
+        for name, vector in self.vectors.items():
+            rules = self.rules[name]
+            rule_score = sum(1 for rule in rules if rule.search(task)) / len(rules) if rules else 0.0
+            tfidf_score = sum(weight * vector.get(token, 0.0) for token, weight in query.items())
+            scores.append((RULE_WEIGHT * rule_score + (1 - RULE_WEIGHT) * tfidf_score, name))
+        scores.sort(reverse=True)
+        return scores
+
+    def assign_paths(self, name: str, task: str) -> Optional[Dict[str, str]]:
+        """Bind the task's paths to the tool's path parameters by role; None if that is ambiguous.
+
+        Inputs and outputs are only bound to parameters of the same role. Paths whose role is
+        undecided fill the remaining parameters only if those all have one role and there are
+        no more such paths than parameters. An output the tool would not write, or one that is
+        also an input of the task, makes the whole assignment ambiguous.
+        """
+        roles = path_roles(task)
+        if roles is None:
+            return None
+        params = [param for param in self.schemas[name]["parameters"]["properties"] if is_path_param(param)]
+        param_role = {param: "output" if param.startswith("output") else "input" for param in params}
+        unused = dict(roles)
+        assigned = {}
+
+        def take(param: str, role: Optional[str]):
+            candidates = [path for path, path_role in unused.items() if path_role == role]
+            if param.endswith("_dir"):
+                preferred = [path for path in candidates if not re.search(r"\.\w+$", path)]
+            elif param.endswith("_path") and param_role[param] == "input":
+                preferred = candidates  # A file or a directory: take the first one mentioned
+            else:
+                preferred = [path for path in candidates if re.search(r"\.\w+$", path)]
+            pool = preferred or candidates
+            if pool:
+                assigned[param] = pool[0]
+                del unused[pool[0]]
+
+        for param in params:
+            take(param, param_role[param])
+        unfilled = [param for param in params if param not in assigned]
+        undecided = [path for path, role in unused.items() if role is None]
+        if unfilled and undecided:
+            if len({param_role[param] for param in unfilled}) > 1 or len(undecided) > len(unfilled):
+                return None
+            for param in unfilled:
+                take(param, None)
+
+        if any(role == "output" for role in unused.values()):
+            return None
+        inputs = [path for path, role in roles.items() if role == "input"]
+        inputs += [path for param, path in assigned.items() if param_role[param] == "input"]
+        if any(_same_path(path, other) for param, path in assigned.items() if param_role[param] == "output"
+               for other in inputs):
+            return None
+        return assigned
+
+    def extract_arguments(self, name: str, task: str) -> Optional[Dict[str, Any]]:
+        properties = self.schemas[name]["parameters"]["properties"]
+        paths = list(dict.fromkeys(p.rstrip(PATH_TRAILING_PUNCTUATION) for p in PATH_RE.findall(task)))
+        path_arguments = self.assign_paths(name, task)
+        if path_arguments is None:
+            return None  # Which path is read and which is written is for the LLM to decide
+        text_without_paths = PATH_RE.sub(" ", task)
+
+        arguments = {}
+        for param, spec in properties.items():
+            value = None
+            if is_path_param(param):
+                value = path_arguments.get(param)
+            elif param == "email":
+                match = EMAIL_RE.search(task)
+                value = match.group(0) if match else None
+            elif param == "weekday":
+                match = WEEKDAY_RE.search(task)
+                value = match.group(1).capitalize() if match else ("all" if ALL_WEEKDAYS_RE.search(task) else None)
+            elif spec.get("type") == "integer" and param in INTEGER_PARAM_RES:
+                match = INTEGER_PARAM_RES[param].search(EMAIL_RE.sub(" ", text_without_paths))
+                if match:
+                    token = next(group for group in match.groups() if group).lower()
+                    value = int(token) if token.isdigit() else NUMBER_WORDS[token]
+            elif param == "mode" and name == "extract_lines":
+                value = next((mode for mode, regex in LINE_MODE_RES if regex.search(text_without_paths)), None)
+            elif param == "pattern":
+                match = LINE_PATTERN_RE.search(task)
+                value = match.group(1) if match else None
+            elif param == "ignore_case":
+                value = True if IGNORE_CASE_RE.search(task) else None
+            elif param == "query":
+                match = QUOTED_RE.search(text_without_paths)
+                value = match.group(1).strip() if match else None
+            elif param == "match" and name == "search_headings":
+                value = next((mode for mode, regex in HEADING_MATCH_RES if regex.search(text_without_paths)), None)
+            elif param == "levels":
+                value = sorted({int(level) for level in HEADING_LEVEL_RE.findall(task)}) or None
+            elif param == "field" and name == "write_email_eddress":
+                match = EMAIL_FIELD_RE.search(text_without_paths)
+                value = match.group(1).lower() if match else None
+            elif param == "keys":
+                match = SORT_KEYS_RE.search(text_without_paths)
+                if match:
+                    parts = re.split(r",?\s*(?:\bthen\b|\band\b|,)\s*", match.group(1).replace("`", ""))
+                    value = [p.strip() for p in parts if re.fullmatch(r"[A-Za-z_]\w*", p.strip())] or None
+            if value is not None:
+                arguments[param] = value
+
+        if name == "extract_lines" and arguments.get("mode") == "grep" and "pattern" not in arguments:
+            return None
+        if name == "never_delete" and "file" not in arguments:
+            arguments["file"] = paths[0] if paths else ""
+        missing = [param for param in self.schemas[name]["parameters"].get("required", []) if param not in arguments]
+        if missing or not all(input_exists(value) for param, value in arguments.items()
+                              if is_path_param(param) and not param.startswith("output")):
+            return None  # The LLM may read the task differently
+        return arguments
+
+    def route(self, task: str) -> Optional[Dict[str, Any]]:
+        """Return a tool-call message shaped like query_gpt's, or None to fall back to the LLM."""
+        scores = self.score(task)
+        (best_score, best), (runner_up, _) = scores[0], scores[1]
+        if best_score < ROUTER_MIN_SCORE or best_score - runner_up < ROUTER_MIN_MARGIN:
+            return None
+        arguments = self.extract_arguments(best, task)
+        if arguments is None:
+            return None
+        return {
+            "role": "assistant",
+            "tool_calls": [{
+                "id": "local-0",
+                "type": "function",
+                "function": {"name": best, "arguments": json.dumps(arguments)},
+            }],
+            "confidence": round(best_score, 3),
+        }
+
+
+router = IntentRouter(tools)
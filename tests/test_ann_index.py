@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+
+import ann_index
+from ann_index import IVFIndex, use_comment_index, nearest_comments, duplicate_clusters
+from embedding_backends import HashedNgramBackend
+
+BACKEND = HashedNgramBackend()
+
+
+def test_ivf_search_with_all_lists_probed_is_exact():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    index = IVFIndex("test")
+    index.add([str(i) for i in range(400)], [str(i) for i in range(400)], vectors)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for query in range(0, 400, 37):
+        expected = np.argsort(-(unit @ unit[query]), kind="stable")[:5].tolist()
+        assert [row for row, _ in index.search(vectors[query], 5, nprobe=len(index.centroids))] == expected
+
+
+def test_index_follows_the_comments_file(tmp_path):
+    comments = tmp_path / "comments.txt"
+    comments.write_text("the delivery was very late\nthe delivery was very late!\ngreat product, works well\n"
+                        "great product, works well\nterrible customer support\n")
+
+    async def run():
+        clusters, stats = await use_comment_index(str(comments), duplicate_clusters, 0.8, backend=BACKEND)
+        assert stats["inserted"] == 4 and stats["embedding_backend"] == "local"
+        assert [[member["lines"] for member in cluster["comments"]] for cluster in clusters] == [[[1], [2]], [[3, 4]]]
+
+        query = (await BACKEND.embed(["customer support was terrible"]))[0]
+        matches, stats = await use_comment_index(str(comments), nearest_comments, query, 1, backend=BACKEND)
+        assert stats["inserted"] == 0
+        assert matches[0]["comment"] == "terrible customer support" and matches[0]["lines"] == [5]
+
+    asyncio.run(run())
+    assert (tmp_path / ".comments.txt.ann.npz").exists()
+
+    # A new event loop (and a changed file) must not reuse the first loop's lock
+    comments.write_text("great product, works well\nbrand new comment\n")
+    ann_index._indexes.clear()
+    _, stats = asyncio.run(use_comment_index(str(comments), lambda index: None, backend=BACKEND))
+    assert (stats["inserted"], stats["removed"], stats["indexed"]) == (1, 3, 2)
+
+
+def test_operations_on_one_file_do_not_overlap(tmp_path):
+    comments = tmp_path / "comments.txt"
+    comments.write_text("one comment\nanother comment\n")
+    active, overlaps = [0], []
+    guard = threading.Lock()
+
+    def slow(index):
+        with guard:
+            active[0] += 1
+            overlaps.append(active[0] > 1)
+        time.sleep(0.05)
+        with guard:
+            active[0] -= 1
+
+    async def run():
+        await asyncio.gather(*(use_comment_index(str(comments), slow, backend=BACKEND) for _ in range(4)))
+
+    asyncio.run(run())
+    assert overlaps == [False] * 4
+
+
+def test_save_stores_texts_without_padding(tmp_path):
+    texts = [f"comment {i} ü€ 😀\n" for i in range(2000)] + ["x" * 5000 + "\n"]
+    index = IVFIndex("test")
+    index.add([str(i) for i in range(len(texts))], texts, np.random.default_rng(0).normal(size=(len(texts), 8)))
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    text_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    assert os.path.getsize(path) < text_bytes + 2 * len(texts) * (64 * 4 + 8 * 4 + 16)
+
+    loaded = IVFIndex.load(path)
+    assert loaded.texts == texts and loaded.keys == index.keys
+    assert loaded.search(index.vectors[3], 1, nprobe=len(loaded.centroids))[0][0] == 3
+
+
+def test_sync_keeps_file_reads_and_removals_off_the_event_loop(tmp_path, monkeypatch):
+    comments = tmp_path / "comments.txt"
+    comments.write_text("one comment\nanother comment\n")
+    loop_threads, blocking_threads = [], []
+    original_remove, original_key = IVFIndex.remove, ann_index.text_key
+
+    def remove(self, keys):
+        blocking_threads.append(threading.get_ident())
+        return original_remove(self, keys)
+
+    def key(text):
+        blocking_threads.append(threading.get_ident())
+        return original_key(text)
+    monkeypatch.setattr(IVFIndex, "remove", remove)
+    monkeypatch.setattr(ann_index, "text_key", key)
+
+    async def run():
+        loop_threads.append(threading.get_ident())
+        await use_comment_index(str(comments), lambda index: None, backend=BACKEND)
+        comments.write_text("one comment\n")
+        await use_comment_index(str(comments), lambda index: None, backend=BACKEND)
+
+    asyncio.run(run())
+    assert blocking_threads and loop_threads[0] not in blocking_threads
@@ -0,0 +1,56 @@
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from card_ocr import luhn_valid, read_card_number, read_card_numbers
+
+VALID_NUMBERS = ["4539578763621486", "5555555555554444", "4111111111111111", "6011000990139424"]
+
+
+def luhn_reference(number):
+    digits = [int(char) for char in number]
+    for i in range(len(digits) - 2, -1, -2):
+        digits[i] = sum(divmod(digits[i] * 2, 10))
+    return sum(digits) % 10 == 0
+
+
+def draw_card(path, number, origin=(50, 250)):
+    # The layout of datagen.a8_credit_card_image
+    image = Image.new("RGB", (1012, 638), (25, 68, 141))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.text(origin, " ".join(number[i:i + 4] for i in range(0, len(number), 4)), fill=(255, 255, 255), font=font)
+    draw.text((50, 400), "VALID\nTHRU", fill=(255, 255, 255))
+    draw.text((50, 480), "12/29", fill=(255, 255, 255))
+    draw.text((50, 550), "Jane Doe", fill=(255, 255, 255))
+    image.save(path)
+    return str(path)
+
+
+def test_luhn_matches_reference():
+    for number in VALID_NUMBERS:
+        assert luhn_valid(number)
+    for value in range(0, 200000, 7):
+        number = str(value)
+        assert luhn_valid(number) == luhn_reference(number)
+
+
+@pytest.mark.parametrize("number", VALID_NUMBERS)
+def test_reads_generated_card(tmp_path, number):
+    assert read_card_number(draw_card(tmp_path / "card.png", number)) == number
+
+
+def test_tolerates_a_shifted_origin(tmp_path):
+    assert read_card_number(draw_card(tmp_path / "card.png", VALID_NUMBERS[0], origin=(51, 249))) == VALID_NUMBERS[0]
+
+
+def test_rejects_what_it_cannot_verify(tmp_path):
+    assert read_card_number(draw_card(tmp_path / "luhn.png", "4539578763621487")) is None  # Fails the Luhn check
+    assert read_card_number(draw_card(tmp_path / "moved.png", VALID_NUMBERS[0], origin=(200, 100))) is None
+    blank = tmp_path / "blank.png"
+    Image.new("RGB", (1012, 638), (25, 68, 141)).save(blank)
+    assert read_card_number(str(blank)) is None
+
+
+def test_batch_keeps_order(tmp_path):
+    paths = [draw_card(tmp_path / f"{i}.png", number) for i, number in enumerate(VALID_NUMBERS)]
+    assert read_card_numbers(paths, workers=3) == VALID_NUMBERS
@@ -0,0 +1,52 @@
+import json
+import operator
+import random
+
+import pytest
+
+import contacts_sort
+from contacts_sort import compile_sort_key, sort_json_array
+
+
+def make_contacts(count, seed=0):
+    rng = random.Random(seed)
+    names = ["Ann", "bob", "Cara", "dan", "Émile", None]
+    return [{"first_name": rng.choice(names), "last_name": rng.choice(names[:5]), "id": i} for i in range(count)]
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+@pytest.mark.parametrize("budget", [10 ** 9, 2000, 1])
+def test_sort_matches_sorted_and_writes_json_dump_output(tmp_path, budget, monkeypatch):
+    monkeypatch.setattr(contacts_sort, "MERGE_FAN_IN", 3)  # Force multi-pass merges
+    contacts = [c for c in make_contacts(300) if c["first_name"] is not None]
+    source = write(tmp_path / "in.json", contacts)
+    key, reverse = compile_sort_key(["last_name", "first_name"])
+    stats = sort_json_array(source, str(tmp_path / "out.json"), key, reverse, memory_budget=budget)
+
+    expected = sorted(contacts, key=operator.itemgetter("last_name", "first_name"))
+    assert (tmp_path / "out.json").read_text() == json.dumps(expected, indent=2)
+    assert stats["records"] == 300 - sum(c["first_name"] is None for c in make_contacts(300))
+    assert (stats["runs"] == 0) == (budget == 10 ** 9)
+
+
+def test_in_memory_path_accounts_for_record_overhead(tmp_path):
+    source = write(tmp_path / "in.json", make_contacts(50))
+    size = (tmp_path / "in.json").stat().st_size
+    key, reverse = compile_sort_key(["id"])
+    # A file just under the budget would take RECORD_OVERHEAD x the budget once parsed
+    assert sort_json_array(source, str(tmp_path / "a.json"), key, reverse, memory_budget=size)["runs"] > 0
+    budget = size * contacts_sort.RECORD_OVERHEAD
+    assert sort_json_array(source, str(tmp_path / "b.json"), key, reverse, memory_budget=budget)["runs"] == 0
+
+
+def test_null_safe_key_with_mixed_directions():
+    contacts = make_contacts(200, seed=1)
+    key, reverse = compile_sort_key([{"key": "first_name", "nulls": "first"}, {"key": "id", "order": "desc"}], null_safe=True)
+    result = sorted(contacts, key=key, reverse=reverse)
+    expected = sorted(contacts, key=lambda c: -c["id"])
+    expected = sorted(expected, key=lambda c: (c["first_name"] is not None, c["first_name"] or ""))
+    assert result == expected
@@ -0,0 +1,108 @@
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from date_parser import FALLBACK_FORMATS, _count_chunk, WEEKDAYS, chunk_bounds, count_weekdays_in_file, weekday_histogram, normalize_weekday
+
+
+def reference_histogram(lines):
+    histogram, rejected = [0] * 7, 0
+    for line in lines:
+        if not line.strip():
+            continue
+        for fmt in FALLBACK_FORMATS:
+            try:
+                histogram[datetime.strptime(line.strip(), fmt).weekday()] += 1
+                break
+            except ValueError:
+                continue
+        else:
+            rejected += 1
+    return histogram, rejected
+
+
+def make_lines(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(1990, 1, 1)
+    lines = [(start + timedelta(seconds=rng.randrange(40 * 365 * 86400))).strftime(rng.choice(FALLBACK_FORMATS))
+             for _ in range(count)]
+    # Invalid dates and odd shapes that must be rejected or go through strptime
+    lines += ["2023-02-30", "31-Foo-2020", "2024/13/01 10:00:00", "2024/01/01 24:00:00", "", "  ",
+              "2024-1-5", "not a date", "Feb 29, 2024", "Feb 29, 2023", "2024-02-29"]
+    rng.shuffle(lines)
+    return lines
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_histogram_matches_strptime(newline):
+    lines = make_lines(5000)
+    expected, rejected = reference_histogram(lines)
+    result = weekday_histogram(newline.join(lines).encode(), block_size=4096)
+    assert result["histogram"].tolist() == expected
+    assert result["rejected"] == rejected
+    assert result["parsed"] == sum(expected)
+
+
+def test_blocks_do_not_change_the_result():
+    data = "\n".join(make_lines(2000, seed=1)).encode()
+    whole = weekday_histogram(data, block_size=len(data) + 1)
+    for block_size in (1, 17, 1000):
+        result = weekday_histogram(data, block_size=block_size)
+        assert result["histogram"].tolist() == whole["histogram"].tolist()
+        assert (result["parsed"], result["rejected"]) == (whole["parsed"], whole["rejected"])
+
+
+def test_memory_is_bounded_by_the_block_size():
+    data = ("\n".join(make_lines(400_000, seed=2)) + "\n").encode()  # About 5 MB
+    tracemalloc.start()
+    try:
+        weekday_histogram(data, block_size=256 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < len(data)
+
+
+def test_chunk_bounds_end_on_newlines_for_bytes_and_arrays():
+    data = b"aaa\nbb\n\ncccc\nd"
+    for buffer in (data, np.frombuffer(data, dtype=np.uint8)):
+        bounds = chunk_bounds(buffer, 3)
+        assert bounds == [(0, 4), (4, 8), (8, 13), (13, 14)]
+
+
+def test_count_weekdays_in_file_parallel_matches_serial(tmp_path):
+    path = tmp_path / "dates.txt"
+    lines = make_lines(3000, seed=3)
+    path.write_text("\n".join(lines))
+    expected, _ = reference_histogram(lines)
+    serial = count_weekdays_in_file(str(path), parallel=False)
+    parallel = count_weekdays_in_file(str(path), parallel=True, workers=2, chunk_size=8192)
+    assert serial["chunks"] == 1 and parallel["chunks"] > 4  # The process pool really ran
+    for result in (serial, parallel):
+        assert [result["counts"][day] for day in WEEKDAYS] == expected
+        assert result["parsed"] == sum(expected)
+
+
+def test_dates_on_chunk_boundaries_are_counted_once(tmp_path):
+    path = tmp_path / "dates.txt"
+    lines = ["2024-01-01", "2024-01-02", "Jan 03, 2024", "2024/01/04 10:00:00", "2024-01-05"] * 3
+    path.write_text("\n".join(lines) + "\n")
+    expected, _ = reference_histogram(lines)
+    data = path.read_bytes()
+    for chunk_size in range(1, len(data) + 2):  # Every boundary: before, on and after each newline
+        results = [_count_chunk(str(path), start, end) for start, end in chunk_bounds(data, chunk_size)]
+        assert sum(result["histogram"] for result in results).tolist() == expected, chunk_size
+        assert sum(result["parsed"] for result in results) == len(lines)
+    for chunk_size in (10, 11, 12):  # The first line ends at byte 10, its newline at 11
+        result = count_weekdays_in_file(str(path), parallel=True, workers=2, chunk_size=chunk_size)
+        assert result["chunks"] > 1 and [result["counts"][day] for day in WEEKDAYS] == expected
+
+
+def test_normalize_weekday():
+    assert normalize_weekday("wednesdays") == "Wednesday"
+    assert normalize_weekday("all") == "all"
+    with pytest.raises(ValueError):
+        normalize_weekday("Funday")
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from dispatch import Dispatcher
+
+
+def schema(name, *params):
+    return {"type": "function", "function": {
+        "name": name,
+        "parameters": {"type": "object", "properties": {param: {"type": "string"} for param in params},
+                       "required": list(params)},
+    }}
+
+
+TOOLS = [schema("copy", "input_file", "output_file"), schema("format_file", "file_path"), schema("run_script", "email")]
+
+
+def make_dispatcher(events):
+    async def copy(input_file, output_file):
+        events.append(("start", f"copy {input_file}"))
+        await asyncio.sleep(0.02)
+        events.append(("end", f"copy {input_file}"))
+        return {"success": True}
+
+    def format_file(file_path):
+        events.append(("start", f"format {file_path}"))
+        events.append(("end", f"format {file_path}"))
+        return {"success": True, "thread": threading.current_thread().name}
+
+    async def run_script(email):
+        events.append(("start", "run"))
+        events.append(("end", "run"))
+        return {"success": True}
+
+    handlers = {"copy": (copy, {}), "format_file": (format_file, {}), "run_script": (run_script, {})}
+    return Dispatcher(TOOLS, handlers)
+
+
+def test_dispatch_many_orders_calls_that_share_files():
+    events = []
+    dispatcher = make_dispatcher(events)
+    calls = [
+        ("copy", {"input_file": "/data/a.txt", "output_file": "/data/b.txt"}),    # 0
+        ("copy", {"input_file": "/data/b.txt", "output_file": "/data/c.txt"}),    # 1 reads what 0 writes
+        ("copy", {"input_file": "/data/x.txt", "output_file": "/data/y.txt"}),    # 2 independent
+        ("format_file", {"file_path": "/data/b.txt"}),                            # 3 writes what 0 writes and 1 reads
+        ("copy", {"input_file": "/data/logs/*.log", "output_file": "/data/z.txt"}),  # 4 a glob reads data/logs
+        ("format_file", {"file_path": "/data/logs/app.log"}),                     # 5 inside 4's glob
+        ("run_script", {"email": "user@example.com"}),                            # 6 no paths: writes all of data
+    ]
+    try:
+        response = asyncio.run(dispatcher.dispatch_many(calls))
+    finally:
+        dispatcher.shutdown()
+
+    assert response["success"]
+    assert [result["depends_on"] for result in response["results"]] == [[], [0], [], [0, 1], [], [4], [0, 1, 2, 3, 4, 5]]
+    assert response["results"][3]["result"]["thread"].startswith("dispatch")  # Sync handlers leave the loop
+
+    position = {event: index for index, event in enumerate(events)}
+    name = ["copy data/a.txt", "copy data/b.txt", "copy data/x.txt", "format data/b.txt",
+            "copy data/logs/*.log", "format data/logs/app.log", "run"]
+    for later, result in enumerate(response["results"]):
+        for earlier in result["depends_on"]:
+            assert position[("end", name[earlier])] < position[("start", name[later])]
+    # Independent copies overlap instead of running one after another
+    assert position[("start", name[2])] < position[("end", name[0])]
+    assert position[("start", name[4])] < position[("end", name[0])]
+
+
+def test_dispatch_many_reports_invalid_calls_without_running_them():
+    events = []
+    dispatcher = make_dispatcher(events)
+    calls = [
+        ("copy", {"input_file": "/etc/passwd", "output_file": "/data/out.txt"}),
+        ("copy", {"input_file": "/data/a.txt"}),
+        ("unknown", {}),
+        ("format_file", {"file_path": "/data/a.txt"}),
+    ]
+    try:
+        response = asyncio.run(dispatcher.dispatch_many(calls))
+    finally:
+        dispatcher.shutdown()
+
+    results = [result["result"] for result in response["results"]]
+    assert not response["success"]
+    assert "within the /data directory" in results[0]["message"]
+    assert "output_file" in results[1]["message"]
+    assert results[2] == {"success": False, "message": "Could not determine the appropriate function"}
+    assert results[3]["success"] and response["results"][3]["depends_on"] == []
+    assert events == [("start", "format data/a.txt"), ("end", "format data/a.txt")]
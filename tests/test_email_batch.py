@@ -0,0 +1,110 @@
+import asyncio
+import csv
+import json
+import mailbox
+
+import httpx
+import pytest
+
+import email_batch
+from email_batch import extract_archive
+from functions import extract_email_batch
+
+MESSAGES = [
+    b'From: "Doe, Jane" <jane@example.com>\nTo: bob@example.org\nDate: Tue, 01 Oct 2024 10:00:00 +0000\n'
+    b"Subject: =?utf-8?q?Caf=C3=A9?=\n\nHello\n",
+    b"From: =?utf-8?q?Ren=C3=A9e?= <renee@example.net>\nTo: a@example.com, \"B, C\" <bc@example.com>\n"
+    b"Cc: cc@example.com\nSubject: plain\n\nBody\n",
+    b"From: the sales team\nTo: bob@example.org\nSubject: no address\n\nBody\n",  # Needs the LLM
+]
+
+
+def make_mbox(path):
+    archive = mailbox.mbox(str(path))
+    for message in MESSAGES:
+        archive.add(message)
+    archive.close()
+    return str(path)
+
+
+def make_maildir(path):
+    archive = mailbox.Maildir(str(path))
+    for message in MESSAGES:
+        archive.add(message)
+    archive.close()
+    return str(path)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    prompts = []
+
+    def handler(request):
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        prompts.append(prompt)
+        answers = [{"index": 0, "from": "sales@example.com", "to": ["ignored@example.com"], "cc": []}]
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps({"messages": answers})}}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(email_batch, "get_client", lambda: client)
+    return prompts
+
+
+def rows_by_subject(rows):
+    return {row["subject"]: row for row in rows}
+
+
+@pytest.mark.parametrize("make_archive", [make_mbox, make_maildir])
+def test_jsonl_rows_with_llm_fallback(tmp_path, llm, make_archive):
+    archive = make_archive(tmp_path / "archive")
+    output = tmp_path / "out.jsonl"
+    stats = asyncio.run(extract_archive(archive, str(output)))
+
+    assert {key: stats[key] for key in ("messages", "local", "llm", "failed", "llm_requests")} == \
+        {"messages": 3, "local": 2, "llm": 1, "failed": 0, "llm_requests": 1}
+    assert len(llm) == 1 and "the sales team" in llm[0] and "Hello" not in llm[0]  # Headers only
+    rows = rows_by_subject(json.loads(line) for line in output.read_text().splitlines())
+    assert rows["Café"]["from"] == ["jane@example.com"] and rows["Café"]["to"] == ["bob@example.org"]
+    assert rows["plain"]["to"] == ["a@example.com", "bc@example.com"] and rows["plain"]["cc"] == ["cc@example.com"]
+    assert rows["no address"] == {**rows["no address"], "method": "llm", "from": ["sales@example.com"],
+                                  "to": ["bob@example.org"]}  # Locally parsed recipients are kept
+
+
+def test_csv_output_joins_lists(tmp_path, llm):
+    output = tmp_path / "out.csv"
+    asyncio.run(extract_archive(make_mbox(tmp_path / "archive.mbox"), str(output)))
+    with open(output, newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == email_batch.ROW_COLUMNS
+    rows = rows_by_subject(rows)
+    assert rows["plain"]["to"] == "a@example.com; bc@example.com"
+    assert rows["plain"]["from"] == "renee@example.net" and rows["plain"]["method"] == "local"
+    assert rows["no address"]["method"] == "llm"
+
+
+def test_failed_llm_answers_are_marked(tmp_path, monkeypatch):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    monkeypatch.setattr(email_batch, "get_client", lambda: client)
+    output = tmp_path / "out.jsonl"
+    stats = asyncio.run(extract_archive(make_mbox(tmp_path / "archive.mbox"), str(output)))
+    assert (stats["llm"], stats["failed"]) == (0, 1)
+    assert rows_by_subject(map(json.loads, output.read_text().splitlines()))["no address"]["method"] == "failed"
+
+
+def test_parallel_matches_serial(tmp_path, llm):
+    archive = make_mbox(tmp_path / "archive.mbox")
+    serial, parallel = tmp_path / "serial.jsonl", tmp_path / "parallel.jsonl"
+    asyncio.run(extract_archive(archive, str(serial), parallel=False))
+    asyncio.run(extract_archive(archive, str(parallel), parallel=True, workers=2))
+    assert sorted(parallel.read_text().splitlines()) == sorted(serial.read_text().splitlines())
+
+
+def test_missing_archive_is_not_found_and_writes_nothing(tmp_path):
+    output = tmp_path / "out.csv"
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(extract_archive(str(tmp_path / "missing.mbox"), str(output)))
+    assert not output.exists()
+
+    result = asyncio.run(extract_email_batch(str(tmp_path / "missing.mbox"), str(output)))
+    assert result == {"success": False, "message": f"Mail archive not found at {tmp_path / 'missing.mbox'}"}
+    assert not output.exists()
@@ -0,0 +1,42 @@
+import pytest
+
+from email_extract import extract_field, header_for, parse_addresses
+
+MESSAGE = (
+    b'From: "Doe, Jane" <jane.doe@example.com>\r\n'
+    b"To: bob@example.org, =?utf-8?q?Ren=C3=A9e?= <renee@example.net>\r\n"
+    b'Cc: "Smith, J. (ops)" <ops@example.com>, (team) team@example.com\r\n'
+    b"Date: Tue, 01 Oct 2024 10:00:00 +0000\r\n"
+    b"Subject: =?utf-8?b?Q2Fmw6kgbWVldGluZw==?=\r\n"
+    b"  tomorrow\r\n"
+    b"\r\n"
+    b"Body with From: someone@else.com\r\n"
+)
+
+
+@pytest.mark.parametrize("field, expected", [
+    ("from", ["jane.doe@example.com"]),
+    ("Sender:", ["jane.doe@example.com"]),
+    ("recipients", ["bob@example.org", "renee@example.net"]),
+    ("cc", ["ops@example.com", "team@example.com"]),
+    ("date", ["Tue, 01 Oct 2024 10:00:00 +0000"]),
+    ("subject", ["Café meeting tomorrow"]),
+])
+def test_extract_field(field, expected):
+    assert extract_field(MESSAGE, field) == expected
+
+
+def test_unanswerable_fields_escalate():
+    assert header_for("body") is None
+    assert extract_field(MESSAGE, "body") is None
+    assert extract_field(b"Subject: hi\r\n\r\n", "from") is None  # No From header
+    assert extract_field(b"From: undisclosed-recipients\r\n\r\n", "from") is None  # No address in it
+
+
+def test_from_keeps_only_the_first_address():
+    assert extract_field(b"From: a@example.com, b@example.com\r\n\r\n", "from") == ["a@example.com"]
+
+
+def test_parse_addresses_matches_getaddresses_on_plain_lists():
+    assert parse_addresses(['Name <a@b.co>, "Last, First" <c@d.co>, e@f.co']) == ["a@b.co", "c@d.co", "e@f.co"]
+    assert parse_addresses(["Group: a@b.co, c@d.co;"]) == ["a@b.co", "c@d.co"]  # Falls back to getaddresses
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+
+class CountingBackend:
+    name = "fake"
+    model = "fake-model"
+    cacheable = True
+
+    def __init__(self):
+        self.requests = []
+
+    async def embed(self, texts):
+        self.requests.append(list(texts))
+        return np.array([[len(text), text.count("a"), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_only_new_texts_are_embedded(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite"))
+    backend = CountingBackend()
+    first, stats = asyncio.run(store.embed(["a", "bb", "a"], backend))
+    assert stats == {"embeddings_reused": 0, "embeddings_fetched": 2, "embedding_backend": "fake"}
+    assert backend.requests == [["a", "bb"]]
+
+    second, stats = asyncio.run(store.embed(["bb", "a", "ccc"], backend))
+    assert stats == {"embeddings_reused": 2, "embeddings_fetched": 1, "embedding_backend": "fake"}
+    assert backend.requests[-1] == ["ccc"]
+    assert second.dtype == np.float32
+    np.testing.assert_array_equal(second[:2], first[[1, 0]])
+    store.close()
+
+
+def test_sqlite_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite"))
+    loop_thread = threading.get_ident()
+    threads = []
+    for name in ("get_many", "put_many"):
+        method = getattr(store, name)
+
+        def record(*args, _method=method):
+            threads.append(threading.get_ident())
+            return _method(*args)
+        monkeypatch.setattr(store, name, record)
+
+    asyncio.run(store.embed(["x", "y"], CountingBackend()))
+    assert len(threads) == 2 and loop_thread not in threads
+    store.close()
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import httpx
+
+import query_gpt
+from gpt_cache import ResponseCache
+
+TOOLS = [{"type": "function", "function": {"name": "noop", "parameters": {"type": "object", "properties": {}}}}]
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = ResponseCache(path)
+    key = first.make_key("Task  one", TOOLS, "model")
+    first.put(key, {"answer": 1})
+    first.close()
+
+    second = ResponseCache(path)
+    assert second.make_key("Task one", TOOLS, "model") == key  # Whitespace is normalized
+    assert second.get_memory(key) is None
+    assert second.get_disk(key) == {"answer": 1}
+    assert second.get_memory(key) == {"answer": 1}
+    assert second.stats["disk_hits"] == 1 and second.stats["memory_hits"] == 1
+    second.close()
+
+
+def test_changed_tools_schema_clears_the_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    key = cache.make_key("task", TOOLS, "model")
+    cache.put(key, {"answer": 1})
+    cache.make_key("task", TOOLS + TOOLS, "model")
+    assert cache.get(key) is None
+    cache.close()
+
+
+def test_query_gpt_keeps_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    loop_thread = threading.get_ident()
+    blocking_calls = []
+    for name in ("make_key", "get_disk", "put"):
+        method = getattr(cache, name)
+
+        def record(*args, _method=method, _name=name):
+            blocking_calls.append((_name, threading.get_ident() != loop_thread))
+            return _method(*args)
+        monkeypatch.setattr(cache, name, record)
+    monkeypatch.setattr(query_gpt, "response_cache", cache)
+
+    message = {"role": "assistant", "tool_calls": [{"id": "1", "type": "function", "function": {"name": "noop", "arguments": "{}"}}]}
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"choices": [{"message": message}]}))
+
+    async def run():
+        monkeypatch.setattr(query_gpt, "_client", httpx.AsyncClient(transport=transport))
+        first = await query_gpt.query_gpt("task", TOOLS)
+        second = await query_gpt.query_gpt("task", TOOLS)
+        await query_gpt.close_client()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == message and second == {**message, "cached": True}
+    assert {name for name, _ in blocking_calls} == {"make_key", "get_disk", "put"}
+    assert all(off_loop for _, off_loop in blocking_calls)
+    cache.close()
@@ -0,0 +1,76 @@
+import os
+
+from heading_index import HeadingIndex, parse_headings, fts_query
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def test_parse_headings_atx_setext_and_fences(tmp_path):
+    path = write(tmp_path / "a.md", "\n".join([
+        "# Title #",
+        "Intro",
+        "Section",
+        "-------",
+        "```",
+        "# not a heading",
+        "```",
+        "   ### Deep ###   ",
+        "#hashtag",
+        "- item",
+        "",
+        "Two line",
+        "setext",
+        "======",
+    ]) + "\n")
+    assert parse_headings(path) == [(1, "Title", 1), (2, "Intro Section", 2), (3, "Deep", 8), (1, "Two line setext", 12)]
+
+
+def test_fts_query_quotes_every_word():
+    assert fts_query('large "models" OR x*') == '"large" "models" "OR" "x"'
+
+
+def test_refresh_updates_changed_files_in_place(tmp_path):
+    root = tmp_path / "docs"
+    write(root / "a.md", "# Alpha\n")
+    write(root / "sub" / "b.md", "# Beta\n## Beta details\n")
+    index = HeadingIndex(str(tmp_path / "headings.sqlite"))
+    try:
+        assert index.refresh(str(root))["parsed"] == 2
+        assert [r["heading"] for r in index.search(str(root), "beta", match="prefix")] == ["Beta", "Beta details"]
+
+        write(root / "a.md", "# Alpha renamed\n")
+        os.utime(root / "a.md", ns=(1, 1))  # Change the mtime even on coarse-grained filesystems
+        os.remove(root / "sub" / "b.md")
+        stats = index.refresh(str(root))
+        assert (stats["files"], stats["parsed"], stats["removed"]) == (1, 1, 1)
+        assert index.search(str(root), "alpha renamed", match="exact") == [
+            {"file": "a.md", "level": 1, "heading": "Alpha renamed", "line": 1}]
+        assert index.search(str(root), "beta") == []
+        assert index.refresh(str(root))["parsed"] == 0
+    finally:
+        index.close()
+
+
+def test_front_matter_and_thematic_breaks_are_not_headings(tmp_path):
+    path = write(tmp_path / "a.md", "\n".join([
+        "---",
+        "title: x",
+        "---",
+        "# Real",
+        "",
+        "---",
+        "Text",
+        "***",
+        "More text",
+        "- - -",
+        "Under",
+        "---",
+    ]) + "\n")
+    assert parse_headings(path) == [(1, "Real", 4), (2, "Under", 11)]
+
+    unclosed = write(tmp_path / "b.md", "---\nIntro\n===\n")
+    assert parse_headings(unclosed) == [(1, "Intro", 2)]
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from line_extract import extract_lines, grep, head, tail
+
+LINES = [b"alpha", b"", b"Beta line", b"gamma\r", b"x" * 50, b"delta beta", b"epsilon"]
+
+
+@pytest.fixture
+def sample(tmp_path):
+    def write(lines, final_newline=True):
+        path = tmp_path / "sample.txt"
+        path.write_bytes(b"\n".join(lines) + (b"\n" if final_newline else b""))
+        return str(path)
+    return write
+
+
+def expected_lines(lines, max_line):
+    return [(line[:-1] if line.endswith(b"\r") else line)[:max_line] for line in lines]
+
+
+@pytest.mark.parametrize("final_newline", [True, False])
+@pytest.mark.parametrize("max_line", [3, 8, 1000])
+def test_head_and_tail_match_splitlines(sample, final_newline, max_line):
+    path = sample(LINES, final_newline)
+    lines = expected_lines(LINES, max_line)
+    for count in range(len(LINES) + 2):
+        assert head(path, count, max_line=max_line) == lines[:count]
+        if max_line >= 50:  # Tail reads at most count * max_line bytes, which overlong lines use up
+            assert tail(path, count, block_size=4, max_line=max_line) == (lines[-count:] if count else [])
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 7, 16, 1024])
+@pytest.mark.parametrize("max_line", [4, 12, 1000])
+def test_grep_truncates_every_line_wherever_it_falls(sample, block_size, max_line):
+    path = sample(LINES)
+    regex = re.compile(rb"a", re.IGNORECASE)
+    expected = [line for line in expected_lines(LINES, max_line) if regex.search(line)]
+    assert grep(path, "a", ignore_case=True, block_size=block_size, max_line=max_line) == expected
+
+
+def test_grep_count_and_anchors(sample):
+    path = sample(LINES)
+    assert grep(path, "^[a-z]+\r?$", block_size=5) == [b"alpha", b"gamma", b"x" * 50, b"epsilon"]
+    assert grep(path, "a", count=2) == [b"alpha", b"Beta line"]
+
+
+def test_extract_lines_modes(sample):
+    path = sample(LINES)
+    assert extract_lines(path, "head", 1) == [b"alpha"]
+    assert extract_lines(path, "tail", 1) == [b"epsilon"]
+    with pytest.raises(ValueError):
+        extract_lines(path, "grep")
+    with pytest.raises(ValueError):
+        extract_lines(path, "middle")
@@ -0,0 +1,163 @@
+import logging
+import os
+import time
+
+import pytest
+
+import log_index
+from functions import write_recent_logs
+from log_index import LogIndex
+
+
+def write_log(directory, name, first_line, mtime):
+    path = directory / name
+    path.write_text(f"{first_line}\nmore\n")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    directory = tmp_path / "logs"
+    directory.mkdir()
+    for number in range(3):
+        write_log(directory, f"{number}.log", f"line {number}", 1_000_000 + number)
+    (directory / "notes.txt").write_text("ignored\n")
+    return directory
+
+
+@pytest.fixture
+def polling(monkeypatch):
+    def unavailable():
+        raise OSError("inotify disabled for the test")
+    monkeypatch.setattr(log_index, "_Inotify", unavailable)
+    monkeypatch.setattr(log_index, "LOG_INDEX_POLL_INTERVAL", 3600.0)
+
+
+def start(directory, tmp_path):
+    index = LogIndex(str(directory), snapshot_path=str(tmp_path / "snapshot.json"))
+    index.start()
+    return index
+
+
+def test_recent_orders_by_mtime(log_dir, tmp_path):
+    index = start(log_dir, tmp_path)
+    try:
+        assert [line for _, line in index.recent(2)] == ["line 2", "line 1"]
+        assert [line for _, line in index.recent(10)] == ["line 2", "line 1", "line 0"]
+        assert index.recent(0) == []
+        write_log(log_dir, "3.log", "line 3", 1_000_010)
+        assert [line for _, line in index.recent(1)] == ["line 3"]  # Read-your-writes in either mode
+    finally:
+        index.stop()
+
+
+def settle(directory):
+    # An old directory mtime: the index can trust it not to move within one timestamp tick
+    os.utime(directory, (1_000_000, 1_000_000))
+
+
+def test_polling_rescans_when_the_directory_changes(log_dir, tmp_path, polling, monkeypatch):
+    settle(log_dir)
+    index = start(log_dir, tmp_path)
+    try:
+        assert index.mode == "polling"
+        assert [line for _, line in index.recent(10)] == ["line 2", "line 1", "line 0"]
+        write_log(log_dir, "3.log", "line 3", 1_000_010)
+        os.remove(log_dir / "0.log")
+        assert [line for _, line in index.recent(10)] == ["line 3", "line 2", "line 1"]  # New directory mtime
+
+        settle(log_dir)
+        index.recent(10)
+        scans = []
+        monkeypatch.setattr(index, "rescan", lambda: scans.append(1))
+        index.recent(10)
+        assert scans == []  # Unchanged directory within the interval: served from the index
+
+        write_log(log_dir, "1.log", "line 1", 1_000_020)  # Rewritten in place: the directory mtime stays
+        settle(log_dir)
+        index.recent(10, refresh=True)
+        monkeypatch.setattr(log_index, "LOG_INDEX_POLL_INTERVAL", 0.0)
+        index.recent(10)
+        assert scans == [1, 1]
+    finally:
+        index.stop()
+
+
+def test_polling_picks_up_in_place_changes_after_the_interval(log_dir, tmp_path, polling, monkeypatch):
+    settle(log_dir)
+    index = start(log_dir, tmp_path)
+    try:
+        index.recent(10)
+        write_log(log_dir, "0.log", "line 0 again", 1_000_020)
+        settle(log_dir)
+        assert index.recent(1)[0][1] == "line 2"  # Within the interval
+        monkeypatch.setattr(log_index, "LOG_INDEX_POLL_INTERVAL", 0.0)
+        assert index.recent(1)[0][1] == "line 0 again"
+    finally:
+        index.stop()
+
+
+def test_rescan_sorts_once_and_keeps_cached_lines(log_dir, tmp_path, polling, monkeypatch):
+    index = start(log_dir, tmp_path)
+    try:
+        index.recent(10)
+        monkeypatch.setattr(log_index.bisect, "insort", None)  # A rescan must not insert file by file
+        for number in range(3, 50):
+            write_log(log_dir, f"{number}.log", f"line {number}", 1_000_000 - number)
+        index.rescan()
+        assert index.order == sorted((entry[0], path) for path, entry in index.files.items())
+        assert len(index.order) == 50 and index.files[str(log_dir / "2.log")][2] == "line 2"
+    finally:
+        index.stop()
+
+
+def test_inotify_watcher_falls_back_to_polling_when_the_directory_goes(tmp_path):
+    directory = tmp_path / "logs"
+    directory.mkdir()
+    write_log(directory, "a.log", "a", 1_000_000)
+    index = start(directory, tmp_path)
+    try:
+        if index.mode != "inotify":
+            pytest.skip("inotify is unavailable here")
+        (directory / "a.log").unlink()
+        directory.rmdir()
+        for _ in range(50):
+            if index.mode == "polling":
+                break
+            time.sleep(0.05)
+        assert index.mode == "polling" and index._thread.is_alive()
+    finally:
+        index.stop()
+
+
+def test_first_lines_are_reread_when_a_file_changes(log_dir, tmp_path, polling):
+    index = start(log_dir, tmp_path)
+    try:
+        assert index.recent(1)[0][1] == "line 2"
+        write_log(log_dir, "2.log", "rewritten", 1_000_030)
+        assert index.recent(1, refresh=True)[0][1] == "rewritten"
+    finally:
+        index.stop()
+
+
+def test_snapshot_restores_cached_first_lines(log_dir, tmp_path, polling):
+    index = start(log_dir, tmp_path)
+    index.recent(10)
+    index.stop()
+
+    restarted = LogIndex(str(log_dir), snapshot_path=str(tmp_path / "snapshot.json"))
+    restarted._load_snapshot()
+    assert sorted(entry[2] for entry in restarted.files.values()) == ["line 0", "line 1", "line 2"]
+
+
+def test_missing_directory_is_reported(tmp_path, caplog):
+    index = LogIndex(str(tmp_path / "absent"), snapshot_path=str(tmp_path / "snapshot.json"))
+    with caplog.at_level(logging.INFO):
+        with pytest.raises(FileNotFoundError, match="absent"):
+            index.start()
+    assert "inotify unavailable" not in caplog.text
+    assert index.mode is None
+
+    result = write_recent_logs(str(tmp_path / "absent"), str(tmp_path / "out.txt"), 3)
+    assert result["success"] is False and "absent" in result["message"]
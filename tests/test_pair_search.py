@@ -0,0 +1,42 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from pair_search import normalize, top_pairs
+
+# Unit vectors whose dot products are exact in float32 (0, ±0.5, 1), so many pairs tie
+TIED_VECTORS = np.array([
+    [1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1],
+    [0.5, 0.5, 0.5, 0.5], [0.5, 0.5, 0.5, -0.5], [0, 0, 0, 0],
+], dtype=np.float32)
+
+
+def brute_force(vectors, k):
+    unit = normalize(vectors)
+    scores = unit @ unit.T
+    pairs = [(i, j, float(scores[i, j])) for i, j in itertools.combinations(range(len(unit)), 2)]
+    return sorted(pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))[:k]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 5, 64])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_ties_go_to_the_lowest_pair(block_size, workers):
+    vectors = TIED_VECTORS[np.random.default_rng(0).integers(0, len(TIED_VECTORS), 40)]
+    for k in (1, 2, 5, 17, 100, 780, 1000):
+        assert top_pairs(vectors, k, block_size=block_size, workers=workers) == brute_force(vectors, k)
+
+
+@pytest.mark.parametrize("block_size", [4, 7, 256])
+def test_matches_brute_force_on_random_vectors(block_size):
+    vectors = np.random.default_rng(1).normal(size=(90, 12))
+    expected = brute_force(vectors, 25)
+    result = top_pairs(vectors, 25, block_size=block_size, workers=2)
+    assert [(i, j) for i, j, _ in result] == [(i, j) for i, j, _ in expected]
+    assert np.allclose([score for _, _, score in result], [score for _, _, score in expected], atol=1e-6)
+
+
+def test_degenerate_inputs():
+    assert top_pairs(np.ones((1, 3)), 5) == []
+    assert top_pairs(np.ones((4, 3)), 0) == []
+    assert top_pairs(np.zeros((3, 2)), 2) == [(0, 1, 0.0), (0, 2, 0.0)]
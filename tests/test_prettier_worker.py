@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from prettier_worker import FormatManifest, content_hash, format_with_manifest
+
+WORKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prettier_worker.js")
+
+# A slow stand-in for prettier, found the way npx exposes the real one (node_modules/.bin on PATH)
+STUB_PRETTIER = """
+module.exports = {
+  version: "stub",
+  resolveConfig: async () => ({}),
+  format: (source) => new Promise((resolve) => setTimeout(() => resolve(source.toUpperCase()), 200)),
+};
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_requests_sent_before_stdin_closes_are_answered(tmp_path):
+    (tmp_path / "node_modules" / ".bin").mkdir(parents=True)
+    (tmp_path / "node_modules" / "prettier").mkdir()
+    (tmp_path / "node_modules" / "prettier" / "index.js").write_text(STUB_PRETTIER)
+    files = [tmp_path / f"{name}.md" for name in "ab"]
+    for file in files:
+        file.write_text("hello\n")
+
+    requests = "".join(json.dumps({"id": i, "files": [str(file)]}) + "\n" for i, file in enumerate(files))
+    env = {**os.environ, "PATH": f"{tmp_path / 'node_modules' / '.bin'}{os.pathsep}{os.environ.get('PATH', '')}"}
+    result = subprocess.run(["node", WORKER], input=requests, capture_output=True, text=True, env=env, timeout=30)
+
+    assert result.returncode == 0
+    responses = [json.loads(line) for line in result.stdout.splitlines()]
+    assert responses[0] == {"ready": True, "version": "stub"}
+    assert sorted(response["id"] for response in responses[1:]) == [0, 1]
+    assert all(file.read_text() == "HELLO\n" for file in files)
+
+
+class FakeWorker:
+    """Stands in for PrettierWorker: "formats" by upper-casing, and records which files it was sent."""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def format_files(self, files):
+        self.calls.append(list(files))
+        results = []
+        for file in files:
+            if file in self.fail:
+                results.append({"file": file, "ok": False, "error": "syntax error"})
+                continue
+            with open(file) as handle:
+                source = handle.read()
+            with open(file, "w") as handle:
+                handle.write(source.upper())
+            results.append({"file": file, "ok": True, "changed": source != source.upper()})
+        return results
+
+
+def test_manifest_skips_files_already_formatted(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    files = [str(tmp_path / name) for name in ("a.md", "b.md")]
+    for file in files:
+        with open(file, "w") as handle:
+            handle.write(f"text of {os.path.basename(file)}\n")
+    worker = FakeWorker()
+
+    first = format_with_manifest(files, worker, FormatManifest(manifest_path, "prettier@1"))
+    assert worker.calls == [files] and not any(result.get("skipped") for result in first)
+
+    # A new manifest object reads the persisted hashes: nothing left to format
+    second = format_with_manifest(files, worker, FormatManifest(manifest_path, "prettier@1"))
+    assert worker.calls == [files] and all(result["skipped"] for result in second)
+
+    with open(files[1], "w") as handle:
+        handle.write("changed\n")
+    format_with_manifest(files, worker, FormatManifest(manifest_path, "prettier@1"))
+    assert worker.calls[-1] == [files[1]]
+
+    # Another Prettier version may format differently, so every file is formatted again
+    format_with_manifest(files, worker, FormatManifest(manifest_path, "prettier@2"))
+    assert worker.calls[-1] == files
+
+
+def test_failed_files_are_not_recorded(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    file = str(tmp_path / "a.md")
+    with open(file, "w") as handle:
+        handle.write("text\n")
+    worker = FakeWorker(fail={file})
+    assert not format_with_manifest([file], worker, FormatManifest(manifest_path))[0]["ok"]
+    format_with_manifest([file], worker, FormatManifest(manifest_path))
+    assert worker.calls == [[file], [file]]
+
+
+def test_content_hash_depends_on_the_extension(tmp_path):
+    for name in ("a.md", "b.md", "c.json"):
+        (tmp_path / name).write_text("same\n")
+    assert content_hash(str(tmp_path / "a.md")) == content_hash(str(tmp_path / "b.md"))
+    assert content_hash(str(tmp_path / "a.md")) != content_hash(str(tmp_path / "c.json"))
@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import json
+
+import httpx
+import pytest
+
+import query_gpt
+from query_gpt import embedding_batches, estimate_tokens, query_embeddings
+
+TEXTS = [f"text {i} " + "word " * (i % 7) for i in range(50)]
+
+
+def test_batches_cover_texts_within_limits():
+    for max_tokens in (1, 5, 12, 40, 10_000):
+        for max_inputs in (1, 3, 2048):
+            batches = embedding_batches(TEXTS, max_tokens, max_inputs)
+            assert [start for start, _ in batches] == [0] + [stop for _, stop in batches[:-1]]
+            assert batches[-1][1] == len(TEXTS)
+            for start, stop in batches:
+                assert stop - start <= max_inputs
+                # A single text over the budget still gets a batch of its own
+                assert stop - start == 1 or sum(map(estimate_tokens, TEXTS[start:stop])) <= max_tokens
+    assert embedding_batches([]) == []
+
+
+def run_with_transport(monkeypatch, handler, texts, **settings):
+    for name, value in settings.items():
+        monkeypatch.setattr(query_gpt, name, value)
+    delays = []
+
+    async def no_sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(query_gpt.asyncio, "sleep", no_sleep)
+
+    async def run():
+        monkeypatch.setattr(query_gpt, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        try:
+            return await query_embeddings(texts)
+        finally:
+            await query_gpt.close_client()
+    return asyncio.run(run()), delays
+
+
+def embed(texts):
+    # Returned out of order: the client has to sort by index
+    data = [{"index": i, "embedding": [float(len(text)), float(i)]} for i, text in enumerate(texts)]
+    return httpx.Response(200, json={"data": data[::-1]})
+
+
+def test_batches_are_sent_concurrently_and_reassembled_in_order(monkeypatch):
+    in_flight, peak, sizes = 0, 0, []
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        texts = json.loads(request.content)["input"]
+        sizes.append(len(texts))
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.get_running_loop().run_in_executor(None, lambda: None)  # Yield so batches overlap
+        in_flight -= 1
+        return embed(texts)
+
+    monkeypatch.setattr(query_gpt, "embedding_batches", functools.partial(embedding_batches, max_tokens=20))
+    result, _ = run_with_transport(monkeypatch, handler, TEXTS, EMBEDDINGS_CONCURRENCY=3)
+    assert result == [[float(len(text)), float(i - start)]
+                      for start, stop in embedding_batches(TEXTS, 20) for i, text in enumerate(TEXTS[start:stop], start)]
+    assert sum(sizes) == len(TEXTS) and len(sizes) == len(embedding_batches(TEXTS, 20))
+    assert 1 < peak <= 3
+
+
+def test_retries_rate_limits_server_errors_and_transport_errors(monkeypatch):
+    responses = iter([
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(503),
+        httpx.ConnectError("connection reset"),
+    ])
+
+    def handler(request):
+        response = next(responses, None)
+        if isinstance(response, Exception):
+            raise response
+        return response or embed(json.loads(request.content)["input"])
+
+    result, delays = run_with_transport(monkeypatch, handler, ["a", "bb"], EMBEDDINGS_RETRY_BASE=0.0)
+    assert result == [[1.0, 0.0], [2.0, 1.0]]
+    assert delays == [2.0, 0.0, 0.0]  # Retry-After is honoured; the backoff base is zeroed
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(500)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_transport(monkeypatch, handler, ["a"], EMBEDDINGS_MAX_RETRIES=2, EMBEDDINGS_RETRY_BASE=0.0)
+    assert len(attempts) == 3
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_transport(monkeypatch, handler, ["a"])
+    assert len(attempts) == 1
+
+
+def test_calls_keep_the_shared_connect_timeout(monkeypatch):
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(request.extensions["timeout"])
+        return embed(json.loads(request.content)["input"])
+
+    run_with_transport(monkeypatch, handler, ["a"])
+    assert timeouts == [{"connect": query_gpt.LLM_CONNECT_TIMEOUT, "read": query_gpt.EMBEDDINGS_TIMEOUT,
+                         "write": query_gpt.EMBEDDINGS_TIMEOUT, "pool": query_gpt.EMBEDDINGS_TIMEOUT}]
+
+
+def test_concurrency_limit_is_shared_by_concurrent_calls(monkeypatch):
+    in_flight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return embed(json.loads(request.content)["input"])
+
+    monkeypatch.setattr(query_gpt, "EMBEDDINGS_CONCURRENCY", 2)
+    monkeypatch.setattr(query_gpt, "embedding_batches", functools.partial(embedding_batches, max_inputs=1))
+
+    async def run():
+        monkeypatch.setattr(query_gpt, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        try:
+            return await asyncio.gather(*(query_embeddings([f"call {i}", "x", "y"]) for i in range(4)))
+        finally:
+            await query_gpt.close_client()
+
+    results = asyncio.run(run())
+    assert [result[0][0] for result in results] == [6.0] * 4
+    assert peak == 2  # Four requests' batches, two in flight at a time overall
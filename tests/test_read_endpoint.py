@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # /data/... resolves to ./data/... when /data does not exist, as in functions.normalize_path
+    (tmp_path / "data" / "docs").mkdir(parents=True)
+    (tmp_path / "data" / "notes.txt").write_bytes(b"0123456789\n")
+    (tmp_path / "data" / "card.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(100))
+    (tmp_path / "data" / "blob").write_bytes(b"\x00\x01binary")
+    (tmp_path / "data" / "README").write_bytes(b"plain text\n")
+    monkeypatch.chdir(tmp_path)
+
+
+def test_reads_a_file_with_validators():
+    response = client.get("/read", params={"path": "/data/notes.txt"})
+    assert response.status_code == 200
+    assert response.content == b"0123456789\n"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.headers["etag"] and response.headers["last-modified"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_range_request_returns_partial_content():
+    response = client.get("/read", params={"path": "/data/notes.txt"}, headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/11"
+
+
+@pytest.mark.parametrize("header, source", [("If-None-Match", "etag"), ("If-Modified-Since", "last-modified")])
+def test_conditional_request_returns_not_modified(header, source):
+    first = client.get("/read", params={"path": "/data/notes.txt"})
+    response = client.get("/read", params={"path": "/data/notes.txt"}, headers={header: first.headers[source]})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == first.headers["etag"]
+
+
+def test_stale_validator_returns_the_file():
+    response = client.get("/read", params={"path": "/data/notes.txt"}, headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("path, content_type", [
+    ("/data/card.png", "image/png"),
+    ("/data/blob", "application/octet-stream"),
+    ("/data/README", "text/plain"),
+])
+def test_content_type(path, content_type):
+    response = client.get("/read", params={"path": path})
+    assert response.status_code == 200
+    assert response.headers["content-type"].split(";")[0] == content_type
+
+
+@pytest.mark.parametrize("path, status", [("/data/docs", 404), ("/data/missing.txt", 404), ("/etc/passwd", 400)])
+def test_errors(path, status):
+    assert client.get("/read", params={"path": path}).status_code == status
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from router import router
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # Input paths are only routed locally when they exist, resolved like functions.normalize_path
+    (tmp_path / "data" / "logs").mkdir(parents=True)
+    for name in ("dates.txt", "comments.txt", "contacts.json", "notes.txt", "out.txt", "contacts-sorted.json", "ticket-sales.db"):
+        (tmp_path / "data" / name).write_text("")
+    monkeypatch.chdir(tmp_path)
+
+
+def route(task):
+    message = router.route(task)
+    if message is None:
+        return None, None
+    call = message["tool_calls"][0]["function"]
+    return call["name"], json.loads(call["arguments"])
+
+
+@pytest.mark.parametrize("punctuation", "?!:.,;")
+def test_trailing_sentence_punctuation_is_not_part_of_the_path(punctuation):
+    name, arguments = route(f"How many Wednesdays are in /data/dates.txt{punctuation} Write the count to /data/dates-wednesdays.txt")
+    assert name == "count_weekdays"
+    assert arguments["file_path"] == "/data/dates.txt"
+    assert arguments["output_path"] == "/data/dates-wednesdays.txt"
+
+
+def test_missing_input_file_falls_back_to_the_llm():
+    assert route("How many Wednesdays are in /data/missing.txt? Write the count to /data/out.txt") == (None, None)
+
+
+def test_output_file_need_not_exist():
+    name, arguments = route("Sort the array of contacts in /data/contacts.json by last_name, then first_name, and write the result to /data/contacts-sorted.json")
+    assert name == "sort_contacts"
+    assert arguments["keys"] == ["last_name", "first_name"]
+
+
+def test_unrelated_numbers_are_not_bound_to_integer_parameters():
+    name, arguments = route("`/data/comments.txt` contains a list of comments, one per line. Using embeddings, find the most similar pair of comments and write them to `/data/comments-similar.txt`, one per line")
+    assert name == "similar_comments"
+    assert "top_k" not in arguments
+
+
+@pytest.mark.parametrize("task, name, param, value", [
+    ("Write the first line of the 10 most recent `.log` file in `/data/logs/` to `/data/logs-recent.txt`, most recent first",
+     "write_recent_logs", "num_files", 10),
+    ("Write the last 20 lines of /data/notes.txt to /data/notes-tail.txt", "extract_lines", "count", 20),
+    ("Write the first five lines of /data/notes.txt to /data/notes-head.txt", "extract_lines", "count", 5),
+    ("Using embeddings, find the top 3 most similar pairs of comments in /data/comments.txt and write them to /data/out.txt",
+     "similar_comments", "top_k", 3),
+    ("Find the 5 comments in /data/comments.txt most similar to 'slow delivery' and write them to /data/out.json",
+     "similar_to_comment", "k", 5),
+])
+def test_numbers_next_to_parameter_keywords_are_bound(task, name, param, value):
+    routed_name, arguments = route(task)
+    assert routed_name == name
+    assert arguments[param] == value
+
+
+@pytest.mark.parametrize("task, name, expected", [
+    ("Using /data/out.txt as output, count Wednesdays in /data/dates.txt",
+     "count_weekdays", {"file_path": "/data/dates.txt", "output_path": "/data/out.txt"}),
+    ("Into /data/contacts-sorted.json, write the contacts from /data/contacts.json sorted by last_name",
+     "sort_contacts", {"input_file": "/data/contacts.json", "output_file": "/data/contacts-sorted.json"}),
+    ("The SQLite database file /data/ticket-sales.db has a tickets table. What are the total sales of the Gold "
+     "ticket type? Write the number in /data/ticket-sales-gold.txt",
+     "calculate_gold_sales", {"input_file": "/data/ticket-sales.db", "output_file": "/data/ticket-sales-gold.txt"}),
+])
+def test_path_roles_come_from_the_surrounding_words(task, name, expected):
+    routed_name, arguments = route(task)
+    assert routed_name == name
+    assert {param: arguments[param] for param in expected} == expected
+
+
+@pytest.mark.parametrize("task", [
+    "Count Wednesdays in /data/dates.txt and write the count to /data/dates.txt",  # Output is an input
+    "Count the Wednesdays: /data/out.txt, /data/dates.txt",  # Neither role is stated
+    "Count Wednesdays in /data/dates.txt, write the count to /data/out.txt and to /data/notes.txt",
+    "Format /data/notes.txt with prettier and write it to /data/out.txt",  # format_file has no output
+])
+def test_undecidable_path_roles_fall_back_to_the_llm(task):
+    assert route(task) == (None, None)
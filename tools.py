@@ -19,11 +19,11 @@ tools = [
         "type": "function",
         "function": {
             "name": "format_file",
-            "description": "Format a markdown file using Prettier",
+            "description": "Format a markdown file using Prettier, in place. Also accepts a directory or a glob pattern to format many files at once.",
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "filepath": {"type": "string", "description": "Path to the markdown file to be formatted using Prettier."}
+                    "filepath": {"type": "string", "description": "Path to the markdown file to be formatted using Prettier, or a directory / glob pattern (e.g. /data/docs/**/*.md)."}
                 },
                 "required": ["filepath"]
             }
@@ -33,12 +33,12 @@ tools = [
         "type": "function",
         "function": {
             "name": "count_weekdays",
-            "description": "Count the number of specific weekdays in a file and write the count to an output file.",
+            "description": "Count the number of specific weekdays in a file and write the count to an output file. Use weekday 'all' to count every weekday at once (written as JSON).",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "file_path": {"type": "string", "description": "Path to the file containing dates."},
-                    "weekday": {"type": "string", "description": "The weekday to count (e.g., Monday, Tuesday, etc.)."},
+                    "weekday": {"type": "string", "description": "The weekday to count (e.g., Monday, Tuesday, etc.), or 'all' for every weekday."},
                     "output_path": {"type": "string", "description": "Path to the output file where the count will be written."}
                 },
                 "required": ["file_path", "weekday", "output_path"]
@@ -58,9 +58,21 @@ tools = [
                     "keys": {
                         "type": "array",
                         "items": {
-                            "type": "string"
+                            "anyOf": [
+                                {"type": "string", "description": "Key to sort by, ascending"},
+                                {
+                                    "type": "object",
+                                    "properties": {
+                                        "key": {"type": "string", "description": "Key to sort by"},
+                                        "order": {"type": "string", "enum": ["asc", "desc"], "description": "Sort direction (default asc)"},
+                                        "collation": {"type": "string", "enum": ["binary", "casefold", "locale"], "description": "How strings compare: exact, case-insensitive, or by locale (default binary)"},
+                                        "nulls": {"type": "string", "enum": ["first", "last"], "description": "Where missing or null values go (default last)"}
+                                    },
+                                    "required": ["key"]
+                                }
+                            ]
                         },
-                        "description": "List of keys to sort by in specified order"
+                        "description": "List of keys to sort by in specified order. Each is a key name, or an object with the key name and sort options."
                     }
                 },
                 "required": ["input_file", "output_file", "keys"]
@@ -77,9 +89,29 @@ tools = [
                 "properties": {
                     "log_dir": {"type": "string", "description": "Input directory containing all .log files."},
                     "num_files": {"type": "integer", "description": "Count of most recent .log files"},
-                    "output_file": {"type": "string", "description": "Output file where the result will be written."}
+                    "output_file": {"type": "string", "description": "Output file where the result will be written."},
+                    "recursive": {"type": "boolean", "description": "Also look for .log files in subdirectories (default false)."}
+                },
+                "required": ["log_dir", "num_files", "output_file"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "extract_lines",
+            "description": "Write selected lines of a (log) file to the specified output file: the first N lines (head), the last N lines (tail), or the lines matching a regex (grep)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input_file": {"type": "string", "description": "File to read lines from."},
+                    "output_file": {"type": "string", "description": "Output file where the selected lines will be written."},
+                    "mode": {"type": "string", "enum": ["head", "tail", "grep"], "description": "head for the first lines, tail for the last lines, grep for lines matching pattern."},
+                    "count": {"type": "integer", "description": "Number of lines for head and tail (default 10); maximum number of matches for grep."},
+                    "pattern": {"type": "string", "description": "Regular expression lines must match (grep only)."},
+                    "ignore_case": {"type": "boolean", "description": "Match pattern case-insensitively (default false)."}
                 },
-                "required": ["input_file","num_files", "output_file"]
+                "required": ["input_file", "output_file", "mode"]
             }
         }
     },
@@ -98,21 +130,57 @@ tools = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_headings",
+            "description": "Search the headings of the Markdown (.md) files in given input directory: full-text, by title prefix, or by exact title, optionally only H1/H2 etc. Write the matches (file, level, heading, line) as JSON to specified output file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input_dir": {"type": "string", "description": "Input directory containing the Markdown files."},
+                    "output_file": {"type": "string", "description": "Output file where the matching headings will be written."},
+                    "query": {"type": "string", "description": "Text to search for. Omit to list every heading."},
+                    "match": {"type": "string", "enum": ["fts", "prefix", "exact"], "description": "fts: headings containing all words of query (default); prefix: headings starting with query; exact: headings equal to query. Case-insensitive."},
+                    "levels": {"type": "array", "items": {"type": "integer"}, "description": "Heading levels to include, e.g. [1, 2] for H1 and H2. Default all."},
+                    "limit": {"type": "integer", "description": "Maximum number of headings (default 100)."}
+                },
+                "required": ["input_dir", "output_file"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
             "name": "write_email_eddress",
-            "description": "Given input file contains an email message. Parse it's content and extract the sender's email address, and write it to specified output file",
+            "description": "Given input file contains an email message. Parse it's content and extract the sender's email address (or another field), and write it to specified output file",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "input_file": {"type": "string", "description": "Input file containing the email message."},
-                    "output_file": {"type": "string", "description": "Output file where the result(sender’s email address) will be written."}
+                    "output_file": {"type": "string", "description": "Output file where the result(sender’s email address) will be written."},
+                    "field": {"type": "string", "description": "What to extract: from (default), to, cc, date or subject; anything else is answered by the LLM. to/cc write one address per line."}
                 },
                 "required": ["input_file", "output_file"]
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "extract_email_batch",
+            "description": "Given an mbox file or maildir directory (mail archive), extract the sender, recipients (To, Cc), date and subject of every message and write them to specified output file as CSV or JSON Lines",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input_path": {"type": "string", "description": "mbox file or maildir directory containing the messages."},
+                    "output_file": {"type": "string", "description": "Output file where one row per message will be written."},
+                    "format": {"type": "string", "enum": ["csv", "jsonl"], "description": "Output format; by default jsonl for .jsonl/.json output files, csv otherwise."}
+                },
+                "required": ["input_path", "output_file"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -132,12 +200,46 @@ tools = [
         "type": "function",
         "function": {
             "name": "similar_comments",
-            "description": "Given input file contains a list of comments, one per line. Using embeddings, find the most similar pair of comments and write them to specified output file, one per line",
+            "description": "Given input file contains a list of comments, one per line. Using embeddings, find the most similar pair of comments (or the top_k most similar pairs) and write them to specified output file, one per line",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "input_file": {"type": "string", "description": "Input file containing a list of comments, one per line"},
-                    "output_file": {"type": "string", "description": "Output file where the result will be written."}
+                    "output_file": {"type": "string", "description": "Output file where the result will be written."},
+                    "top_k": {"type": "integer", "description": "Number of most similar pairs to write, best first. Defaults to 1."}
+                },
+                "required": ["input_file", "output_file"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "similar_to_comment",
+            "description": "Given input file contains a list of comments, one per line. Using embeddings, find the comments most similar to a query text and write them (comment, line numbers, similarity) as JSON to specified output file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input_file": {"type": "string", "description": "Input file containing a list of comments, one per line"},
+                    "output_file": {"type": "string", "description": "Output file where the result will be written."},
+                    "query": {"type": "string", "description": "Text to find similar comments for."},
+                    "k": {"type": "integer", "description": "Number of comments to return (default 10)."}
+                },
+                "required": ["input_file", "output_file", "query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "comment_duplicates",
+            "description": "Given input file contains a list of comments, one per line. Using embeddings, group near-duplicate comments into clusters and write them as JSON to specified output file",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input_file": {"type": "string", "description": "Input file containing a list of comments, one per line"},
+                    "output_file": {"type": "string", "description": "Output file where the clusters will be written."},
+                    "threshold": {"type": "number", "description": "Minimum cosine similarity for two comments to count as duplicates (default 0.9)."}
                 },
                 "required": ["input_file", "output_file"]
             }